@@ -1,12 +1,55 @@
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import scoped_session, sessionmaker
+from model.storage import set_pragmas, create_read_engine
 
 # initialize flask app
 app = Flask(__name__)
 app.config.from_object(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:////home/lance/Assignment3.1/app/database/portfolio.db'
+# path of the portfolio database, the PORTFOLIO_DB environment variable overrides it
+app.config['PORTFOLIO_DB'] = os.environ.get('PORTFOLIO_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+																		 'database', 'portfolio.db'))
+app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + app.config['PORTFOLIO_DB']
+# pragmas run on every connection. WAL lets pages be read while main_parser or a post writes, and with WAL
+# synchronous normal only syncs at checkpoints. cache_size is in KiB when negative, mmap_size in bytes
+app.config['SQLITE_PRAGMAS'] = {'journal_mode': 'wal', 'synchronous': 'normal', 'cache_size': -16000,
+								'mmap_size': 268435456, 'busy_timeout': 5000}
+# read-only connections kept open for serving pages
+app.config['READ_POOL_SIZE'] = 8
+# load each assignment's tree when it is first viewed instead of at startup, keeping this many trees loaded
+app.config['LAZY_LOAD_ASSIGNMENTS'] = True
+app.config['LAZY_LOAD_CACHE_SIZE'] = 4
+# seconds between checks for newly ingested data, 0 to only load data at startup
+app.config['REFRESH_INTERVAL'] = 5
+# number of rendered pages and page fragments to keep
+app.config['RENDER_CACHE_SIZE'] = 256
+# seconds browsers and the CDN may reuse a page without checking it is current, 0 to always check
+app.config['PAGE_MAX_AGE'] = 0
+# top level comments per page of a file, levels of replies shown with them, and most levels one api call returns
+app.config['COMMENTS_PER_PAGE'] = 20
+app.config['COMMENT_REPLY_DEPTH'] = 3
+app.config['MAX_COMMENT_REPLY_DEPTH'] = 10
+# changes listed by the recent activity api, and most one call returns
+app.config['RECENT_ACTIVITY_COUNT'] = 20
+app.config['MAX_RECENT_ACTIVITY_COUNT'] = 100
+# write posted comments from a background thread in group commits, and most comments written by one commit
+app.config['WRITE_BEHIND_COMMENTS'] = False
+app.config['COMMENT_WRITE_BATCH'] = 100
 
 # set-up database
 db = SQLAlchemy(app)
+with app.app_context():
+	set_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+# pages are read through a separate pool of read-only connections, so reads never wait for writes
+read_engine = create_read_engine(app.config['PORTFOLIO_DB'], app.config['SQLITE_PRAGMAS'], app.config['READ_POOL_SIZE'])
+read_session = scoped_session(sessionmaker(bind=read_engine))
+
+
+@app.teardown_appcontext
+def remove_read_session(exception=None):
+	""" Return the request's read-only connection to the pool
+	"""
+	read_session.remove()
 
 
@@ -0,0 +1,69 @@
+""" Benchmark building the comment tree of a file whose thread has many comments, with a query for the replies of
+every comment compared with one query for the whole file linked in memory.
+
+Run from the project root: python -m benchmarks.comment_tree_benchmark [comments]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import db
+from model.portfolio.entries import Comment
+
+FILE_NAME = 'Assignment0/CS440_MP1/mazes/large_maze.txt'
+
+
+def write_thread(session, comments):
+	""" Write one thread, each comment replying to a random earlier one
+	"""
+	rand = random.Random(0)
+	rows = [{'id': 1, 'file': FILE_NAME, 'parent': None, 'message': 'comment 1'}]
+	for num in range(2, comments + 1):
+		rows.append({'id': num, 'file': FILE_NAME, 'parent': rand.randint(1, num - 1), 'message': 'comment %d' % num})
+	session.bulk_insert_mappings(Comment, rows)
+	session.commit()
+
+
+def query_per_comment(session):
+	""" Children of every comment from their own query, the way generate_children used to work
+	"""
+	comments = session.query(Comment).filter_by(file=FILE_NAME).all()
+	for comment in comments:
+		comment.children = list(reversed(session.query(Comment).filter_by(parent=comment.id).all()))
+	return [comment for comment in reversed(comments) if comment.parent is None]
+
+
+def single_query(session):
+	""" Whole file in one query, linked in memory
+	"""
+	comments = session.query(Comment).filter_by(file=FILE_NAME).order_by(Comment.id).all()
+	Comment.generate_children(comments)
+	return [comment for comment in reversed(comments) if comment.parent is None]
+
+
+if __name__ == '__main__':
+	comments = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+	tmp_dir = tempfile.mkdtemp()
+	try:
+		engine = create_engine('sqlite:///' + os.path.join(tmp_dir, 'portfolio.db'))
+		db.metadata.create_all(engine)
+		queries = [0]
+		event.listen(engine, 'before_cursor_execute', lambda *args: queries.__setitem__(0, queries[0] + 1))
+		Session = sessionmaker(bind=engine)
+		write_thread(Session(), comments)
+		for label, build in (('query per comment', query_per_comment), ('single query', single_query)):
+			session = Session()
+			queries[0] = 0
+			start = time.time()
+			build(session)
+			elapsed = time.time() - start
+			print('%-18s %8d queries %8.3fs' % (label, queries[0], elapsed))
+			session.close()
+		engine.dispose()
+	finally:
+		shutil.rmtree(tmp_dir)
@@ -0,0 +1,76 @@
+""" Benchmark posting comments from many threads at once, each post committing on its own compared with posts
+queued for the write-behind CommentWriter and written in group commits.
+
+Run from the project root: python -m benchmarks.comment_writer_benchmark [posters] [posts per poster]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import db
+from model.comment_writer import CommentWriter
+from model.portfolio.entries import Comment
+
+FILE_NAME = 'Assignment0/CS440_MP1/mazes/large_maze.txt'
+
+
+def commit_each(Session):
+	""" Post the way the views do without a writer, add and commit in the request's own session
+	"""
+	def post(message):
+		session = Session()
+		session.add(Comment(FILE_NAME, None, message))
+		session.commit()
+		session.close()
+	return post, None
+
+
+def write_behind(Session):
+	""" Post through a CommentWriter, waiting for the group commit like the views do
+	"""
+	writer = CommentWriter(Session)
+	writer.start()
+	return lambda message: writer.write(Comment(FILE_NAME, None, message)), writer
+
+
+def run_posters(post, posters, posts):
+	""" Post from several threads at once
+	"""
+	def poster(num):
+		for post_num in range(posts):
+			post('poster %d post %d' % (num, post_num))
+	threads = [threading.Thread(target=poster, args=(num,)) for num in range(posters)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+
+if __name__ == '__main__':
+	posters = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+	posts = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+	for label, make_poster in (('commit each', commit_each), ('write-behind', write_behind)):
+		tmp_dir = tempfile.mkdtemp()
+		try:
+			# wait for the writer lock like the app does instead of failing the post
+			engine = create_engine('sqlite:///' + os.path.join(tmp_dir, 'portfolio.db'),
+								   connect_args={'timeout': 30})
+			db.metadata.create_all(engine)
+			commits = [0]
+			event.listen(engine, 'commit', lambda *args: commits.__setitem__(0, commits[0] + 1))
+			post, writer = make_poster(sessionmaker(bind=engine))
+			start = time.time()
+			run_posters(post, posters, posts)
+			elapsed = time.time() - start
+			if writer is not None:
+				writer.stop()
+			print('%-14s %6d posts %6d commits %8.3fs %8.0f posts/s'
+				  % (label, posters * posts, commits[0], elapsed, posters * posts / elapsed))
+			engine.dispose()
+		finally:
+			shutil.rmtree(tmp_dir)
@@ -0,0 +1,70 @@
+""" Benchmark filtering comments against many filter words, with a str.replace per word compared with the words
+compiled into one single-pass regex.
+
+Run from the project root: python -m benchmarks.filter_benchmark [words] [comments]
+"""
+import random
+import string
+import sys
+import time
+
+from model.filter import FilterMatcher
+
+
+def make_words(count, rand):
+	""" Make distinct random filter words, several of them starting with others so overlaps are matched
+	"""
+	words = {}
+	while len(words) < count:
+		word = ''.join(rand.choice(string.ascii_lowercase) for _ in range(rand.randint(3, 10)))
+		words[word] = 'fruit%d' % len(words)
+	return words
+
+
+def make_comments(count, words, rand):
+	""" Make comments of 200 characters, some containing filter words
+	"""
+	word_list = sorted(words)
+	comments = []
+	for _ in range(count):
+		parts = []
+		while sum(len(part) + 1 for part in parts) < 200:
+			if rand.random() < 0.1:
+				parts.append(rand.choice(word_list))
+			else:
+				parts.append(''.join(rand.choice(string.ascii_lowercase) for _ in range(rand.randint(2, 8))))
+		comments.append(' '.join(parts)[:200])
+	return comments
+
+
+def replace_per_word(words, comments):
+	""" Filter the way apply_filter used to, one pass over the message for every word
+	"""
+	filtered = []
+	for message in comments:
+		for word in words.keys():
+			message = message.replace(word, words[word])
+		filtered.append(message)
+	return filtered
+
+
+def compiled(words, comments):
+	""" Filter with the words compiled into one regex
+	"""
+	start = time.time()
+	matcher = FilterMatcher(words)
+	print('%-18s %8.3fs' % ('compile', time.time() - start))
+	return [matcher.apply(message) for message in comments]
+
+
+if __name__ == '__main__':
+	word_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+	comment_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+	rand = random.Random(0)
+	words = make_words(word_count, rand)
+	comments = make_comments(comment_count, words, rand)
+	for label, run in (('replace per word', replace_per_word), ('compiled regex', compiled)):
+		start = time.time()
+		run(words, comments)
+		elapsed = time.time() - start
+		print('%-18s %8.3fs %10.1f us/comment' % (label, elapsed, elapsed * 1e6 / comment_count))
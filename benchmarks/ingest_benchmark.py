@@ -0,0 +1,101 @@
+""" Benchmark writing a synthetic repository to the database, comparing the old per-row
+query + commit loop with the BulkIngest pipeline.
+
+Run from the project root: python -m benchmarks.ingest_benchmark [number of assignments]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import db
+from model.ingest import BulkIngest
+from model.portfolio.entries import Directory, File
+from model.portfolio.revision import Revision
+from model.portfolio.repository import Repository
+
+
+def build_repository(assignments, files_per_dir=20, revisions_per_file=3):
+	""" Build a synthetic repository
+
+	:param assignments: number of top-level assignment directories
+	:param files_per_dir: files in each sub-directory
+	:param revisions_per_file: revisions recorded for each file
+	:return: Repository of synthetic data
+	"""
+	directories = {}
+	files = {}
+	revision_num = 1
+	for assignment in range(assignments):
+		for sub_dir in ['Assignment%d' % assignment, 'Assignment%d/src' % assignment]:
+			directory = Directory(sub_dir, revision_num, '2017-01-01T00:00:00.000000Z', 'lstrait2')
+			directory.versions.append(Revision(sub_dir, directory.date, 'lstrait2', 'dir commit', revision_num))
+			directories[sub_dir] = directory
+			for file_num in range(files_per_dir):
+				name = '%s/file%d.py' % (sub_dir, file_num)
+				file = File(name, revision_num, '2017-01-01T00:00:00.000000Z', 'lstrait2', 100)
+				for _ in range(revisions_per_file):
+					revision_num += 1
+					file.versions.append(Revision(name, file.date, 'lstrait2', 'commit %d' % revision_num, revision_num))
+				files[name] = file
+	return Repository(directories, files)
+
+
+def legacy_ingest(session, portfolio):
+	""" Original main_parser loop: two queries and a commit for every row
+	"""
+	for directory in portfolio.directories.values():
+		if not session.query(Directory).filter_by(name=directory.name).first():
+			session.add(directory)
+			session.commit()
+		for version in directory.versions:
+			if not session.query(Revision).filter_by(name=version.name, revision=version.revision).first():
+				session.add(version)
+				session.commit()
+	for file in portfolio.files.values():
+		if not session.query(File).filter_by(name=file.name).first():
+			session.add(file)
+			session.commit()
+		for version in file.versions:
+			if not session.query(Revision).filter_by(name=version.name, revision=version.revision).first():
+				session.add(version)
+				session.commit()
+
+
+def bulk_ingest(session, portfolio):
+	""" Batched upsert pipeline
+	"""
+	BulkIngest(session).ingest(portfolio)
+
+
+def run(ingest, assignments):
+	""" Time one ingest into a fresh database
+
+	:return: rows written per second
+	"""
+	portfolio = build_repository(assignments)
+	rows = len(portfolio.directories) + len(portfolio.files) + \
+		sum(len(entry.versions) for entry in list(portfolio.directories.values()) + list(portfolio.files.values()))
+	tmp_dir = tempfile.mkdtemp()
+	try:
+		engine = create_engine('sqlite:///' + os.path.join(tmp_dir, 'portfolio.db'))
+		db.metadata.create_all(engine)
+		session = sessionmaker(bind=engine)()
+		start = time.time()
+		ingest(session, portfolio)
+		elapsed = time.time() - start
+		session.close()
+		engine.dispose()
+	finally:
+		shutil.rmtree(tmp_dir)
+	return rows, rows / elapsed
+
+
+if __name__ == '__main__':
+	assignments = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+	for label, ingest in [('per-row', legacy_ingest), ('bulk', bulk_ingest)]:
+		rows, rate = run(ingest, assignments)
+		print('%-8s %7d rows %10.0f rows/s' % (label, rows, rate))
@@ -0,0 +1,36 @@
+""" Benchmark memory held per entry by the ORM backed Repository and by the slotted ReadRepository
+built from it.
+
+Run from the project root: python -m benchmarks.read_model_benchmark [list file] [log file]
+"""
+import gc
+import sys
+import tracemalloc
+
+from model.parser.xml_parser import XMLParser
+from model.portfolio.read_model import ReadRepository
+
+
+def retained_bytes(baseline):
+	""" Memory still allocated since baseline, after collecting garbage
+	"""
+	gc.collect()
+	return tracemalloc.get_traced_memory()[0] - baseline
+
+
+if __name__ == '__main__':
+	list_file = sys.argv[1] if len(sys.argv) > 1 else 'resources/data/svn_list_new.xml'
+	log_file = sys.argv[2] if len(sys.argv) > 2 else 'resources/data/svn_log_new.xml'
+	gc.collect()
+	tracemalloc.start()
+	baseline = tracemalloc.get_traced_memory()[0]
+	portfolio = XMLParser(list_file, log_file).parse_subversion_xml()
+	orm_bytes = retained_bytes(baseline)
+	entries = len(portfolio.directories) + len(portfolio.files)
+	read_portfolio = ReadRepository(portfolio)
+	del portfolio
+	read_bytes = retained_bytes(baseline)
+	tracemalloc.stop()
+	print('%d entries' % entries)
+	print('%-16s %10d bytes %8.0f bytes/entry' % ('Repository', orm_bytes, float(orm_bytes) / entries))
+	print('%-16s %10d bytes %8.0f bytes/entry' % ('ReadRepository', read_bytes, float(read_bytes) / entries))
@@ -0,0 +1,60 @@
+""" Benchmark memory held by revisions when every path of a commit gets its own ORM Revision, compared with
+lightweight PathRevisions sharing one RevisionInfo per commit.
+
+Run from the project root: python -m benchmarks.revision_memory_benchmark [commits] [paths per commit]
+"""
+import gc
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from benchmarks.synthetic_svn import write_svn_xml
+from model.parser.xml_parser import XMLParser
+from model.portfolio.revision import Revision
+
+
+class LegacyXMLParser(XMLParser):
+	""" Parser creating one ORM Revision per path, the way revisions were built before RevisionInfo
+	"""
+
+	def add_log_record(self, record):
+		revision_num, author, date, msg, paths = record
+		for kind, name, action in paths:
+			if kind == 'dir':
+				entry_obj = self.svn_repo.directories.get(name)
+			else:
+				entry_obj = self.svn_repo.files.get(name)
+			if entry_obj is not None:
+				entry_obj.versions.append(Revision(name, date, author, msg, revision_num))
+
+
+def retained_bytes(parser_class, list_file, log_file):
+	""" Parse with parser_class and measure memory held by the result
+
+	:return: (bytes retained, number of revisions)
+	"""
+	gc.collect()
+	tracemalloc.start()
+	baseline = tracemalloc.get_traced_memory()[0]
+	portfolio = parser_class(list_file, log_file).parse_subversion_xml()
+	gc.collect()
+	retained = tracemalloc.get_traced_memory()[0] - baseline
+	tracemalloc.stop()
+	revisions = sum(len(entry.versions) for entry in
+					list(portfolio.directories.values()) + list(portfolio.files.values()))
+	return retained, revisions
+
+
+if __name__ == '__main__':
+	commits = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+	paths_per_commit = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+	tmp_dir = tempfile.mkdtemp()
+	try:
+		list_file, log_file = write_svn_xml(tmp_dir, commits, paths_per_commit)
+		for label, parser_class in (('Revision', LegacyXMLParser), ('PathRevision', XMLParser)):
+			retained, revisions = retained_bytes(parser_class, list_file, log_file)
+			print('%-14s %11d bytes %8d revisions %6.0f bytes/revision'
+				  % (label, retained, revisions, float(retained) / revisions))
+	finally:
+		shutil.rmtree(tmp_dir)
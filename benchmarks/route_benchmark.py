@@ -0,0 +1,66 @@
+""" Benchmark the lookups behind the assignment and file routes, scanning the assignments on every request compared
+with the precomputed route maps, as the number of assignments grows.
+
+Run from the project root: python -m benchmarks.route_benchmark [lookups per size]
+"""
+import sys
+import time
+
+from model.portfolio.entries import Directory, File
+from model.portfolio.repository import Repository
+from model.portfolio.read_model import ReadRepository
+
+SIZES = (10, 100, 1000, 10000)
+FILES_PER_ASSIGNMENT = 5
+
+
+def build_portfolio(assignments):
+	""" Read model with assignments in groups of 5 related versions, each holding a few files
+	"""
+	directories = {}
+	files = {}
+	for num in range(assignments):
+		name = 'Assignment%d.%d' % (num // 5, num % 5)
+		directories[name] = Directory(name, 1, '2017-03-21T15:08:51.388154Z', 'lstrait2')
+		for file_num in range(FILES_PER_ASSIGNMENT):
+			file_name = '%s/file%d.py' % (name, file_num)
+			files[file_name] = File(file_name, 1, '2017-03-21T15:08:51.388154Z', 'lstrait2', 100)
+	return ReadRepository(Repository(directories, files))
+
+
+def scan_routes(portfolio, assignment_name, file_name):
+	""" Lookups the way the views did them before the route maps
+	"""
+	assignments = [assignment for assignment in portfolio.assignments if assignment.name == assignment_name]
+	related = [assignment for assignment in portfolio.assignments
+			   if '.' in assignment_name and assignment_name != assignment.name and '.' in assignment.name
+			   and assignment.name[assignment.name.rindex('.') - 1] == assignment_name[assignment_name.rindex('.') - 1]]
+	return assignments[0], related, portfolio.files[file_name]
+
+
+def mapped_routes(portfolio, assignment_name, file_name):
+	""" Lookups using the precomputed route maps
+	"""
+	return (portfolio.get_assignment(assignment_name), portfolio.get_related_assignments(assignment_name),
+			portfolio.get_file(file_name), portfolio.get_file_owner(file_name))
+
+
+def time_lookups(lookup, portfolio, names):
+	""" Average seconds per lookup over names
+	"""
+	start = time.time()
+	for assignment_name, file_name in names:
+		lookup(portfolio, assignment_name, file_name)
+	return (time.time() - start) / len(names)
+
+
+if __name__ == '__main__':
+	lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+	print('%12s %14s %14s' % ('assignments', 'scan us/req', 'mapped us/req'))
+	for size in SIZES:
+		portfolio = build_portfolio(size)
+		names = [(assignment.name, assignment.name + '/file0.py')
+				 for assignment in (portfolio.assignments[num * 7919 % size] for num in range(lookups))]
+		scan = time_lookups(scan_routes, portfolio, names)
+		mapped = time_lookups(mapped_routes, portfolio, names)
+		print('%12d %14.1f %14.1f' % (size, scan * 1e6, mapped * 1e6))
@@ -0,0 +1,86 @@
+""" Benchmark reading comments while an ingest-sized write transaction runs, with sqlite's default rollback journal
+compared with WAL, the configured pragmas and the pool of read-only connections.
+
+Run from the project root: python -m benchmarks.storage_benchmark [readers] [rows written]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from app import app, db
+from model.portfolio.entries import Comment
+from model.storage import set_pragmas, create_read_engine
+
+FILE_NAME = 'Assignment0/CS440_MP1/mazes/large_maze.txt'
+
+# rollback journal, only waiting for locks like the app did before
+DEFAULT_PRAGMAS = {'journal_mode': 'delete', 'busy_timeout': 30000}
+
+
+def open_engines(path, pragmas, read_only_pool):
+	""" Open writer engine and the engine readers use
+	"""
+	engine = create_engine('sqlite:///' + path)
+	set_pragmas(engine, pragmas)
+	if read_only_pool:
+		return engine, create_read_engine(path, pragmas)
+	return engine, engine
+
+
+def write(engine, rows, done):
+	""" Insert rows in one transaction, like an ingest
+	"""
+	session = sessionmaker(bind=engine)()
+	start = len(session.query(Comment.id).all())
+	session.bulk_insert_mappings(Comment, [{'id': start + num + 1, 'file': FILE_NAME, 'parent': None,
+											'message': 'ingested %d' % num} for num in range(rows)])
+	session.commit()
+	session.close()
+	done.set()
+
+
+def read(engine, done, latencies):
+	""" Read a file's newest comment, like a file page, until the writer is done
+	"""
+	Session = sessionmaker(bind=engine)
+	while not done.is_set():
+		start = time.time()
+		session = Session()
+		session.query(func.max(Comment.id)).filter(Comment.file == FILE_NAME).scalar()
+		session.close()
+		latencies.append(time.time() - start)
+
+
+if __name__ == '__main__':
+	readers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+	rows = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+	for label, pragmas, read_only_pool in (('rollback journal', DEFAULT_PRAGMAS, False),
+										   ('wal + read pool', app.config['SQLITE_PRAGMAS'], True)):
+		tmp_dir = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tmp_dir, 'portfolio.db')
+			engine, read_engine = open_engines(path, pragmas, read_only_pool)
+			db.metadata.create_all(engine)
+			done = threading.Event()
+			latencies = []
+			threads = [threading.Thread(target=read, args=(read_engine, done, latencies)) for _ in range(readers)]
+			threads.append(threading.Thread(target=write, args=(engine, rows, done)))
+			start = time.time()
+			for thread in threads:
+				thread.start()
+			for thread in threads:
+				thread.join()
+			elapsed = time.time() - start
+			latencies.sort()
+			print('%-17s write %6.2fs %8d reads  p50 %7.2fms  p99 %7.2fms  max %8.2fms'
+				  % (label, elapsed, len(latencies), latencies[len(latencies) // 2] * 1000,
+					 latencies[int(len(latencies) * 0.99)] * 1000, latencies[-1] * 1000))
+			read_engine.dispose()
+			engine.dispose()
+		finally:
+			shutil.rmtree(tmp_dir)
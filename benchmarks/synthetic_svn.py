@@ -0,0 +1,44 @@
+""" Write synthetic svn_list and svn_log XML files for benchmarks
+"""
+import os
+
+# leading portion of every log path, stripped by XMLParser
+PATH_PREFIX = '/lstrait2/'
+
+
+def write_svn_xml(directory, commits, paths_per_commit, files=1000):
+	""" Write svn_list.xml and svn_log.xml with a synthetic history
+
+	:param directory: directory to write the files to
+	:param commits: number of log entries
+	:param paths_per_commit: number of files touched by each commit
+	:param files: number of files in the repository, spread over 10 directories per assignment
+	:return: (list file path, log file path)
+	"""
+	names = ['Assignment%d/dir%d/file%d.py' % (num % 10, num % 100, num) for num in range(files)]
+	dirs = sorted(set(name[:name.rindex('/')] for name in names) | set(name[:name.index('/')] for name in names))
+	date = '2017-03-21T15:08:51.388154Z'
+	list_file = os.path.join(directory, 'svn_list.xml')
+	with open(list_file, 'w') as data:
+		data.write('<?xml version="1.0" encoding="UTF-8"?>\n<lists>\n<list path="synthetic">\n')
+		for name in dirs:
+			data.write('<entry kind="dir"><name>%s</name><commit revision="%d"><author>lstrait2</author>'
+					   '<date>%s</date></commit></entry>\n' % (name, commits, date))
+		for name in names:
+			data.write('<entry kind="file"><name>%s</name><size>100</size><commit revision="%d">'
+					   '<author>lstrait2</author><date>%s</date></commit></entry>\n' % (name, commits, date))
+		data.write('</list>\n</lists>\n')
+	log_file = os.path.join(directory, 'svn_log.xml')
+	with open(log_file, 'w') as data:
+		data.write('<?xml version="1.0" encoding="UTF-8"?>\n<log>\n')
+		# newest first, like svn log
+		for revision in range(commits, 0, -1):
+			data.write('<logentry revision="%d"><author>author%d</author><date>2017-03-%02dT15:08:%02d.000000Z</date>'
+					   '<paths>\n' % (revision, revision % 5, 1 + revision % 28, revision % 60))
+			for num in range(paths_per_commit):
+				name = names[(revision * paths_per_commit + num) % files]
+				data.write('<path kind="file" action="M">%s%s</path>\n' % (PATH_PREFIX, name))
+			data.write('</paths><msg>synthetic commit message number %d, long enough to be worth sharing '
+					   'between every path the commit touched</msg></logentry>\n' % revision)
+		data.write('</log>\n')
+	return list_file, log_file
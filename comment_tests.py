@@ -0,0 +1,195 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import db
+from model.comment_writer import CommentWriter, PendingWrite
+from model.filter import Filter, FilterMatcher, filter_cache, FILTER_VERSION_MARK
+from model.high_water_mark import HighWaterMark
+from model.ingest import BulkIngest
+from model.portfolio.entries import Comment
+from model.refilter import CommentRefilter, REFILTER_MARK, COMMENT_GENERATION_MARK
+
+
+class CommentTests(unittest.TestCase):
+
+	def setUp(self):
+		# comments go into a scratch database so the real portfolio db is untouched
+		self.tmp_dir = tempfile.mkdtemp()
+		self.engine = create_engine('sqlite:///' + os.path.join(self.tmp_dir, 'portfolio.db'))
+		db.metadata.create_all(self.engine)
+		self.Session = sessionmaker(bind=self.engine)
+		self.session = self.Session()
+		# thread 1 -> 2 -> 3 -> 4 -> 5, with 6 also replying to 1, then 25 more top level comments
+		rows = [{'id': 1, 'file': 'f.txt', 'parent': None, 'message': 'first'}]
+		rows.extend({'id': num, 'file': 'f.txt', 'parent': num - 1, 'message': 'reply %d' % num} for num in range(2, 6))
+		rows.append({'id': 6, 'file': 'f.txt', 'parent': 1, 'message': 'newer reply'})
+		rows.extend({'id': num, 'file': 'f.txt', 'parent': None, 'message': 'top %d' % num} for num in range(7, 32))
+		rows.append({'id': 32, 'file': 'g.txt', 'parent': None, 'message': 'other file'})
+		self.session.bulk_insert_mappings(Comment, rows)
+		self.session.commit()
+		# the filter cache is process wide, so start without a matcher compiled from another test's database
+		filter_cache.matcher = None
+
+	def tearDown(self):
+		self.session.close()
+		self.engine.dispose()
+		shutil.rmtree(self.tmp_dir)
+
+	# replies should be loaded down to the depth limit, with deeper replies flagged
+	def test_load_threads_depth(self):
+		comments = Comment.load_threads(self.session, [1], 2)
+		self.assertEqual(sorted(comments.keys()), [1, 2, 3, 6])
+		self.assertEqual([child.id for child in comments[1].children], [6, 2])
+		self.assertEqual([child.id for child in comments[2].children], [3])
+		self.assertTrue(comments[3].more_replies)
+		self.assertFalse(comments[6].more_replies)
+		self.assertFalse(comments[1].more_replies)
+		# depth 0 only loads the comment itself
+		comments = Comment.load_threads(self.session, [1], 0)
+		self.assertEqual(list(comments.keys()), [1])
+		self.assertTrue(comments[1].more_replies)
+		self.assertEqual(Comment.load_threads(self.session, [99], 3), {})
+
+	# top level comments should be paged newest first, following the cursor until the oldest
+	def test_comment_pages(self):
+		comments, before = Comment.get_comment_page(self.session, 'f.txt', limit=20)
+		self.assertEqual([comment.id for comment in comments], list(range(31, 11, -1)))
+		self.assertEqual(before, 12)
+		comments, before = Comment.get_comment_page(self.session, 'f.txt', before=before, limit=20)
+		self.assertEqual([comment.id for comment in comments], [11, 10, 9, 8, 7, 1])
+		self.assertIsNone(before)
+		# replies come with their thread, down to the depth
+		self.assertEqual([child.id for child in comments[-1].children], [6, 2])
+		self.assertEqual(comments[-1].to_dict()['children'][1]['children'][0]['children'][0]['id'], 4)
+
+	# filter words should be replaced in one pass, as substrings, longest word first where words overlap
+	def test_filter_matcher(self):
+		matcher = FilterMatcher({'shit': 'apple', 'fuck': 'banana', 'ass': 'lemon', 'assign': 'task'})
+		self.assertEqual(matcher.apply('fuck that shit'), 'banana that apple')
+		self.assertEqual(matcher.apply('fucked that shited'), 'bananaed that appleed')
+		self.assertEqual(matcher.apply('assignment class'), 'taskment cllemon')
+		# replacements are not filtered again
+		self.assertEqual(matcher.apply('sass'), 'slemon')
+		self.assertEqual(FilterMatcher({}).apply('nothing to filter'), 'nothing to filter')
+
+	# changes to the Filter table should bump the filter version, and the cached matcher follow it
+	def test_filter_cache_version(self):
+		self.session.add(Filter('shit', 'apple'))
+		self.session.commit()
+		self.assertEqual(HighWaterMark.get_value(FILTER_VERSION_MARK, self.session), 1)
+		matcher = filter_cache.get(self.session)
+		self.assertEqual(matcher.apply('shit'), 'apple')
+		self.session.add(Comment('f.txt', None, 'not a filter'))
+		self.session.commit()
+		self.assertIs(filter_cache.get(self.session), matcher)
+		self.session.add(Filter('damn', 'grape'))
+		self.session.flush()
+		# uncommitted words are used but not cached, they may still be rolled back
+		self.assertEqual(filter_cache.get(self.session).apply('damn'), 'grape')
+		self.assertIs(filter_cache.matcher, matcher)
+		self.session.rollback()
+		self.assertIs(filter_cache.get(self.session), matcher)
+		self.session.query(Filter).filter_by(word='shit').first().replacement = 'pear'
+		self.session.commit()
+		self.assertEqual(filter_cache.get(self.session).apply('shit'), 'pear')
+
+	# words changed by another process should be picked up through the filter version alone
+	def test_filter_cache_other_process(self):
+		self.session.add(Filter('shit', 'apple'))
+		self.session.commit()
+		self.assertEqual(filter_cache.get(self.session).apply('damn'), 'damn')
+		other_engine = create_engine('sqlite:///' + os.path.join(self.tmp_dir, 'portfolio.db'))
+		other_session = sessionmaker(bind=other_engine)()
+		other_session.bulk_insert_mappings(Filter, [{'word': 'damn', 'replacement': 'grape'}])
+		other_session.commit()
+		# without a new version the cached matcher is still used
+		self.assertEqual(filter_cache.get(self.session).apply('damn'), 'damn')
+		BulkIngest(other_session).insert_filters([Filter('fuck', 'banana')])
+		other_session.close()
+		other_engine.dispose()
+		self.assertEqual(filter_cache.get(self.session).apply('damn fuck'), 'grape banana')
+
+	# re-filtering should write back only changed comments, chunk by chunk, and clear its checkpoint when done
+	def test_refilter(self):
+		stats = CommentRefilter(self.session, FilterMatcher({'reply': 'answer'}), chunk_size=5).run()
+		self.assertEqual((stats['scanned'], stats['changed'], stats['chunks']), (32, 5, 7))
+		self.assertEqual(self.session.get(Comment, 2).message, 'answer 2')
+		self.assertEqual(self.session.get(Comment, 6).message, 'newer answer')
+		self.assertEqual(self.session.get(Comment, 7).message, 'top 7')
+		self.assertIsNone(self.session.get(HighWaterMark, REFILTER_MARK))
+		# one new comment generation per chunk that changed comments
+		self.assertEqual(HighWaterMark.get_value(COMMENT_GENERATION_MARK, self.session), 2)
+
+	# an interrupted run should continue after its checkpoint unless restarted
+	def test_refilter_resume(self):
+		self.session.add(HighWaterMark(REFILTER_MARK, 20))
+		self.session.commit()
+		refilter = CommentRefilter(self.session, FilterMatcher({'top': 'first'}), chunk_size=5)
+		stats = refilter.run()
+		self.assertEqual((stats['resumed_after'], stats['scanned'], stats['changed']), (20, 12, 11))
+		self.assertEqual(self.session.get(Comment, 20).message, 'top 20')
+		self.assertEqual(self.session.get(Comment, 21).message, 'first 21')
+		self.session.add(HighWaterMark(REFILTER_MARK, 20))
+		self.session.commit()
+		stats = refilter.run(resume=False)
+		self.assertEqual((stats['resumed_after'], stats['scanned'], stats['changed']), (None, 32, 14))
+
+	# comments posted from many threads should all be committed before their posters return
+	def test_comment_writer(self):
+		writer = CommentWriter(self.Session, max_batch=8)
+		writer.start()
+		comment_ids = []
+		posters = [threading.Thread(target=lambda num=num: comment_ids.append(
+			writer.write(Comment('g.txt', None, 'post %d' % num)))) for num in range(20)]
+		for poster in posters:
+			poster.start()
+		for poster in posters:
+			poster.join()
+		self.assertEqual(sorted(comment_ids), list(range(33, 53)))
+		self.assertEqual(self.session.query(Comment).filter_by(file='g.txt').count(), 21)
+		writer.stop()
+		self.assertFalse(writer.is_alive())
+		# after stopping comments are written directly
+		self.assertEqual(writer.write(Comment('g.txt', None, 'late')), 53)
+
+	# a comment that cannot be written should fail only its own post
+	def test_comment_writer_failure(self):
+		writer = CommentWriter(self.Session)
+		duplicate = Comment('g.txt', None, 'duplicate')
+		duplicate.id = 1
+		batch = [PendingWrite(Comment('g.txt', None, 'first')), PendingWrite(duplicate),
+				 PendingWrite(Comment('g.txt', None, 'second'))]
+		writer.write_batch(batch)
+		self.assertEqual([pending.comment_id for pending in batch], [33, None, 34])
+		self.assertIsNotNone(batch[1].error)
+		self.assertTrue(all(pending.done.is_set() for pending in batch))
+
+	# posts should not wait forever on a writer thread that is not running
+	def test_comment_writer_not_running(self):
+		writer = CommentWriter(self.Session, check_interval=0.01)
+		self.assertEqual(writer.write(Comment('g.txt', None, 'never queued')), 33)
+		self.assertEqual(self.session.query(Comment).filter_by(file='g.txt').count(), 2)
+
+	# a batch failing outside its commit should fail its posts without stopping the writer thread
+	def test_comment_writer_survives_errors(self):
+		failures = [RuntimeError('cannot open session')]
+
+		def session_factory():
+			if failures:
+				raise failures.pop()
+			return self.Session()
+		writer = CommentWriter(session_factory)
+		writer.start()
+		self.assertRaises(RuntimeError, writer.write, Comment('g.txt', None, 'fails'))
+		self.assertTrue(writer.is_alive())
+		self.assertEqual(writer.write(Comment('g.txt', None, 'written')), 33)
+		writer.stop()
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,4 +1,14 @@
+import os
+import shutil
+import tempfile
 import unittest
+
+# run against a copy of the checked-in database, so the tests never change it. Set before app is imported
+TEST_DB_DIR = tempfile.mkdtemp()
+os.environ['PORTFOLIO_DB'] = os.path.join(TEST_DB_DIR, 'portfolio.db')
+shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'portfolio.db'),
+			os.environ['PORTFOLIO_DB'])
+
 from app import db
 from main_app import app
 from model.portfolio.entries import Directory, File, Comment
@@ -12,6 +22,13 @@ class DbTests(unittest.TestCase):
 	def setUp(self):
 		app.config['TESTING'] = True
 		self.flask_app = app.test_client()
+		# model queries need an app context
+		self.context = app.app_context()
+		self.context.push()
+
+	def tearDown(self):
+		db.session.remove()
+		self.context.pop()
 
 	# Test filters were added to db properly
 	def test_filter_table(self):
@@ -264,4 +281,7 @@ class DbTests(unittest.TestCase):
 
 
 if __name__ == '__main__':
-	unittest.main()
\ No newline at end of file
+	try:
+		unittest.main()
+	finally:
+		shutil.rmtree(TEST_DB_DIR)
\ No newline at end of file
@@ -0,0 +1,212 @@
+import os
+import shutil
+import tempfile
+import unittest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from app import db
+from model.ingest import BulkIngest
+from model.migrations import collapse_duplicate_revisions, migrate_revisions_to_changesets, migrate, schema_version, \
+	MIGRATIONS
+from model.filter import Filter
+from model.portfolio.entries import Directory, File
+from model.portfolio.revision import Revision, RevisionInfo, PathRevision, date_timestamp
+from model.portfolio.changeset import Changeset, ChangedPath
+from model.parser.xml_parser import XMLParser
+from model.portfolio.repository import Repository
+
+
+class IngestTests(unittest.TestCase):
+
+	def setUp(self):
+		# ingest into a scratch database so the real portfolio db is untouched
+		self.tmp_dir = tempfile.mkdtemp()
+		self.engine = create_engine('sqlite:///' + os.path.join(self.tmp_dir, 'portfolio.db'))
+		db.metadata.create_all(self.engine)
+		self.session = sessionmaker(bind=self.engine)()
+		self.portfolio = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml').parse_subversion_xml()
+		self.filters = [Filter("shit", "apple"), Filter("fuck", "banana")]
+
+	def tearDown(self):
+		self.session.close()
+		self.engine.dispose()
+		shutil.rmtree(self.tmp_dir)
+
+	def all_versions(self):
+		return [version for entry in list(self.portfolio.directories.values()) + list(self.portfolio.files.values())
+				for version in entry.versions]
+
+	# every directory, file, commit, changed path and filter should be written to an empty db
+	def test_ingest_empty_db(self):
+		written = BulkIngest(self.session).ingest(self.portfolio, self.filters)
+		self.assertEqual(written['directory'], 83)
+		self.assertEqual(written['file'], 273)
+		self.assertEqual(self.session.query(Directory).count(), 83)
+		self.assertEqual(self.session.query(File).count(), 273)
+		self.assertEqual(self.session.query(ChangedPath).count(), len(self.all_versions()))
+		# each commit is stored once, however many paths it touched
+		self.assertEqual(written['changeset'], len(set(version.revision for version in self.all_versions())))
+		self.assertEqual(self.session.query(Changeset).filter_by(revision=6182).one().msg,
+						 [version.msg for version in self.all_versions() if version.revision == '6182'][0])
+		self.assertEqual(self.session.query(Filter).count(), 2)
+		# changed paths should keep the kind and svn action of each path
+		changed_path = self.session.query(ChangedPath).filter_by(revision=6705).one()
+		self.assertEqual((changed_path.name, changed_path.kind, changed_path.action), ('Assignment3.0', 'dir', 'A'))
+		# row data should match the parsed entries
+		maze_file = self.session.query(File).filter_by(name='Assignment0/CS440_MP1/mazes/large_maze.txt').first()
+		self.assertEqual(maze_file.size, 1406)
+		self.assertEqual(maze_file.revision, 804)
+		self.assertEqual(maze_file.parent_name, 'Assignment0/CS440_MP1/mazes')
+		# dates are also stored as integer timestamps
+		self.assertEqual(maze_file.timestamp, date_timestamp(maze_file.date))
+		self.assertEqual(self.session.query(Changeset).filter(Changeset.timestamp.is_(None)).count(), 0)
+
+	# running ingest twice should update entries but never duplicate rows
+	def test_ingest_twice_no_duplicates(self):
+		BulkIngest(self.session).ingest(self.portfolio, self.filters)
+		self.portfolio.directories['Assignment0'].author = 'someone_else'
+		written = BulkIngest(self.session, batch_size=7).ingest(self.portfolio, self.filters)
+		self.assertEqual(written['changeset'], 0)
+		self.assertEqual(written['changed_path'], 0)
+		self.assertEqual(written['filter'], 0)
+		self.assertEqual(self.session.query(Directory).count(), 83)
+		self.assertEqual(self.session.query(ChangedPath).count(), len(self.all_versions()))
+		self.assertEqual(self.session.query(Filter).count(), 2)
+		# existing entry should have been updated
+		self.assertEqual(self.session.query(Directory).filter_by(name='Assignment0').first().author, 'someone_else')
+
+	# incremental ingest should only write entries changed after the mark
+	def test_ingest_since_revision(self):
+		written = BulkIngest(self.session).ingest(self.portfolio, since_revision=6469)
+		# only Assignment3.0 was changed in revision 6705
+		self.assertEqual(written['directory'], 1)
+		self.assertEqual(written['file'], 0)
+		self.assertEqual(self.session.query(Directory).one().name, 'Assignment3.0')
+
+	# incremental ingest should only look up and write changes after the mark, older ones are already stored
+	def test_ingest_since_revision_change_keys(self):
+		BulkIngest(self.session).ingest(self.portfolio)
+		ingest = BulkIngest(self.session)
+		written = ingest.ingest(self.portfolio, since_revision=6243)
+		self.assertEqual((written['changeset'], written['changed_path']), (0, 0))
+		self.assertEqual(ingest.changeset_keys, set(int(version.revision) for version in self.all_versions()
+													if int(version.revision) > 6243))
+		self.assertTrue(all(revision > 6243 for revision, _ in ingest.changed_path_keys))
+		self.assertEqual(self.session.query(ChangedPath).count(), len(self.all_versions()))
+
+	# revisions repeated within a single ingest should only be written once
+	def test_ingest_repeated_revision(self):
+		file = self.portfolio.files['Assignment1.0/src/pieces/Pawn.java']
+		file.versions.append(PathRevision(file.name, RevisionInfo(file.revision, file.date, file.author, 'repeat')))
+		BulkIngest(self.session).ingest(self.portfolio)
+		self.assertEqual(self.session.query(ChangedPath).filter_by(name=file.name).count(), 1)
+
+	# migration should collapse duplicates in old databases and enforce uniqueness afterwards
+	def test_collapse_duplicate_revisions(self):
+		# recreate revision table the way older databases have it, without the unique index
+		self.session.execute(text('DROP TABLE revision'))
+		self.session.execute(text('CREATE TABLE revision (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR(200), '
+								  'date VARCHAR(200), author VARCHAR(200), msg VARCHAR(200), revision INTEGER)'))
+		for _ in range(3):
+			self.session.execute(text("INSERT INTO revision (name, date, author, msg, revision) "
+									  "VALUES ('Assignment0', 'd', 'lstrait2', 'm', 804)"))
+		self.session.execute(text("INSERT INTO revision (name, date, author, msg, revision) "
+								  "VALUES ('Assignment0', 'd', 'lstrait2', 'm', 805)"))
+		self.session.commit()
+		self.assertEqual(collapse_duplicate_revisions(self.session), 2)
+		self.assertEqual(self.session.query(Revision).count(), 2)
+		# first ingested row should be kept
+		self.assertEqual(self.session.query(Revision).filter_by(revision=804).one().id, 1)
+		# duplicates should now be rejected by the database
+		self.session.add(Revision('Assignment0', 'd', 'lstrait2', 'm', 804))
+		self.assertRaises(IntegrityError, self.session.commit)
+		self.session.rollback()
+		# running the migration again should do nothing
+		self.assertEqual(collapse_duplicate_revisions(self.session), 0)
+
+	# subtree range should match the directory and everything below it, but not siblings sharing a prefix
+	def test_subtree_filter(self):
+		BulkIngest(self.session).ingest(self.portfolio)
+		for name in ['Assignment1', 'Assignment1.0', 'Assignment0/CS440_MP1']:
+			expected = sorted(entry_name for entry_name in list(self.portfolio.directories) + list(self.portfolio.files)
+							  if entry_name == name or entry_name.startswith(name + '/'))
+			found = sorted([row[0] for row in self.session.query(Directory.name).filter(Repository.subtree_filter(Directory.name, name))] +
+						   [row[0] for row in self.session.query(File.name).filter(Repository.subtree_filter(File.name, name))])
+			self.assertEqual(found, expected)
+		self.assertEqual(self.session.query(Directory).filter(Repository.subtree_filter(Directory.name, 'Assignment1')).count(), 0)
+
+	# migration should move revision rows into changesets and changed paths, storing each commit once
+	def test_migrate_revisions_to_changesets(self):
+		self.session.add(Directory('Assignment0', 805, 'd', 'lstrait2'))
+		self.session.add(Revision('Assignment0', 'd', 'lstrait2', 'm', 805))
+		self.session.add(Revision('Assignment0/a.py', 'd', 'lstrait2', 'm', 805))
+		self.session.add(Revision('Assignment0', 'c', 'lstrait2', 'older', 804))
+		self.session.commit()
+		self.assertEqual(migrate_revisions_to_changesets(self.session), 3)
+		self.assertEqual(self.session.query(Revision).count(), 0)
+		self.assertEqual([(changeset.revision, changeset.msg) for changeset in
+						  self.session.query(Changeset).order_by(Changeset.revision)], [(804, 'older'), (805, 'm')])
+		self.assertEqual(sorted((path.revision, path.name, path.kind, path.action) for path in self.session.query(ChangedPath)),
+						 [(804, 'Assignment0', 'dir', None), (805, 'Assignment0', 'dir', None),
+						  (805, 'Assignment0/a.py', 'file', None)])
+		# running the migration again should do nothing
+		self.assertEqual(migrate_revisions_to_changesets(self.session), 0)
+		self.assertEqual(self.session.query(ChangedPath).count(), 3)
+
+	def query_plans(self):
+		""" Query plans of the hot queries, joined into one string per query
+		"""
+		queries = ["SELECT max(id) FROM comment WHERE file = 'f.txt'",
+				   "SELECT id FROM comment WHERE file = 'f.txt' AND parent IS NULL ORDER BY id DESC LIMIT 20",
+				   "SELECT id FROM comment WHERE parent = 1",
+				   "SELECT name FROM directory WHERE parent_name IS NULL",
+				   "SELECT name FROM file WHERE parent_name = 'Assignment0'",
+				   "SELECT revision FROM changed_path WHERE name >= 'Assignment0/' AND name < 'Assignment00'"]
+		return [' '.join(row[3] for row in self.session.execute(text('EXPLAIN QUERY PLAN ' + query)))
+				for query in queries]
+
+	# migrating an old database should index the hot columns, so their queries search an index instead of the table
+	def test_migrate_indexes_hot_columns(self):
+		# an old database has the tables without the new indexes
+		for index in ('ix_comment_file', 'ix_comment_parent', 'ix_directory_parent_name', 'ix_file_parent_name',
+					  'ix_changed_path_name'):
+			self.session.execute(text('DROP INDEX %s' % index))
+		self.session.commit()
+		for plan in self.query_plans():
+			self.assertFalse(plan.startswith('SEARCH') and 'INDEX' in plan, plan)
+		self.assertEqual(schema_version(self.session), 0)
+		self.assertEqual(migrate(self.session), ['collapse_duplicate_revisions', 'migrate_revisions_to_changesets',
+												 'add_hot_column_indexes', 'add_timestamp_columns'])
+		for plan in self.query_plans():
+			self.assertTrue(plan.startswith('SEARCH') and 'INDEX' in plan, plan)
+		# an up to date database is left alone
+		self.assertEqual(schema_version(self.session), len(MIGRATIONS))
+		self.assertEqual(migrate(self.session), [])
+
+	# migrating should add the timestamp columns to an old database and fill them from the svn dates
+	def test_migrate_timestamps(self):
+		for table in ('directory', 'file', 'changeset'):
+			self.session.execute(text('DROP INDEX ix_%s_timestamp' % table))
+			self.session.execute(text('ALTER TABLE %s DROP COLUMN timestamp' % table))
+		self.session.execute(text("INSERT INTO changeset (revision, date, author, msg) "
+								  "VALUES (805, '2017-03-21T15:08:51.388154Z', 'lstrait2', 'm'), (804, 'd', 'lstrait2', 'm'), "
+								  "(803, '2017-03-21 15:08:51', 'lstrait2', 'm')"))
+		self.session.execute(text("INSERT INTO directory (name, revision, date, author) "
+								  "VALUES ('Assignment0', 805, '2017-03-21T15:08:51.388154Z', 'lstrait2')"))
+		self.session.commit()
+		migrate(self.session)
+		self.assertEqual(self.session.get(Changeset, 805).timestamp, date_timestamp('2017-03-21T15:08:51.388154Z'))
+		self.assertEqual(self.session.get(Changeset, 805).timestamp, 1490108931)
+		self.assertIsNone(self.session.get(Changeset, 804).timestamp)
+		# only svn dates are converted, the same ones date_timestamp accepts
+		self.assertIsNone(self.session.get(Changeset, 803).timestamp)
+		self.assertEqual(self.session.get(Directory, 'Assignment0').timestamp, 1490108931)
+		plan = ' '.join(row[3] for row in self.session.execute(
+			text('EXPLAIN QUERY PLAN SELECT revision FROM changeset WHERE timestamp >= 1490000000')))
+		self.assertIn('ix_changeset_timestamp', plan)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,180 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app import app, db
+from model.high_water_mark import HighWaterMark
+from model.ingest import BulkIngest
+from model.parser.xml_parser import XMLParser
+from model.portfolio.lazy_repository import LazyRepository
+from model.portfolio.read_model import ReadRepository
+from model.portfolio.refresher import INGEST_GENERATION_MARK
+from model.portfolio.repository import Repository
+from model.storage import set_pragmas, create_read_engine
+
+
+class LazyRepositoryTests(unittest.TestCase):
+
+	def setUp(self):
+		# ingest into a scratch database opened the way app.py opens the real one
+		self.tmp_dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp_dir, 'portfolio.db')
+		self.engine = create_engine('sqlite:///' + self.path)
+		set_pragmas(self.engine, app.config['SQLITE_PRAGMAS'])
+		db.metadata.create_all(self.engine)
+		self.session = sessionmaker(bind=self.engine)()
+		portfolio = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml').parse_subversion_xml()
+		# store rows out of name order, like a database built up over many ingests
+		portfolio.directories = dict(reversed(list(portfolio.directories.items())))
+		portfolio.files = dict(reversed(list(portfolio.files.items())))
+		BulkIngest(self.session).ingest(portfolio)
+		self.bump_generation()
+		self.read_engine = create_read_engine(self.path, app.config['SQLITE_PRAGMAS'], pool_size=2)
+		self.eager = ReadRepository(Repository.generate_portfolio_from_db(db, session=self.session))
+		self.generate = Repository.generate_portfolio_from_db
+
+	def tearDown(self):
+		self.session.close()
+		self.read_engine.dispose()
+		self.engine.dispose()
+		shutil.rmtree(self.tmp_dir)
+
+	def bump_generation(self):
+		HighWaterMark.increment(self.session.connection(), INGEST_GENERATION_MARK)
+		self.session.commit()
+
+	def count_loads(self):
+		return mock.patch.object(Repository, 'generate_portfolio_from_db', side_effect=self.generate)
+
+	def flatten(self, tree, depth=0):
+		rows = []
+		for entry, children in tree:
+			last_commit = entry.get_last_commit()
+			rows.append((depth, entry.name, entry.revision, last_commit and last_commit.revision,
+						 [version.revision for version in entry.versions]))
+			rows.extend(self.flatten(children, depth + 1))
+		return rows
+
+	# only the top-level directories should be read up front, each tree on first access
+	def test_cold_load(self):
+		repo = LazyRepository(db, self.read_engine)
+		self.assertEqual(list(repo.loaded), [])
+		self.assertEqual([assignment.name for assignment in repo.assignments],
+						 [assignment.name for assignment in self.eager.assignments])
+		self.assertEqual(repo.get_latest_commit().revision, self.eager.get_latest_commit().revision)
+		self.assertEqual(repo.generation, 1)
+		assignment = repo.get_assignment('Assignment1.0')
+		self.assertEqual(list(repo.loaded), ['Assignment1.0'])
+		self.assertEqual(len(assignment.children), len(self.eager.get_assignment('Assignment1.0').children))
+		self.assertIsNone(repo.get_assignment('Nope'))
+		self.assertIsNone(repo.get_file('Nope/a.txt'))
+		self.assertEqual(list(repo.loaded), ['Assignment1.0'])
+
+	# a loaded tree should be served from the cache without reading the database again
+	def test_cache_hit(self):
+		repo = LazyRepository(db, self.read_engine)
+		with self.count_loads() as generate:
+			subtree = repo.load('Assignment0')
+			self.assertIs(repo.load('Assignment0'), subtree)
+			self.assertIs(repo.get_file_owner('Assignment0/CS440_MP1/mazes/large_maze.txt'),
+						  subtree.get_assignment('Assignment0'))
+		self.assertEqual(generate.call_count, 1)
+
+	# the least recently used tree should be dropped once more than cache_size are loaded
+	def test_eviction(self):
+		repo = LazyRepository(db, self.read_engine, cache_size=2)
+		with self.count_loads() as generate:
+			repo.load('Assignment0')
+			repo.load('Assignment1.0')
+			repo.load('Assignment0')
+			repo.load('Assignment2.0')
+			self.assertEqual(list(repo.loaded), ['Assignment0', 'Assignment2.0'])
+			repo.load('Assignment1.0')
+			self.assertEqual(list(repo.loaded), ['Assignment2.0', 'Assignment1.0'])
+		self.assertEqual(generate.call_count, 4)
+
+	# requests for a tree that is already being loaded should wait for that load instead of starting another
+	def test_concurrent_load(self):
+		repo = LazyRepository(db, self.read_engine)
+		started = threading.Event()
+		release = threading.Event()
+
+		def slow_generate(*args):
+			started.set()
+			release.wait()
+			return self.generate(*args)
+
+		results = []
+		with mock.patch.object(Repository, 'generate_portfolio_from_db', side_effect=slow_generate) as generate:
+			threads = [threading.Thread(target=lambda: results.append(repo.load('Assignment0'))) for _ in range(2)]
+			threads[0].start()
+			started.wait()
+			threads[1].start()
+			# let the second request reach the load in progress before it finishes
+			time.sleep(0.1)
+			release.set()
+			for thread in threads:
+				thread.join()
+		self.assertEqual(generate.call_count, 1)
+		self.assertIs(results[0], results[1])
+		self.assertEqual(repo.loading, {})
+
+	# a failed load should reach the caller and leave nothing behind, so the next request tries again
+	def test_failed_load(self):
+		repo = LazyRepository(db, self.read_engine)
+		with mock.patch.object(Repository, 'generate_portfolio_from_db', side_effect=ValueError('broken')):
+			self.assertRaises(ValueError, repo.load, 'Assignment0')
+		self.assertEqual((repo.loaded, repo.loading), ({}, {}))
+		self.assertIsNotNone(repo.get_assignment('Assignment0'))
+
+	# lazily loaded pages should be the same as pages of the eagerly loaded repository, in the same order
+	def test_matches_eager(self):
+		repo = LazyRepository(db, self.read_engine, cache_size=1)
+		for assignment in self.eager.assignments:
+			name = assignment.name
+			self.assertEqual(self.flatten(repo.tree(name)), self.flatten(self.eager.tree(name)))
+			self.assertEqual(repo.count_descendants(name), self.eager.count_descendants(name))
+			self.assertEqual([related.name for related in repo.get_related_assignments(name)],
+							 [related.name for related in self.eager.get_related_assignments(name)])
+		for file_name in self.eager.files:
+			self.assertEqual(repo.get_file(file_name).size, self.eager.get_file(file_name).size)
+			# files outside assignments have no owner in either
+			owner = self.eager.get_file_owner(file_name)
+			lazy_owner = repo.get_file_owner(file_name)
+			self.assertEqual(lazy_owner and lazy_owner.name, owner and owner.name)
+		self.assertEqual(repo.resolve('Assignment0/CS440_MP1').name, 'Assignment0/CS440_MP1')
+
+	# activity queries should give the same revisions as the eager timeline, newest first
+	def test_activity_matches_eager(self):
+		repo = LazyRepository(db, self.read_engine)
+
+		def changes(revisions):
+			return [(revision.name, revision.revision, revision.timestamp) for revision in revisions]
+
+		self.assertEqual(changes(repo.latest_changes(5)), changes(self.eager.latest_changes(5)))
+		start = self.eager.latest_changes(40)[-1].timestamp
+		end = self.eager.latest_changes(10)[-1].timestamp
+		self.assertEqual(changes(repo.changes_between(start, end)), changes(self.eager.changes_between(start, end)))
+		self.assertEqual(changes(repo.changes_between(start, end, 3)),
+						 changes(self.eager.changes_between(start, end, 3)))
+
+	# a tree loaded after a newer ingest should be served but not cached, and no read should stay open
+	def test_newer_generation_not_cached(self):
+		repo = LazyRepository(db, self.read_engine)
+		repo.load('Assignment0')
+		self.bump_generation()
+		self.assertIsNotNone(repo.load('Assignment1.0').get_assignment('Assignment1.0'))
+		self.assertEqual(list(repo.loaded), ['Assignment0'])
+		# a WAL checkpoint can only finish when no reader holds an old snapshot
+		busy = self.session.execute(text('PRAGMA wal_checkpoint(TRUNCATE)')).first()[0]
+		self.assertEqual(busy, 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,11 +1,49 @@
-from app import app, db
+import atexit
+from sqlalchemy.orm import sessionmaker
+from app import app, db, read_engine
+from model.comment_writer import CommentWriter
+from model.migrations import migrate
 from model.portfolio.repository import Repository
+from model.portfolio.read_model import ReadRepository
+from model.portfolio.lazy_repository import LazyRepository
+from model.portfolio.refresher import RepositoryHolder, Refresher
 from view.portfolio_views import construct_portfolio_blueprint
+from view.render_cache import RenderCache
 
-# create portfolio using database
-portfolio = Repository.generate_portfolio_from_db(db)
+
+def build_portfolio():
+	""" Create portfolio using database, served from read-only copies detached from the db session
+
+	:return: LazyRepository or ReadRepository, depending on config
+	"""
+	if app.config['LAZY_LOAD_ASSIGNMENTS']:
+		return LazyRepository(db, read_engine, app.config['LAZY_LOAD_CACHE_SIZE'])
+	return ReadRepository(Repository.generate_portfolio_from_db(db))
+
+
+with app.app_context():
+	# create missing tables and bring an older database up to date before reading it, see model/migrations.py
+	db.create_all()
+	migrate(db.session)
+	# read generation before building, so data ingested during the build is loaded by the refresher
+	generation = Refresher.current_generation()
+	portfolio_holder = RepositoryHolder(build_portfolio(), generation)
+	db.session.remove()
+# rebuild in the background whenever main_parser ingests new data
+if app.config['REFRESH_INTERVAL'] > 0:
+	refresher = Refresher(app, db, portfolio_holder, build_portfolio, app.config['REFRESH_INTERVAL'])
+	refresher.start()
+# optionally let posts queue their comments for a writer thread instead of each committing on its own
+comment_writer = None
+if app.config['WRITE_BEHIND_COMMENTS']:
+	with app.app_context():
+		comment_writer = CommentWriter(sessionmaker(bind=db.engine), app.config['COMMENT_WRITE_BATCH'])
+	comment_writer.start()
+	# write queued comments before the process exits
+	atexit.register(comment_writer.stop)
 # register routes for portfolio
-app.register_blueprint(construct_portfolio_blueprint(portfolio))
+app.register_blueprint(construct_portfolio_blueprint(portfolio_holder, RenderCache(app.config['RENDER_CACHE_SIZE']),
+													 comment_writer))
 if __name__ == '__main__':
 	# run the app
-	app.run()
\ No newline at end of file
+	app.run()
@@ -0,0 +1,16 @@
+from app import app, db
+from model.migrations import migrate, schema_version, MIGRATIONS
+# imported so create_all knows their tables
+from model.portfolio.entries import Directory, File, Comment
+from model.portfolio.revision import Revision
+from model.portfolio.changeset import Changeset, ChangedPath
+from model.high_water_mark import HighWaterMark
+from model.filter import Filter
+
+if __name__ == '__main__':
+	with app.app_context():
+		# create tables if they do not exist, then bring existing ones up to date
+		db.create_all()
+		for name in migrate(db.session):
+			print('applied %s' % name)
+		print('schema version %d of %d' % (schema_version(db.session), len(MIGRATIONS)))
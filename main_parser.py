@@ -1,61 +1,43 @@
-from app import db
+import argparse
+from app import app, db
 from model.parser.xml_parser import XMLParser
-from model.portfolio.entries import Directory, File
-from model.portfolio.revision import Revision
 from model.filter import Filter
+from model.high_water_mark import HighWaterMark
+from model.ingest import BulkIngest
+from model.portfolio.refresher import record_new_generation
+from model.migrations import migrate
 
-if __name__ == '__main__':
-	# create tables if they do not exist
-	db.create_all()
-	# run the parser to collect data
-	portfolio = XMLParser('resources/data/svn_list_new.xml', 'resources/data/svn_log_new.xml').parse_subversion_xml()
+# name of the high-water mark holding the newest ingested svn revision
+SVN_LOG_MARK = 'svn_log'
 
-	# add new data to portfolio
-	for directory in portfolio.directories.values():
-		# if directory not in database, add it
-		if not Directory.query.filter_by(name=directory.name).first():
-			db.session.add(directory)
-			db.session.commit()
-		# otherwise update the existing entry
-		else:
-			# must update each attribute manually bc of SQLAlchemy limitations
-			directory_row = Directory.query.filter_by(name=directory.name).first()
-			directory_row.name = directory.name
-			directory_row.revision = directory.revision
-			directory_row.date = directory.date
-			directory_row.summary = directory.summary
-			directory_row.author = directory.author
-			directory_row.parent_name = directory.parent_name
-		for version in directory.versions:
-			if Revision.query.filter_by(name=version.name, revision=version.revision):
-				db.session.add(version)
-				db.session.commit()
-			# no need for else clause here since old revision will not be updated
-	for file in portfolio.files.values():
-		# if file not in database, add it
-		if not File.query.filter_by(name=file.name).first():
-			db.session.add(file)
-			db.session.commit()
-		# otherwise update existing entry
-		else:
-			# must update each attribute manually bc of SQLAlchemy limitations
-			file_row = File.query.filter_by(name=file.name).first()
-			file_row.name = file.name
-			file_row.revision = file.revision
-			file_row.date = file.date
-			file_row.summary = file.summary
-			file_row.author = file.author
-			file_row.parent_name = file.parent_name
-		for version in file.versions:
-			if not Revision.query.filter_by(name=version.name, revision=version.revision).first():
-				db.session.add(version)
-				db.session.commit()
-			# no need for else clause here since old revision will not be updated
+if __name__ == '__main__':
+	arg_parser = argparse.ArgumentParser(description='Ingest subversion XML data into the portfolio database')
+	arg_parser.add_argument('--incremental', action='store_true',
+							help='only ingest revisions newer than the last ingested revision')
+	arg_parser.add_argument('--cache-dir', default='resources/cache',
+							help='directory for parsed snapshots of unchanged XML files')
+	args = arg_parser.parse_args()
+	with app.app_context():
+		# create tables if they do not exist
+		db.create_all()
+		# bring older databases up to date, see model/migrations.py
+		migrate(db.session)
+		# in incremental mode skip everything at or below the newest revision already ingested
+		since_revision = HighWaterMark.get_value(SVN_LOG_MARK) if args.incremental else None
+		# run the parser to collect data
+		parser = XMLParser('resources/data/svn_list_new.xml', 'resources/data/svn_log_new.xml',
+						   streaming=True, since_revision=since_revision, cache_dir=args.cache_dir)
+		portfolio = parser.parse_subversion_xml()
 
-	# add 5 filtered words to database
-	filtered_words = [Filter("shit", "apple"), Filter("fuck", "banana"), Filter("ass", "lemon"),
-					  Filter("bitch", "pineapple"), Filter("damn", "grape")]
-	for filtered_word in filtered_words:
-		if not Filter.query.filter_by(word=filtered_word.word).first():
-			db.session.add(filtered_word)
-			db.session.commit()
\ No newline at end of file
+		# 5 filtered words for comments
+		filtered_words = [Filter("shit", "apple"), Filter("fuck", "banana"), Filter("ass", "lemon"),
+						  Filter("bitch", "pineapple"), Filter("damn", "grape")]
+		# add new data to portfolio, updating entries that already exist
+		written = BulkIngest(db.session).ingest(portfolio, filtered_words, since_revision=since_revision)
+		# record newest ingested revision so the next incremental run can skip it
+		if parser.latest_revision is not None:
+			HighWaterMark.set_value(SVN_LOG_MARK, parser.latest_revision)
+		# tell running servers there is new data to load, filter words are versioned separately
+		if any(written[table] for table in ('directory', 'file', 'changeset', 'changed_path')):
+			record_new_generation()
+		db.session.commit()
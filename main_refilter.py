@@ -0,0 +1,23 @@
+import argparse
+from app import app, db
+from model.filter import FilterMatcher, Filter
+from model.refilter import CommentRefilter
+
+if __name__ == '__main__':
+	arg_parser = argparse.ArgumentParser(description='Apply the current filter words to stored comments')
+	arg_parser.add_argument('--chunk-size', type=int, default=1000,
+							help='number of comments read and committed at a time')
+	arg_parser.add_argument('--restart', action='store_true',
+							help='start from the first comment even if an earlier run was interrupted')
+	args = arg_parser.parse_args()
+	with app.app_context():
+		# compile the words as they are now, not a copy cached before they were changed
+		matcher = FilterMatcher(dict((filter_word.word, filter_word.replacement)
+									 for filter_word in Filter.query.all()))
+		# each chunk that changes comments bumps the comment generation, so servers render them again
+		stats = CommentRefilter(db.session, matcher, args.chunk_size).run(resume=not args.restart)
+	if stats['resumed_after'] is not None:
+		print('resumed after comment %d' % stats['resumed_after'])
+	rate = stats['scanned'] / stats['seconds'] if stats['seconds'] > 0 else 0
+	print('%d comments scanned, %d changed in %d chunks, %.2fs (%.0f comments/s)'
+		  % (stats['scanned'], stats['changed'], stats['chunks'], stats['seconds'], rate))
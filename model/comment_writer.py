@@ -0,0 +1,129 @@
+import queue
+import threading
+
+
+class PendingWrite(object):
+	""" Comment waiting to be written, with the outcome its poster waits for
+	"""
+
+	def __init__(self, comment):
+		""" Constructor
+
+		:param comment: new Comment, not added to any session
+		"""
+		self.comment = comment
+		self.done = threading.Event()
+		self.comment_id = None
+		self.error = None
+
+
+class CommentWriter(threading.Thread):
+	""" Background thread that writes posted comments in group commits. Comments posted while a commit runs are
+	written together by the next one, so a burst of posts shares a few fsyncs instead of paying one each
+	"""
+
+	def __init__(self, session_factory, max_batch=100, check_interval=1.0):
+		""" Constructor
+
+		:param session_factory: function returning a new database session, used only by the writer thread
+		:param max_batch: most comments written by one commit
+		:param check_interval: seconds a poster waits between checks that the writer thread is still running
+		"""
+		super(CommentWriter, self).__init__(name='comment-writer')
+		# stop drains the queue at exit, the thread itself should not keep the process alive
+		self.daemon = True
+		self.session_factory = session_factory
+		self.max_batch = max_batch
+		self.check_interval = check_interval
+		self.pending = queue.Queue()	# PendingWrite objects, None once stopped
+		self.lock = threading.Lock()	# nothing is queued after the stop marker
+		self.stopped = False
+
+	def write(self, comment):
+		""" Queue a comment and wait until it is committed, so the poster sees it when the page is shown again
+
+		:param comment: new Comment, the writer thread owns it from now on
+		:return: id of the written comment
+		"""
+		pending = PendingWrite(comment)
+		with self.lock:
+			queued = not self.stopped
+			if queued:
+				self.pending.put(pending)
+		if queued:
+			while not pending.done.wait(self.check_interval):
+				if not self.is_alive():
+					# the writer thread is gone and will never write it, so write it directly
+					self.write_batch([pending])
+					break
+		else:
+			# shutting down, so write it directly
+			self.write_batch([pending])
+		if pending.error is not None:
+			raise pending.error
+		return pending.comment_id
+
+	def run(self):
+		""" Write queued comments until stopped, each commit taking every comment queued meanwhile
+		"""
+		stopping = False
+		while not stopping:
+			batch = [self.pending.get()]
+			if batch[0] is None:
+				break
+			while len(batch) < self.max_batch:
+				try:
+					pending = self.pending.get_nowait()
+				except queue.Empty:
+					break
+				if pending is None:
+					stopping = True
+					break
+				batch.append(pending)
+			try:
+				self.write_batch(batch)
+			except Exception as error:
+				# fail this batch's posts but keep writing later ones
+				for pending in batch:
+					if not pending.done.is_set():
+						pending.error = error
+						pending.done.set()
+
+	def write_batch(self, batch):
+		""" Write comments in one commit. If the commit fails each comment is written on its own, so one bad
+		comment only fails its own post
+
+		:param batch: list of PendingWrite
+		"""
+		session = self.session_factory()
+		try:
+			session.add_all([pending.comment for pending in batch])
+			# flush assigns the ids without expiring the comments like commit does
+			session.flush()
+			comment_ids = [pending.comment.id for pending in batch]
+			session.commit()
+		except Exception as error:
+			session.rollback()
+			session.close()
+			if len(batch) > 1:
+				for pending in batch:
+					self.write_batch([pending])
+			else:
+				batch[0].error = error
+				batch[0].done.set()
+			return
+		session.close()
+		for pending, comment_id in zip(batch, comment_ids):
+			pending.comment_id = comment_id
+			pending.done.set()
+
+	def stop(self):
+		""" Write every queued comment, then stop. Registered with atexit so a clean shutdown loses nothing
+		"""
+		with self.lock:
+			if self.stopped:
+				return
+			self.stopped = True
+			self.pending.put(None)
+		if self.is_alive():
+			self.join()
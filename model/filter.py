@@ -1,4 +1,12 @@
+import re
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 from app import db
+from model.high_water_mark import HighWaterMark
+
+# name of the high-water mark bumped by every change to the Filter table, so each process sees when to recompile
+FILTER_VERSION_MARK = 'filter_version'
 
 
 class Filter(db.Model):
@@ -9,4 +17,112 @@ class Filter(db.Model):
 
 	def __init__(self, word, replacement):
 		self.word = word
-		self.replacement = replacement
\ No newline at end of file
+		self.replacement = replacement
+
+
+def trie_pattern(node):
+	""" Build regex for the words below a node of a character trie. Branches start with different characters and
+	longer words are tried before the words they start with, so each position is matched in one pass
+
+	:param node: dict of character -> child node, with '' marking the end of a word
+	:return: regex source matching the rest of every word below the node
+	"""
+	branches = [re.escape(char) + trie_pattern(child) for char, child in sorted(node.items()) if char != '']
+	if len(branches) == 0:
+		return ''
+	if len(branches) == 1 and '' not in node:
+		return branches[0]
+	pattern = '(?:%s)' % '|'.join(branches)
+	# a word ends here, so the longer words are optional and tried first
+	if '' in node:
+		pattern += '?'
+	return pattern
+
+
+class FilterMatcher(object):
+	""" Filter words compiled into one regex, so a message is filtered in a single pass however many words there are
+	"""
+
+	def __init__(self, replacements):
+		""" Constructor
+
+		:param replacements: dict of filter word -> replacement
+		"""
+		self.replacements = dict((word, replacement) for word, replacement in replacements.items() if word)
+		trie = {}
+		for word in self.replacements:
+			node = trie
+			for char in word:
+				node = node.setdefault(char, {})
+			node[''] = True
+		self.pattern = re.compile(trie_pattern(trie)) if trie else None
+
+	def apply(self, message):
+		""" Replace every filter word in a message, the longest word wins where words overlap
+
+		:param message: text to filter
+		:return: filtered text
+		"""
+		if self.pattern is None or message is None:
+			return message
+		return self.pattern.sub(lambda match: self.replacements[match.group(0)], message)
+
+
+class FilterCache(object):
+	""" Process wide FilterMatcher for the Filter table, compiled on first use and again whenever the filter version
+	shows the table changed, whichever process changed it
+	"""
+
+	def __init__(self):
+		""" Constructor
+		"""
+		self.matcher = None
+		self.version = None				# filter version the matcher was compiled from
+		self.lock = threading.Lock()	# comments may be posted from several threads
+
+	def get(self, session=None):
+		""" Get matcher for the stored filter words. Only the filter version is read on every call, the words are
+		read and compiled again only if it changed since last use
+
+		:param session: session to read with, None to use the db session
+		:return: FilterMatcher
+		"""
+		if session is None:
+			session = db.session
+		version = HighWaterMark.get_value(FILTER_VERSION_MARK, session)
+		# uncommitted changes may still be rolled back, so a matcher compiled from them is only used this time
+		cacheable = not session.info.get('filters_changed', False)
+		matcher = self.matcher
+		if cacheable and matcher is not None and version == self.version:
+			return matcher
+		with self.lock:
+			if cacheable and self.matcher is not None and version == self.version:
+				return self.matcher
+			matcher = FilterMatcher(dict((filter_word.word, filter_word.replacement)
+										 for filter_word in session.query(Filter)))
+			if cacheable:
+				self.matcher = matcher
+				self.version = version
+			return matcher
+
+
+filter_cache = FilterCache()
+
+
+def bump_filter_version(mapper, connection, target):
+	""" Bump the filter version in the same transaction as a change to the Filter table
+	"""
+	HighWaterMark.increment(connection, FILTER_VERSION_MARK)
+	object_session(target).info['filters_changed'] = True
+
+
+def end_filter_changes(session):
+	""" Forget a session's filter changes once they are committed or rolled back
+	"""
+	session.info.pop('filters_changed', None)
+
+
+for event_name in ('after_insert', 'after_update', 'after_delete'):
+	event.listen(Filter, event_name, bump_filter_version)
+for event_name in ('after_commit', 'after_rollback'):
+	event.listen(Session, event_name, end_filter_changes)
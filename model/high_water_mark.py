@@ -0,0 +1,56 @@
+from sqlalchemy.dialects.sqlite import insert
+from app import db
+
+
+class HighWaterMark(db.Model):
+	""" Class to record how far an incremental job has progressed
+	"""
+	name = db.Column(db.String(50), primary_key=True)
+	value = db.Column(db.Integer)
+
+	def __init__(self, name, value):
+		""" Constructor
+
+		:param name: name of the job the mark belongs to
+		:param value: highest value the job has processed
+		"""
+		self.name = name
+		self.value = value
+
+	@staticmethod
+	def get_value(name, session=None):
+		""" Get the stored mark for a job
+
+		:param name: name of the job
+		:param session: session to read with, None to use the db session
+		:return: highest value processed by the job, or None if it has never run
+		"""
+		if session is None:
+			session = db.session
+		# only the value, so a mark changed by another connection is never read from the identity map
+		return session.query(HighWaterMark.value).filter_by(name=name).scalar()
+
+	@staticmethod
+	def set_value(name, value):
+		""" Store a new mark for a job. Caller is responsible for committing
+
+		:param name: name of the job
+		:param value: highest value processed by the job
+		"""
+		mark = HighWaterMark.query.filter_by(name=name).first()
+		if mark is None:
+			db.session.add(HighWaterMark(name, value))
+		else:
+			mark.value = value
+
+	@staticmethod
+	def increment(connection, name):
+		""" Add one to a job's mark with a single statement, starting it at 1. Usable during a flush, where the
+		session cannot add objects. Caller is responsible for committing
+
+		:param connection: database connection to write with
+		:param name: name of the job
+		"""
+		statement = insert(HighWaterMark).values(name=name, value=1)
+		connection.execute(statement.on_conflict_do_update(index_elements=[HighWaterMark.name],
+														   set_={'value': HighWaterMark.value + 1}))
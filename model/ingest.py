@@ -0,0 +1,173 @@
+from model.portfolio.entries import Directory, File
+from model.portfolio.changeset import Changeset, ChangedPath
+from model.portfolio.revision import date_timestamp
+from model.filter import Filter, FILTER_VERSION_MARK
+from model.high_water_mark import HighWaterMark
+
+
+class BulkIngest(object):
+	""" Class to write parsed subversion data to the database in batches
+	"""
+
+	def __init__(self, session, batch_size=500):
+		""" Constructor.
+
+		:param session: database session to write with
+		:param batch_size: number of rows per existence check and bulk statement, kept below SQLite's variable limit
+		"""
+		self.session = session
+		self.batch_size = batch_size
+		self.changeset_keys = None		# revision number of stored changesets after since_revision, loaded on first use
+		self.changed_path_keys = None	# (revision, name) of stored changed paths after since_revision, loaded on first use
+
+	def ingest(self, portfolio, filters=(), since_revision=None):
+		""" Write repository data and filter words to the database, one transaction per table
+
+		:param portfolio: repository data created by XMLParser
+		:param filters: Filter objects to add if their word is not stored yet
+		:param since_revision: skip entries last changed at or below this revision, None to write everything
+		:return: dict of number of rows written per table
+		"""
+		directories = self.changed_entries(portfolio.directories.values(), since_revision)
+		files = self.changed_entries(portfolio.files.values(), since_revision)
+		written = {
+			'directory': self.upsert_entries(Directory, directories),
+			'file': self.upsert_entries(File, files),
+		}
+		written['changeset'], written['changed_path'] = self.insert_changes(directories, files, since_revision)
+		written['filter'] = self.insert_filters(filters)
+		return written
+
+	@staticmethod
+	def changed_entries(entries, since_revision):
+		""" Get the entries changed after given revision
+
+		:param entries: directories or files to check
+		:param since_revision: revision already ingested, None if nothing has been ingested
+		:return: list of entries changed after since_revision
+		"""
+		if since_revision is None:
+			return list(entries)
+		return [entry for entry in entries if int(entry.revision) > since_revision]
+
+	def batches(self, rows):
+		""" Split rows into batches
+
+		:param rows: list of rows to split
+		:return: generator of lists of at most batch_size rows
+		"""
+		for start in range(0, len(rows), self.batch_size):
+			yield rows[start:start + self.batch_size]
+
+	def existing_values(self, column, values):
+		""" Find which values are already stored in a column, with one query per batch
+
+		:param column: model column to check
+		:param values: values to look for
+		:return: set of values already in the column
+		"""
+		existing = set()
+		for batch in self.batches(list(values)):
+			existing.update(row[0] for row in self.session.query(column).filter(column.in_(batch)))
+		return existing
+
+	def upsert_entries(self, model, entries):
+		""" Insert new directories or files and update the ones already stored
+
+		:param model: Directory or File
+		:param entries: entries of given model to write
+		:return: number of rows written
+		"""
+		rows = [self.entry_row(entry) for entry in entries]
+		existing = self.existing_values(model.name, [row['name'] for row in rows])
+		new_rows = [row for row in rows if row['name'] not in existing]
+		updated_rows = [row for row in rows if row['name'] in existing]
+		for batch in self.batches(new_rows):
+			self.session.bulk_insert_mappings(model, batch)
+		for batch in self.batches(updated_rows):
+			self.session.bulk_update_mappings(model, batch)
+		self.session.commit()
+		return len(rows)
+
+	def insert_changes(self, directories, files, since_revision=None):
+		""" Insert commits and changed paths not already stored. Old commits never change so are not updated
+
+		:param directories: directories whose revisions to write
+		:param files: files whose revisions to write
+		:param since_revision: revision already ingested, its changes and older ones are skipped without a lookup
+		:return: (number of changesets written, number of changed paths written)
+		"""
+		if self.changed_path_keys is None:
+			self.changeset_keys, self.changed_path_keys = self.stored_change_keys(since_revision)
+		changesets = []
+		changed_paths = []
+		for kind, entries in (('dir', directories), ('file', files)):
+			for entry in entries:
+				for version in entry.versions:
+					revision = int(version.revision)
+					if since_revision is not None and revision <= since_revision:
+						continue
+					key = (revision, version.name)
+					# skip paths already stored, or repeated in this ingest
+					if key in self.changed_path_keys:
+						continue
+					self.changed_path_keys.add(key)
+					changed_paths.append({'revision': revision, 'name': version.name, 'kind': kind,
+										  'action': version.action})
+					# commit metadata is written once, by the first path seen
+					if revision not in self.changeset_keys:
+						self.changeset_keys.add(revision)
+						changesets.append({'revision': revision, 'date': version.date, 'timestamp': version.timestamp,
+										   'author': version.author, 'msg': version.msg})
+		for batch in self.batches(changesets):
+			self.session.bulk_insert_mappings(Changeset, batch)
+		for batch in self.batches(changed_paths):
+			self.session.bulk_insert_mappings(ChangedPath, batch)
+		self.session.commit()
+		return len(changesets), len(changed_paths)
+
+	def stored_change_keys(self, since_revision=None):
+		""" Load the key of stored changesets and changed paths, with one query each. Incremental ingests only
+		need the ones after the revisions already ingested, read from the revision indexes
+
+		:param since_revision: only load keys of later revisions, None to load every key
+		:return: (set of revision numbers, set of (revision, name) pairs)
+		"""
+		changeset_query = self.session.query(Changeset.revision)
+		changed_path_query = self.session.query(ChangedPath.revision, ChangedPath.name)
+		if since_revision is not None:
+			changeset_query = changeset_query.filter(Changeset.revision > since_revision)
+			changed_path_query = changed_path_query.filter(ChangedPath.revision > since_revision)
+		changesets = set(row[0] for row in changeset_query)
+		changed_paths = set((revision, name) for revision, name in changed_path_query)
+		return changesets, changed_paths
+
+	def insert_filters(self, filters):
+		""" Insert filter words not already stored
+
+		:param filters: Filter objects to write
+		:return: number of rows written
+		"""
+		existing = self.existing_values(Filter.word, [filter_word.word for filter_word in filters])
+		rows = [{'word': filter_word.word, 'replacement': filter_word.replacement}
+				for filter_word in filters if filter_word.word not in existing]
+		self.session.bulk_insert_mappings(Filter, rows)
+		# bulk inserts skip the mapper events that bump the filter version
+		if rows:
+			HighWaterMark.increment(self.session.connection(), FILTER_VERSION_MARK)
+		self.session.commit()
+		return len(rows)
+
+	@staticmethod
+	def entry_row(entry):
+		""" Convert directory or file into a row mapping
+
+		:param entry: Directory or File to convert
+		:return: dict of column values for the entry
+		"""
+		row = {'name': entry.name, 'revision': int(entry.revision), 'date': entry.date,
+			   'timestamp': date_timestamp(entry.date), 'author': entry.author, 'summary': entry.summary,
+			   'parent_name': entry.parent_name}
+		if isinstance(entry, File):
+			row['size'] = int(entry.size)
+		return row
@@ -0,0 +1,105 @@
+from sqlalchemy import text
+from model.portfolio.revision import date_timestamp
+
+
+def collapse_duplicate_revisions(session):
+	""" Remove duplicate (name, revision) rows from revision table, keeping the first one ingested,
+	then add the unique index so duplicates cannot come back
+
+	:param session: database session to migrate with
+	:return: number of duplicate rows removed
+	"""
+	result = session.execute(text('DELETE FROM revision WHERE id NOT IN '
+								  '(SELECT MIN(id) FROM revision GROUP BY name, revision)'))
+	session.execute(text('CREATE UNIQUE INDEX IF NOT EXISTS ix_revision_name_revision ON revision (name, revision)'))
+	session.commit()
+	return result.rowcount
+
+
+def migrate_revisions_to_changesets(session):
+	""" Move rows of the revision table into changeset and changed_path, storing each commit's metadata once.
+	Kind is taken from the directory table, action is unknown for migrated rows
+
+	:param session: database session to migrate with
+	:return: number of changed paths copied
+	"""
+	session.execute(text('INSERT OR IGNORE INTO changeset (revision, date, author, msg) '
+						 'SELECT revision, date, author, msg FROM revision '
+						 'WHERE id IN (SELECT MIN(id) FROM revision GROUP BY revision)'))
+	result = session.execute(text("INSERT OR IGNORE INTO changed_path (revision, name, kind, action) "
+								  "SELECT revision.revision, revision.name, "
+								  "CASE WHEN directory.name IS NULL THEN 'file' ELSE 'dir' END, NULL "
+								  "FROM revision LEFT JOIN directory ON directory.name = revision.name "
+								  "ORDER BY revision.id"))
+	# every row is now in the new tables
+	session.execute(text('DELETE FROM revision'))
+	session.commit()
+	return result.rowcount
+
+
+def add_hot_column_indexes(session):
+	""" Index the columns the site filters on, which create_all only adds to new tables: comments by file and by
+	parent, directories and files by parent, and changed paths by name for subtree loads
+
+	:param session: database session to migrate with
+	"""
+	for index, table, column in (('ix_comment_file', 'comment', 'file'), ('ix_comment_parent', 'comment', 'parent'),
+								 ('ix_directory_parent_name', 'directory', 'parent_name'),
+								 ('ix_file_parent_name', 'file', 'parent_name'),
+								 ('ix_changed_path_name', 'changed_path', 'name')):
+		session.execute(text('CREATE INDEX IF NOT EXISTS %s ON %s (%s)' % (index, table, column)))
+	session.commit()
+
+
+def add_timestamp_columns(session):
+	""" Add the indexed integer timestamp column to directory, file and changeset, filled from the svn dates
+
+	:param session: database session to migrate with
+	"""
+	for table in ('directory', 'file', 'changeset'):
+		columns = [row[1] for row in session.execute(text('PRAGMA table_info(%s)' % table))]
+		if 'timestamp' not in columns:
+			session.execute(text('ALTER TABLE %s ADD COLUMN timestamp INTEGER' % table))
+		# converted with date_timestamp, like ingested rows, so both accept the same dates. Others stay NULL
+		rows = session.execute(text('SELECT rowid, date FROM %s WHERE timestamp IS NULL' % table))
+		updates = []
+		for row, date in rows:
+			timestamp = date_timestamp(date)
+			if timestamp is not None:
+				updates.append({'row': row, 'timestamp': timestamp})
+		if updates:
+			session.execute(text('UPDATE %s SET timestamp = :timestamp WHERE rowid = :row' % table), updates)
+		session.execute(text('CREATE INDEX IF NOT EXISTS ix_%s_timestamp ON %s (timestamp)' % (table, table)))
+	session.commit()
+
+# schema migrations in the order they were added, each safe to run again if it was interrupted.
+# A database's user_version is the number of them already applied, so only append to this list
+MIGRATIONS = [collapse_duplicate_revisions, migrate_revisions_to_changesets, add_hot_column_indexes,
+			  add_timestamp_columns]
+
+
+def schema_version(session):
+	""" Get number of migrations applied to a database
+
+	:param session: database session
+	:return: sqlite user_version of the database
+	"""
+	return session.execute(text('PRAGMA user_version')).scalar()
+
+
+def migrate(session):
+	""" Bring a database up to date in place by running every migration it has not had yet, in order.
+	Tables must already exist, so call db.create_all first
+
+	:param session: database session to migrate with
+	:return: names of the migrations run
+	"""
+	applied = []
+	version = schema_version(session)
+	for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+		migration(session)
+		# recorded after the migration commits, an interrupted one is run again next time
+		session.execute(text('PRAGMA user_version = %d' % number))
+		session.commit()
+		applied.append(migration.__name__)
+	return applied
@@ -1,45 +1,206 @@
+import glob
+import hashlib
+import mmap
+import multiprocessing
+import os
+import pickle
+import tempfile
 import xml.etree.ElementTree as ET
 from model.portfolio.entries import Directory, File
-from model.portfolio.revision import Revision
+from model.portfolio.revision import RevisionInfo, PathRevision, intern_text
 from model.portfolio.repository import Repository
 
 
+# bump when the snapshot layout changes so old snapshots are ignored
+SNAPSHOT_VERSION = 4
+SNAPSHOT_PREFIX = 'svn_snapshot_'
+# log shards per worker process, more than one so workers finishing early can take another shard
+SHARDS_PER_WORKER = 4
+
+
+def parse_list_records(list_file):
+	""" Parse every entry of a svn_list file into plain tuples. Runs in a worker process
+
+	:param list_file: XML output of svn_list command
+	:return: list of entry data from XMLParser.entry_record
+	"""
+	return [XMLParser.entry_record(entry) for entry in XMLParser.iterparse_elements(list_file, 'entry')]
+
+
+def parse_log_shard(log_file, start, end):
+	""" Parse the log entries in a byte range of a svn_log file into plain tuples. Runs in a worker process
+
+	:param log_file: XML output of svn_log command
+	:param start: offset of the first log entry in the shard
+	:param end: offset just past the last log entry in the shard
+	:return: list of log entry data from XMLParser.log_entry_record, in file order
+	"""
+	with open(log_file, 'rb') as data:
+		data.seek(start)
+		shard = data.read(end - start)
+	root = ET.fromstring(b'<log>' + shard + b'</log>')
+	return [XMLParser.log_entry_record(log_entry) for log_entry in root.iter('logentry')]
+
+
 class XMLParser(object):
 	""" Class to allow for Parsing of XML data from subversion
 	"""
 
-	def __init__(self, list_file, log_file):
+	def __init__(self, list_file, log_file, streaming=False, since_revision=None, cache_dir=None, workers=1):
 		""" Constructor.
 
 		:param list_file: XML output of svn_list command
 		:param log_file: XML output of svn_log command
+		:param streaming: parse incrementally, freeing each entry once it has been handled
+		:param since_revision: skip log entries at or below this revision, None to parse the whole log
+		:param cache_dir: directory for snapshots of the whole log keyed on the input files, None or since_revision to skip
+		:param workers: number of processes to parse with, more than 1 parses list and log concurrently
 		"""
 		self.svn_repo = None
 		self.list_file = list_file
 		self.log_file = log_file
+		self.streaming = streaming
+		self.since_revision = since_revision
+		self.cache_dir = cache_dir
+		self.workers = workers
+		self.latest_revision = None		# highest revision seen in the log
 
 	def parse_subversion_xml(self):
+		""" Parse XML data from given subversion files, or load it from the snapshot cache
+		if the files have not changed since they were last parsed. Incremental parses never use the cache
+
+		:return: repository data from given XML files
+		"""
+		# incremental runs stop reading the log early, which is cheaper than loading the whole log from a snapshot
+		if self.cache_dir is None or self.since_revision is not None:
+			return self.parse_files()
+		snapshot_file = self.snapshot_path()
+		snapshot = self.load_snapshot(snapshot_file)
+		if snapshot is None:
+			repo = self.parse_files()
+			self.save_snapshot(snapshot_file, self.snapshot_from_repository(repo))
+			return repo
+		self.svn_repo = self.repository_from_snapshot(snapshot)
+		return self.svn_repo
+
+	def parse_files(self):
 		""" Parse XML data from given subversion files
 
 		:return: repository data from given XML files
 		"""
-		self.svn_repo = self.parse_xml_list()
-		self.parse_xml_log()
+		if self.workers > 1:
+			self.parse_parallel()
+		else:
+			self.svn_repo = self.parse_xml_list()
+			self.parse_xml_log()
 		return self.svn_repo
 
+	def snapshot_path(self):
+		""" Get path of the snapshot for the current input files. The name is a hash of both files'
+		content and modification times, so any change to the input uses a different snapshot
+
+		:return: path of snapshot file in cache_dir
+		"""
+		digest = hashlib.sha1()
+		digest.update(('%d:' % SNAPSHOT_VERSION).encode('utf-8'))
+		for xml_file in [self.list_file, self.log_file]:
+			digest.update(('%d:' % os.stat(xml_file).st_mtime_ns).encode('utf-8'))
+			with open(xml_file, 'rb') as data:
+				for chunk in iter(lambda: data.read(1 << 20), b''):
+					digest.update(chunk)
+			# separate the files so content cannot shift from one to the other
+			digest.update(b'\0')
+		return os.path.join(self.cache_dir, SNAPSHOT_PREFIX + digest.hexdigest() + '.pickle')
+
+	@staticmethod
+	def load_snapshot(snapshot_file):
+		""" Load a snapshot from cache
+
+		:param snapshot_file: path of snapshot
+		:return: snapshot data, or None if there is no usable snapshot
+		"""
+		try:
+			with open(snapshot_file, 'rb') as data:
+				return pickle.load(data)
+		except (IOError, OSError, EOFError, pickle.UnpicklingError):
+			return None
+
+	def save_snapshot(self, snapshot_file, snapshot):
+		""" Write a snapshot to cache, replacing snapshots of older input files
+
+		:param snapshot_file: path of snapshot
+		:param snapshot: snapshot data
+		"""
+		if not os.path.isdir(self.cache_dir):
+			os.makedirs(self.cache_dir)
+		for old_snapshot in glob.glob(os.path.join(self.cache_dir, SNAPSHOT_PREFIX + '*.pickle')):
+			os.remove(old_snapshot)
+		# write to a temporary file first so readers never see a partial snapshot
+		handle, tmp_file = tempfile.mkstemp(dir=self.cache_dir)
+		with os.fdopen(handle, 'wb') as data:
+			pickle.dump(snapshot, data, pickle.HIGHEST_PROTOCOL)
+		os.rename(tmp_file, snapshot_file)
+
+	def snapshot_from_repository(self, repo):
+		""" Flatten repository into plain tuples for the snapshot cache, storing each commit's metadata once
+
+		:param repo: repository to flatten
+		:return: snapshot data
+		"""
+		commits = {}
+		for entry in list(repo.directories.values()) + list(repo.files.values()):
+			for version in entry.versions:
+				commits[version.revision] = (version.date, version.author, version.msg)
+		directories = [(directory.name, directory.revision, directory.date, directory.author,
+						[(version.revision, version.action) for version in directory.versions])
+					   for directory in repo.directories.values()]
+		files = [(file.name, file.revision, file.date, file.author, file.size,
+				  [(version.revision, version.action) for version in file.versions]) for file in repo.files.values()]
+		return {'directories': directories, 'files': files, 'commits': commits, 'latest_revision': self.latest_revision}
+
+	def repository_from_snapshot(self, snapshot):
+		""" Rebuild repository from snapshot data
+
+		:param snapshot: snapshot data
+		:return: repository data, same as parsing the XML files
+		"""
+		directories = {}
+		files = {}
+		for name, revision, date, author, _ in snapshot['directories']:
+			directories[name] = Directory(intern_text(name), revision, date, author)
+		for name, revision, date, author, size, _ in snapshot['files']:
+			files[name] = File(intern_text(name), revision, date, author, size)
+		repo = Repository(directories, files)
+		infos = dict((revision, RevisionInfo(revision, date, author, msg))
+					 for revision, (date, author, msg) in snapshot['commits'].items())
+		# add revisions once the tree is built so last commits roll up
+		for entry_data, entries in [(snapshot['directories'], directories), (snapshot['files'], files)]:
+			for record in entry_data:
+				entry = entries[record[0]]
+				for revision, action in record[-1]:
+					entry.versions.append(PathRevision(entry.name, infos[revision], action))
+		self.latest_revision = snapshot['latest_revision']
+		return repo
+
 	def parse_xml_list(self):
 		""" Parse XML output of svn_list command
 
 		:return: repository data from given XML file
 		"""
-		root = ET.parse(self.list_file).getroot()
+		# grab all entries from list file
+		return self.build_repository(self.parse_entry(entry) for entry in self.iter_elements(self.list_file, 'entry'))
+
+	@staticmethod
+	def build_repository(entries):
+		""" Create repository from parsed list entries
+
+		:param entries: Directory and File objects
+		:return: repository data
+		"""
 		directories = {}
 		files = {}
-		# grab all entries from list file
-		entries = [entry for entry in root.iter('entry')]
-		for entry in entries:
-			# parse the entry and determine if it is a dictionary or file
-			parsed_entry = self.parse_entry(entry)
+		for parsed_entry in entries:
+			# determine if entry is a dictionary or file
 			if type(parsed_entry) is Directory:
 				directories[parsed_entry.name] = parsed_entry
 			else:
@@ -52,18 +213,128 @@ class XMLParser(object):
 
 		:return: repository data from given XML file
 		"""
-		root = ET.parse(self.log_file).getroot()
-		log_entries = [log_entry for log_entry in root.iter('logentry')]
 		# iterate over each log entry and parse
-		for log_entry in log_entries:
+		for log_entry in self.iter_elements(self.log_file, 'logentry'):
+			# svn log is newest first, so every remaining entry has already been ingested
+			if not self.track_revision(log_entry.attrib['revision']):
+				break
 			self.parse_log_entry(log_entry)
 
+	def track_revision(self, revision_num):
+		""" Check a log entry's revision against since_revision and record the newest revision seen
+
+		:param revision_num: revision of the log entry
+		:return: False if the revision was already ingested and should be skipped
+		"""
+		revision_num = int(revision_num)
+		if self.since_revision is not None and revision_num <= self.since_revision:
+			return False
+		if self.latest_revision is None or revision_num > self.latest_revision:
+			self.latest_revision = revision_num
+		return True
+
+	def parse_parallel(self):
+		""" Parse list file and shards of log file concurrently in a process pool, then merge
+		the log shards into the repository in log order, newest revision first
+		"""
+		pool = multiprocessing.Pool(self.workers)
+		try:
+			list_result = pool.apply_async(parse_list_records, (self.list_file,))
+			shard_results = [pool.apply_async(parse_log_shard, (self.log_file, start, end))
+							 for start, end in self.log_shards(self.workers * SHARDS_PER_WORKER)]
+			self.svn_repo = self.build_repository(self.entry_from_record(record) for record in list_result.get())
+			for shard_result in shard_results:
+				for record in shard_result.get():
+					# svn log is newest first, so every remaining entry has already been ingested
+					if not self.track_revision(record[0]):
+						return
+					self.add_log_record(record)
+		finally:
+			# stops shards still being parsed after an early return
+			pool.terminate()
+			pool.join()
+
+	def log_shards(self, shard_count):
+		""" Split log file into byte ranges of roughly equal size, each starting at a log entry
+
+		:param shard_count: number of shards to aim for
+		:return: list of (start, end) offsets covering every log entry in the file
+		:raises ValueError: if the log file has no closing </log> tag
+		"""
+		with open(self.log_file, 'rb') as data:
+			log = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+			try:
+				first = log.find(b'<logentry')
+				end = log.rfind(b'</log>')
+				# a truncated log would leave the last shard without an end
+				if end == -1:
+					raise ValueError('%s is not a complete svn log, no closing </log> tag' % self.log_file)
+				if first == -1:
+					return []
+				starts = [first]
+				for shard in range(1, shard_count):
+					# next log entry after this shard's share of the file
+					start = log.find(b'<logentry', first + (end - first) * shard // shard_count)
+					if start == -1 or start >= end:
+						break
+					if start > starts[-1]:
+						starts.append(start)
+				return list(zip(starts, starts[1:] + [end]))
+			finally:
+				log.close()
+
+	def iter_elements(self, xml_file, tag):
+		""" Iterate over all elements with given tag in XML file
+
+		:param xml_file: XML file to read
+		:param tag: tag of elements to iterate over
+		:return: iterator over matching elements, in document order
+		"""
+		if self.streaming:
+			return self.iterparse_elements(xml_file, tag)
+		root = ET.parse(xml_file).getroot()
+		return [element for element in root.iter(tag)]
+
+	@staticmethod
+	def iterparse_elements(xml_file, tag):
+		""" Incrementally parse XML file, yielding each element with given tag as soon as it closes.
+		Elements are cleared and detached from their parent once handled, so peak memory
+		depends on the size of a single element rather than the whole file.
+
+		:param xml_file: XML file to read
+		:param tag: tag of elements to yield
+		"""
+		# stack of currently open elements, needed to detach finished elements from their parent
+		open_elements = []
+		for event, element in ET.iterparse(xml_file, events=('start', 'end')):
+			if event == 'start':
+				open_elements.append(element)
+				continue
+			open_elements.pop()
+			if element.tag != tag:
+				continue
+			yield element
+			# element has been handled, free it and drop it from the tree
+			element.clear()
+			if len(open_elements) != 0:
+				open_elements[-1].remove(element)
+
 	def parse_log_entry(self, log_entry):
 		""" Parse a single log entry from svn_log file
 
 		:param log_entry: log entry to parse
 		"""
+		self.add_log_record(self.log_entry_record(log_entry))
+
+	@staticmethod
+	def log_entry_record(log_entry):
+		""" Read data of a log entry into plain tuples, which can be sent between processes
+
+		:param log_entry: log entry to read
+		:return: (revision, author, date, msg, paths) where paths is a list of (kind, name, action)
+		"""
 		revision_num = log_entry.attrib['revision']
+		author = date = msg = None
 		# iterate over child tags of log entry and parse data
 		for child in log_entry.iter():
 			if child.tag == 'author':
@@ -72,23 +343,28 @@ class XMLParser(object):
 				date = child.text
 			elif child.tag == 'msg':
 				msg = child.text
+		# remove the shared leading portion of each path
+		paths = [(path.attrib['kind'], path.text[10:], path.attrib.get('action')) for path in log_entry.iter('path')]
+		return revision_num, author, date, msg, paths
+
+	def add_log_record(self, record):
+		""" Add revisions of a parsed log entry to the directories and files it touched
+
+		:param record: log entry data from log_entry_record
+		"""
+		revision_num, author, date, msg, paths = record
+		# commit metadata is stored once and shared by the revision of every path
+		info = RevisionInfo(revision_num, date, intern_text(author), msg)
 		# iterate over all directories and files in path of this entry
-		for path in log_entry.iter('path'):
-			# remove the shared leading portion of path
-			name = path.text[10:]
-			# create revision object to store data
-			revision = Revision(name, date, author, msg, revision_num)
-			entry_obj = None
+		for kind, name, action in paths:
 			# find entry object for this item in path
-			if path.attrib['kind'] == 'dir':
-					if name in self.svn_repo.directories.keys():
-						entry_obj = self.svn_repo.directories[name]
+			if kind == 'dir':
+				entry_obj = self.svn_repo.directories.get(name)
 			else:
-					if name in self.svn_repo.files.keys():
-						entry_obj = self.svn_repo.files[name]
-			# add this revision to entry object
+				entry_obj = self.svn_repo.files.get(name)
+			# add revision of this path to entry object, sharing the entry's name string
 			if entry_obj is not None:
-				entry_obj.versions.append(revision)
+				entry_obj.versions.append(PathRevision(entry_obj.name, info, action))
 
 	def parse_entry(self, entry):
 		""" Parse individual entry for XML list file
@@ -96,21 +372,16 @@ class XMLParser(object):
 		:param entry: entry to parse
 		:return: entry object representing entry
 		"""
-		# if entry is a directory make Directory object
-		if entry.attrib['kind'] == 'dir':
-			return self.parse_dir_entry(entry)
-		# if entry is a file make File object
-		elif entry.attrib['kind'] == 'file':
-			return self.parse_file_entry(entry)
-		else:
-			return None
+		return self.entry_from_record(self.entry_record(entry))
 
-	def parse_file_entry(self, entry):
-		""" create a file object from entry
+	@staticmethod
+	def entry_record(entry):
+		""" Read data of a list entry into a plain tuple, which can be sent between processes
 
-		:param entry: entry to create file object from
-		:return: File object containing data from entry
+		:param entry: entry to read
+		:return: (kind, name, revision, date, author, size), size is None for directories
 		"""
+		name = revision = date = author = size = None
 		# loop over each child tag and read data
 		for child in entry.iter():
 			if child.tag == 'name':
@@ -124,25 +395,24 @@ class XMLParser(object):
 				date = child.text
 			elif child.tag == 'size':
 				size = child.text
-		# create object from data
-		return File(name, revision, date, author, size)
+		return entry.attrib['kind'], name, revision, date, author, size
 
-	def parse_dir_entry(self, entry):
-		""" create a directory object from entry
+	@staticmethod
+	def entry_from_record(record):
+		""" Create directory or file object from list entry data
 
-		:param entry: entry to create directory object from
-		:return: Directory object containing data from entry
+		:param record: list entry data from entry_record
+		:return: Directory or File object, or None for other kinds of entry
 		"""
-		# loop over each child tag and read data
-		for child in entry.iter():
-			if child.tag == 'name':
-				name = child.text
-			# last commit in attribute not tag
-			elif child.tag == 'commit':
-				revision = child.attrib['revision']
-			elif child.tag == 'author':
-				author = child.text
-			elif child.tag == 'date':
-				date = child.text
-		# create object from data
-		return Directory(name, revision, date, author)
\ No newline at end of file
+		kind, name, revision, date, author, size = record
+		# names and authors repeat across entries and revisions, keep one copy of each
+		name = intern_text(name)
+		author = intern_text(author)
+		# if entry is a directory make Directory object
+		if kind == 'dir':
+			return Directory(name, revision, date, author)
+		# if entry is a file make File object
+		elif kind == 'file':
+			return File(name, revision, date, author, size)
+		else:
+			return None
@@ -0,0 +1,51 @@
+from app import db
+from model.portfolio.revision import date_timestamp
+
+
+class Changeset(db.Model):
+	""" Object to represent a svn commit, stored once however many paths it touched
+	"""
+	revision = db.Column(db.Integer, primary_key=True, autoincrement=False)
+	date = db.Column(db.String(200))
+	author = db.Column(db.String(200))
+	msg = db.Column(db.String(200))
+	timestamp = db.Column(db.Integer, index=True)	# date as seconds since the epoch, for time range queries
+
+	def __init__(self, revision, date, author, msg):
+		""" Constructor
+
+		:param revision: revision number
+		:param date: Date of revision
+		:param author: Author of revision
+		:param msg: Commit message
+		"""
+		self.revision = revision
+		self.date = date
+		self.author = author
+		self.msg = msg
+		self.timestamp = date_timestamp(date)
+
+
+class ChangedPath(db.Model):
+	""" Object to represent a directory or file touched by a svn commit
+	"""
+	id = db.Column(db.Integer, primary_key=True)
+	revision = db.Column(db.Integer, db.ForeignKey('changeset.revision'), nullable=False)
+	name = db.Column(db.String(200), nullable=False, index=True)
+	kind = db.Column(db.String(10))		# 'dir' or 'file'
+	action = db.Column(db.String(1))	# svn action A, M, D or R, None if unknown
+	# a commit touches each path once
+	__table_args__ = (db.Index('ix_changed_path_revision_name', 'revision', 'name', unique=True),)
+
+	def __init__(self, revision, name, kind, action):
+		""" Constructor
+
+		:param revision: revision number of the commit
+		:param name: Name of directory or file touched
+		:param kind: 'dir' or 'file'
+		:param action: svn action of the commit on the path
+		"""
+		self.revision = revision
+		self.name = name
+		self.kind = kind
+		self.action = action
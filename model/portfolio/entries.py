@@ -1,5 +1,8 @@
+from sqlalchemy import literal
+from sqlalchemy.orm import aliased
 from app import db
-from model.filter import Filter
+from model.filter import filter_cache
+from model.portfolio.revision import RevisionHistory, date_timestamp
 
 
 class Comment(db.Model):
@@ -7,9 +10,9 @@ class Comment(db.Model):
 	"""
 	id = db.Column(db.Integer, primary_key=True)
 	# one-to-many relationship between file and comment
-	file = db.Column(db.String(200), db.ForeignKey('file.name'))
+	file = db.Column(db.String(200), db.ForeignKey('file.name'), index=True)
 	# one-to-many relationship between file and comment
-	parent = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=True)
+	parent = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=True, index=True)
 	message = db.Column(db.String(200))
 
 	def __init__(self, file, parent, message):
@@ -23,26 +26,180 @@ class Comment(db.Model):
 		self.parent = parent
 		self.message = message
 		self.children = []
+		self.more_replies = False  # True if replies exist that have not been loaded
 
 	def apply_filter(self):
 		""" Apply filter stored in portfolio db to this comment
 		"""
-		word_filter = {filter_word.word: filter_word.replacement for filter_word in Filter.query.all()}
-		# replace filter words with their replacements in comment message
-		for word in word_filter.keys():
-			self.message = self.message.replace(word, word_filter[word])
+		# filter words are compiled once and reused until the Filter table changes
+		self.message = filter_cache.get().apply(self.message)
 
 	@staticmethod
 	def generate_children(comments):
-		""" Generate children for comments
+		""" Generate children for comments by linking them in memory, in O(N) without querying the db
+
+		:param comments: comments to link, in id order, every reply must be in the list with its parent
 		"""
+		replies = dict((comment.id, []) for comment in comments)
+		for comment in comments:
+			if comment.parent in replies:
+				replies[comment.parent].append(comment)
 		for comment in comments:
-			# get all comment from db with whose parent is current comment
-			comment.children = reversed(Comment.query.filter_by(parent=comment.id).all())
+			# newest reply first
+			comment.children = list(reversed(replies[comment.id]))
+
+	@staticmethod
+	def load_threads(session, root_ids, depth):
+		""" Load comments and their replies up to depth levels below them with a single recursive query,
+		then link them into threads
+
+		:param session: database session to query with
+		:param root_ids: ids of the comments to start from
+		:param depth: levels of replies to load below each root, deeper replies are only flagged by more_replies
+		:return: dict of id to comment for every comment loaded
+		"""
+		thread = session.query(Comment.id.label('id'), literal(0).label('depth')) \
+			.filter(Comment.id.in_(root_ids)).cte('thread', recursive=True)
+		thread = thread.union_all(session.query(Comment.id, thread.c.depth + 1)
+								  .filter(Comment.parent == thread.c.id, thread.c.depth < depth))
+		reply = aliased(Comment)
+		has_replies = session.query(reply.id).filter(reply.parent == Comment.id).exists()
+		rows = session.query(Comment, thread.c.depth, has_replies).join(thread, Comment.id == thread.c.id) \
+			.order_by(Comment.id).all()
+		comments = [comment for comment, _, _ in rows]
+		Comment.generate_children(comments)
+		for comment, level, replies in rows:
+			# replies of the deepest loaded comments are left for the client to ask for
+			comment.more_replies = level == depth and replies
+		return dict((comment.id, comment) for comment in comments)
+
+	@staticmethod
+	def get_comment_page(session, file_name, before=None, limit=20, depth=3):
+		""" Get a page of a file's top level comments, newest first, with their replies up to depth levels down
+
+		:param session: database session to query with
+		:param file_name: file to get comments of
+		:param before: only get comments older than this id, None for the newest page
+		:param limit: number of top level comments per page
+		:param depth: levels of replies to load below each top level comment
+		:return: (list of top level comments, id to pass as before for the next page or None if this is the last)
+		"""
+		query = session.query(Comment.id).filter(Comment.file == file_name, Comment.parent.is_(None))
+		if before is not None:
+			query = query.filter(Comment.id < before)
+		# one extra row tells whether there is another page
+		top_ids = [row[0] for row in query.order_by(Comment.id.desc()).limit(limit + 1)]
+		next_before = top_ids[limit - 1] if len(top_ids) > limit else None
+		top_ids = top_ids[:limit]
+		comments = Comment.load_threads(session, top_ids, depth)
+		return [comments[comment_id] for comment_id in top_ids], next_before
+
+	def to_dict(self):
+		""" Convert comment and its loaded replies into plain data for JSON
+
+		:return: dict of comment data, replies newest first
+		"""
+		return {'id': self.id, 'file': self.file, 'parent': self.parent, 'message': self.message,
+				'more_replies': self.more_replies, 'children': [child.to_dict() for child in self.children]}
+
+
+class Entry(object):
+	""" Behaviour shared by directories and files. Each entry keeps last_commit, the newest
+	revision in its whole subtree, so summaries do not have to walk the tree
+	"""
+	# no instance dict of its own, so slotted read model classes stay compact
+	__slots__ = ()
+
+	def get_last_commit(self):
+		""" Get the last commit made to this entry or anything below it
+
+		:return: Revision object representing last commit, or None if there are no revisions
+		"""
+		return self.last_commit
+
+	def rollup_last_commit(self):
+		""" Compute last commit from this entry's revisions and its children's last commits.
+		Children must already be rolled up
+
+		:return: Revision object representing last commit
+		"""
+		# revisions for this entry are kept sorted by date
+		last_commit = self.versions.latest()
+		for child in self.children:
+			child_commit = child.last_commit
+			# if child commit occurred after last_commit, it is now last_commit
+			if child_commit is not None and (last_commit is None or child_commit.date > last_commit.date):
+				last_commit = child_commit
+		self.last_commit = last_commit
+		return last_commit
+
+	def update_last_commit(self, revision):
+		""" Update last commit of this entry and its ancestors after revision is added to this entry
+
+		:param revision: revision added to this entry
+		"""
+		# entry's own revisions win ties, same as when rolling up
+		if self.last_commit is not None and revision.date < self.last_commit.date:
+			return
+		self.last_commit = revision
+		# walk up until an ancestor already has a newer commit
+		parent = self.parent
+		while parent is not None and (parent.last_commit is None or revision.date > parent.last_commit.date):
+			parent.last_commit = revision
+			parent = parent.parent
+
+	def get_summary(self):
+		""" Get summary for this entry
+
+		:return: Last commit message for this entry
+		"""
+		return self.get_last_commit().msg
+
+
+class DirectoryEntry(Entry):
+	""" Behaviour of directories shared by database model and read model
+	"""
+	__slots__ = ()
+
+	def get_directory_name(self):
+		""" strip parent directories from name
+
+		:return: base name of the directory
+		"""
+		return self.name[self.name.rindex('/'):][1:] + '/'
+
+
+class FileEntry(Entry):
+	""" Behaviour of files shared by database model and read model
+	"""
+	__slots__ = ()
+
+	def get_file_name(self):
+		""" String the leading path and return only filename
+
+		:return: base filename
+		"""
+		if '/' not in self.name:
+			return self.name
+		return self.name[self.name.rindex('/'):][1:]
+
+	def get_file_type(self):
+		""" return the type of file
+
+		:return:a type in ['code', 'test', 'image', 'resource']
+		"""
+		name = self.get_file_name()
+		if 'test' in name or 'Tests' in name:
+			return 'test'
+		elif '.py' in name or '.java' in name or '.css' in name or '.js' in name or '.htm' in name:
+			return 'code'
+		elif '.png' in name or '.jpg' in name or '.jpeg' in name:
+			return 'image'
+		else: return 'resource'
 
 
 # directory must be defined in same file as comment and file or circular imports exist
-class Directory(db.Model):
+class Directory(DirectoryEntry, db.Model):
 	""" Class to represent a Dictionary in Subversion Repository.
 	"""
 
@@ -53,7 +210,8 @@ class Directory(db.Model):
 	date = db.Column(db.String(200))
 	summary = db.Column(db.String(200))
 	# one-to-many relationship between dir and dir
-	parent_name = db.Column(db.String(200), db.ForeignKey('directory.name'), nullable=True)
+	parent_name = db.Column(db.String(200), db.ForeignKey('directory.name'), nullable=True, index=True)
+	timestamp = db.Column(db.Integer, index=True)  # date as seconds since the epoch, for time range queries
 
 	def __init__(self, name, revision, date, author):
 		""" Constructor
@@ -66,45 +224,17 @@ class Directory(db.Model):
 		self.name = name
 		self.revision = revision
 		self.date = date
+		self.timestamp = date_timestamp(date)
 		self.author = author
 		self.summary = ""  # Summary of entry is last commit message
-		self.versions = []  # history of all revisions of entry
 		self.parent = None  # parent directory of entry
 		self.children = []
-
-	def get_last_commit(self):
-		""" Get the last commit made to this directory
-
-		:return: Revision Object representing last commit
-		"""
-		# sort the revisions for this directory by date
-		last_commit = sorted(self.versions, key=lambda revision: revision.date)[-1]
-		# if the directory is non-empty, check commits for children
-		if len(self.children) != 0:
-			for child in self.children:
-				child_commit = child.get_last_commit()
-				# if child commit occurred after last_commit, it is now last_commit
-				if child_commit is not None and child_commit.date > last_commit.date:
-					last_commit = child_commit
-		return last_commit
-
-	def get_directory_name(self):
-		""" strip parent directories from name
-
-		:return: base name of the directory
-		"""
-		return self.name[self.name.rindex('/'):][1:] + '/'
-
-	def get_summary(self):
-		""" Get summary for this entry
-
-		:return: Last commit message for this entry
-		"""
-		return self.get_last_commit().msg
+		self.last_commit = None  # newest revision of directory or anything in it
+		self.versions = RevisionHistory(owner=self)  # history of all revisions of entry
 
 
 # must defined File in same file as directory or get circular imports
-class File(db.Model):
+class File(FileEntry, db.Model):
 	""" Class to represent File in Subversion Repository
 	"""
 	name = db.Column(db.String(200), primary_key=True)
@@ -114,8 +244,9 @@ class File(db.Model):
 	date = db.Column(db.String(200))
 	summary = db.Column(db.String(200))
 	# one-to-many relationship between dir and files
-	parent_name = db.Column(db.String(200), db.ForeignKey('directory.name'))
+	parent_name = db.Column(db.String(200), db.ForeignKey('directory.name'), index=True)
 	size = db.Column(db.Integer)
+	timestamp = db.Column(db.Integer, index=True)  # date as seconds since the epoch, for time range queries
 
 	def __init__(self, name, revision, date, author, size):
 		""" Constructor.
@@ -129,49 +260,11 @@ class File(db.Model):
 		self.name = name
 		self.revision = revision
 		self.date = date
+		self.timestamp = date_timestamp(date)
 		self.author = author
 		self.summary = ""  # Summary of entry is last commit message
-		self.versions = []  # history of all revisions of entry
 		self.parent = None  # parent directory of entry
 		self.size = size
 		self.children = []	# children should always be empty for files, needed for templating
-
-	def get_last_commit(self):
-		""" Get last commit of this file
-
-		:return: Revision object representing last commit
-		"""
-		if len(self.versions) == 0:
-			return None
-		# return oldest commit
-		return sorted(self.versions, key=lambda revision: revision.date)[-1]
-
-	def get_file_name(self):
-		""" String the leading path and return only filename
-
-		:return: base filename
-		"""
-		if '/' not in self.name:
-			return self.name
-		return self.name[self.name.rindex('/'):][1:]
-
-	def get_file_type(self):
-		""" return the type of file
-
-		:return:a type in ['code', 'test', 'image', 'resource']
-		"""
-		name = self.get_file_name()
-		if 'test' in name or 'Tests' in name:
-			return 'test'
-		elif '.py' in name or '.java' in name or '.css' in name or '.js' in name or '.htm' in name:
-			return 'code'
-		elif '.png' in name or '.jpg' in name or '.jpeg' in name:
-			return 'image'
-		else: return 'resource'
-
-	def get_summary(self):
-		""" Get summary for this entry
-
-		:return: Last commit message for this entry
-		"""
-		return self.get_last_commit().msg
\ No newline at end of file
+		self.last_commit = None  # newest revision of file
+		self.versions = RevisionHistory(owner=self)  # history of all revisions of entry
\ No newline at end of file
@@ -0,0 +1,246 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from model.high_water_mark import HighWaterMark
+from model.portfolio.entries import Directory, File
+from model.portfolio.changeset import Changeset, ChangedPath
+from model.portfolio.repository import Repository
+from model.portfolio.read_model import ReadDirectory, ReadRevision, ReadRepository
+from model.portfolio.refresher import INGEST_GENERATION_MARK
+from model.portfolio.routes import AssignmentRoutes
+
+
+class LazyRepository(AssignmentRoutes):
+	""" Repository that only loads the top-level assignments up front. Each assignment's tree and revisions are
+	loaded from the database on first access and kept in a bounded least recently used cache.
+
+	Each load reads in its own short transaction, so no snapshot is held open between loads to keep WAL
+	checkpoints from running. Instead every load also reads the ingest generation, and a tree from a newer
+	generation than the repository's is served but not cached, so cached trees never mix in data ingested since
+	"""
+
+	def __init__(self, db, engine, cache_size=4):
+		""" Constructor. Loads the top-level directories with a single query
+
+		:param db: database to load from
+		:param engine: engine to read with, usually the read-only engine
+		:param cache_size: number of assignment trees to keep loaded
+		"""
+		self.db = db
+		self.engine = engine
+		self.cache_size = cache_size
+		self.loaded = OrderedDict()		# top-level name -> ReadRepository of its tree, least recently used first
+		self.loading = {}				# top-level name -> Future of a tree being loaded by another request
+		self.lock = threading.Lock()	# guards loaded and loading, requests may be served from several threads
+		with self.snapshot() as session:
+			self.generation = HighWaterMark.get_value(INGEST_GENERATION_MARK, session)
+			self.top_level = self.load_top_level(session)
+		self.assignments = tuple(Repository.find_assignments(self.top_level))
+		# files are only known once their tree is loaded, so their owners come from the loaded tree
+		self.index_assignments()
+		self.latest_commit = self.find_latest_commit()
+
+	@contextmanager
+	def snapshot(self):
+		""" Read several queries from one snapshot of the database, in a transaction that ends when done
+
+		:return: context manager giving the session to read with
+		"""
+		# autocommit stops the driver managing transactions itself, so BEGIN and COMMIT bound the snapshot
+		with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+			connection.exec_driver_sql('BEGIN')
+			try:
+				with Session(bind=connection) as session:
+					yield session
+			finally:
+				connection.exec_driver_sql('COMMIT')
+
+	@staticmethod
+	def load_top_level(session):
+		""" Load top-level directories without their trees. The directory's revision is the newest commit anywhere
+		below it, so its commit message gives the summary
+
+		:param session: session to read with
+		:return: dict of name to ReadDirectory without children or versions
+		"""
+		rows = session.query(Directory.name, Directory.revision, Directory.date, Directory.author,
+							 Changeset.msg, Directory.timestamp) \
+			.outerjoin(Changeset, Directory.revision == Changeset.revision) \
+			.filter(Directory.parent_name.is_(None))
+		top_level = {}
+		for name, revision, date, author, msg, timestamp in rows:
+			last_commit = ReadRevision(name, date, author, msg, revision, timestamp)
+			top_level[name] = ReadDirectory(name, revision, date, author, (), last_commit)
+		return top_level
+
+	def load(self, top_level_name):
+		""" Get the tree of a top-level directory, loading it if it is not cached
+
+		:param top_level_name: name of top-level directory
+		:return: ReadRepository holding only that directory and everything below it
+		"""
+		with self.lock:
+			subtree = self.loaded.get(top_level_name)
+			if subtree is not None:
+				self.loaded.move_to_end(top_level_name)
+				return subtree
+			future = self.loading.get(top_level_name)
+			loader = future is None
+			if loader:
+				future = Future()
+				self.loading[top_level_name] = future
+		if not loader:
+			# another request is already loading this tree, wait for it rather than loading it twice
+			return future.result()
+		# load without holding the lock, so requests for cached trees are not kept waiting
+		try:
+			with self.snapshot() as session:
+				generation = HighWaterMark.get_value(INGEST_GENERATION_MARK, session)
+				portfolio = Repository.generate_portfolio_from_db(self.db, top_level_name, session)
+			subtree = ReadRepository(portfolio)
+		except Exception as error:
+			with self.lock:
+				del self.loading[top_level_name]
+			future.set_exception(error)
+			raise
+		with self.lock:
+			del self.loading[top_level_name]
+			# a tree from a newer ingest does not match the rest of this repository, so only this request gets it
+			if generation == self.generation:
+				self.loaded[top_level_name] = subtree
+				# evict least recently used trees
+				while len(self.loaded) > self.cache_size:
+					self.loaded.popitem(last=False)
+		future.set_result(subtree)
+		return subtree
+
+	def load_containing(self, path):
+		""" Get the tree holding path
+
+		:param path: path of a directory or file
+		:return: ReadRepository of the path's top-level directory, or None if there is no such directory
+		"""
+		top_level_name = path.split('/')[0]
+		if top_level_name not in self.top_level:
+			return None
+		return self.load(top_level_name)
+
+	def get_assignment(self, assignment_name):
+		""" Get top-level assignment by name, with its whole tree loaded
+
+		:param assignment_name: name of the assignment
+		:return: assignment directory, or None if there is no such assignment
+		"""
+		if assignment_name not in self.assignments_by_name:
+			return None
+		return self.load(assignment_name).get_assignment(assignment_name)
+
+	def get_file(self, file_name):
+		""" Get file by its full path
+
+		:param file_name: path of the file
+		:return: file, or None if there is no such file
+		"""
+		subtree = self.load_containing(file_name)
+		if subtree is None:
+			return None
+		return subtree.get_file(file_name)
+
+	def get_file_owner(self, file_name):
+		""" Get the assignment a file is in, loading the assignment's tree
+
+		:param file_name: path of the file
+		:return: assignment directory, or None if the file is not in an assignment
+		"""
+		subtree = self.load_containing(file_name)
+		if subtree is None:
+			return None
+		return subtree.get_file_owner(file_name)
+
+	def resolve(self, path):
+		""" Get directory or file at path
+
+		:param path: path of the entry
+		:return: directory or file, or None if path is not in repository
+		"""
+		subtree = self.load_containing(path)
+		if subtree is None:
+			return None
+		return subtree.resolve(path)
+
+	def tree(self, path):
+		""" Nest the directories and files below path for display
+
+		:param path: path of subtree root
+		:return: list of (entry, children) pairs, files before directories at each level
+		"""
+		subtree = self.load_containing(path)
+		if subtree is None:
+			return []
+		return subtree.tree(path)
+
+	def count_descendants(self, path):
+		""" Count directories and files below path
+
+		:param path: path of subtree root
+		:return: number of entries below path
+		"""
+		subtree = self.load_containing(path)
+		if subtree is None:
+			return 0
+		return subtree.count_descendants(path)
+
+	def changes_between(self, start, end, count=None):
+		""" Get the newest revisions made from start up to but not including end, searching the indexed timestamp
+		column from the end of the range instead of loading every tree
+
+		:param start: seconds since the epoch, UTC
+		:param end: seconds since the epoch, UTC
+		:param count: most revisions to get, None for all of them
+		:return: list of ReadRevisions, newest first
+		"""
+		with Session(bind=self.engine) as session:
+			rows = self.change_query(session).filter(Changeset.timestamp >= start, Changeset.timestamp < end) \
+				.order_by(Changeset.timestamp.desc(), Changeset.revision.desc(), ChangedPath.name.desc())
+			if count is not None:
+				rows = rows.limit(count)
+			return self.read_changes(rows)
+
+	def latest_changes(self, count):
+		""" Get the newest revisions, reading the indexed timestamp column from its end
+
+		:param count: number of revisions to get
+		:return: list of at most count ReadRevisions, newest first
+		"""
+		with Session(bind=self.engine) as session:
+			rows = self.change_query(session).filter(Changeset.timestamp.isnot(None)) \
+				.order_by(Changeset.timestamp.desc(), Changeset.revision.desc(), ChangedPath.name.desc()).limit(count)
+			return self.read_changes(rows)
+
+	@staticmethod
+	def change_query(session):
+		""" Build query of changed paths joined to their commit, only paths that are directories or files in the
+		repository, like the revisions a loaded tree holds
+
+		:param session: session to read with
+		:return: query of (name, revision, date, author, msg, timestamp)
+		"""
+		is_entry = or_(session.query(Directory.name).filter(Directory.name == ChangedPath.name).exists(),
+					   session.query(File.name).filter(File.name == ChangedPath.name).exists())
+		return session.query(ChangedPath.name, Changeset.revision, Changeset.date, Changeset.author,
+							 Changeset.msg, Changeset.timestamp) \
+			.join(Changeset, ChangedPath.revision == Changeset.revision) \
+			.filter(is_entry)
+
+	@staticmethod
+	def read_changes(rows):
+		""" Create read-only revisions from change rows
+
+		:param rows: (name, revision, date, author, msg, timestamp) tuples
+		:return: list of ReadRevisions, in row order
+		"""
+		return [ReadRevision(name, date, author, msg, revision, timestamp)
+				for name, revision, date, author, msg, timestamp in rows]
@@ -0,0 +1,215 @@
+from model.portfolio.entries import FileEntry
+from model.portfolio.revision import intern_text
+
+
+class PathNode(object):
+	""" Node in path index, one per path segment
+	"""
+	__slots__ = ('segment', 'parent', 'children', 'entry', 'descendants', 'order')
+
+	def __init__(self, segment, parent):
+		""" Constructor
+
+		:param segment: last segment of the node's path
+		:param parent: node of the parent path, None for the root
+		"""
+		self.segment = segment
+		self.parent = parent
+		self.children = {}		# segment -> child node, in insertion order
+		self.entry = None		# directory or file stored at this path
+		self.descendants = 0	# number of entries stored below this node
+		self.order = None		# number of entries stored before this node's entry
+
+
+class PathIndex(object):
+	""" Trie of repository paths, split on '/', mapping each path to its directory or file
+	"""
+
+	def __init__(self):
+		""" Constructor.
+		"""
+		self.root = PathNode('', None)
+		self.size = 0
+
+	def insert(self, path, entry):
+		""" Store entry at path, creating nodes for any missing parent paths
+
+		:param path: path of the entry
+		:param entry: directory or file to store
+		:return: node holding the entry
+		"""
+		node = self.root
+		ancestors = []
+		for segment in path.split('/'):
+			ancestors.append(node)
+			# directory names repeat in many paths, keep one copy of each
+			segment = intern_text(segment)
+			child = node.children.get(segment)
+			if child is None:
+				child = PathNode(segment, node)
+				node.children[segment] = child
+			node = child
+		# only count each path once, even if its entry is replaced
+		if node.entry is None:
+			for ancestor in ancestors:
+				ancestor.descendants += 1
+			node.order = self.size
+			self.size += 1
+		node.entry = entry
+		return node
+
+	def find_node(self, path):
+		""" Find node for a path in O(depth)
+
+		:param path: path to look up
+		:return: node for the path, or None if no entry is stored at or below it
+		"""
+		node = self.root
+		if path == '':
+			return node
+		for segment in path.split('/'):
+			node = node.children.get(segment)
+			if node is None:
+				return None
+		return node
+
+	def resolve(self, path):
+		""" Get entry stored at path
+
+		:param path: path to look up
+		:return: directory or file at path, or None if there is none
+		"""
+		node = self.find_node(path)
+		if node is None:
+			return None
+		return node.entry
+
+	def list_subtree(self, path):
+		""" List all entries below path, parents before their children
+
+		:param path: path of subtree root, '' for the whole repository
+		:return: list of entries below path, not including the entry at path
+		"""
+		node = self.find_node(path)
+		if node is None:
+			return []
+		return self.collect_entries(node.children.values())
+
+	def tree(self, path):
+		""" Nest the entries below path the way they are shown, files before directories at each level, each in the
+		order they were stored
+
+		:param path: path of subtree root
+		:return: list of (entry, children) pairs, children being the same kind of list for the entry's children
+		"""
+		node = self.find_node(path)
+		if node is None:
+			return []
+		return self.nest_entries(node)
+
+	@staticmethod
+	def nest_entries(node):
+		""" Nest the entries below a node. Paths without an entry have no parent to be shown under, so they and
+		everything below them are left out
+
+		:param node: node to start from
+		:return: list of (entry, children) pairs
+		"""
+		children = [child for child in node.children.values() if child.entry is not None]
+		# a node is created by the first path through it, which may be stored after a sibling's
+		children.sort(key=lambda child: (not isinstance(child.entry, FileEntry), child.order))
+		return [(child.entry, PathIndex.nest_entries(child)) for child in children]
+
+	def search_prefix(self, prefix):
+		""" Find all entries whose path starts with prefix, which may end part way through a segment
+
+		:param prefix: path prefix to search for
+		:return: list of matching entries, parents before their children
+		"""
+		parent_path, _, partial = prefix.rpartition('/')
+		node = self.find_node(parent_path)
+		if node is None:
+			return []
+		matches = [child for segment, child in node.children.items() if segment.startswith(partial)]
+		return self.collect_entries(matches)
+
+	def count_descendants(self, path):
+		""" Count entries below path in O(depth)
+
+		:param path: path of subtree root, '' for the whole repository
+		:return: number of entries below path
+		"""
+		node = self.find_node(path)
+		if node is None:
+			return 0
+		return node.descendants
+
+	@staticmethod
+	def collect_entries(nodes):
+		""" Collect entries of nodes and everything below them, depth first
+
+		:param nodes: nodes to start from
+		:return: list of entries, parents before their children
+		"""
+		entries = []
+		# reversed so entries come out in insertion order
+		stack = list(reversed(list(nodes)))
+		while len(stack) != 0:
+			node = stack.pop()
+			if node.entry is not None:
+				entries.append(node.entry)
+			stack.extend(reversed(list(node.children.values())))
+		return entries
+
+
+class IndexedPaths(object):
+	""" Path lookups for repositories that keep their entries in a PathIndex called index
+	"""
+
+	def resolve(self, path):
+		""" Get directory or file at path in O(depth)
+
+		:param path: path of the entry
+		:return: directory or file, or None if path is not in repository
+		"""
+		return self.index.resolve(path)
+
+	def list_subtree(self, path):
+		""" List every directory and file below path
+
+		:param path: path of subtree root
+		:return: list of entries, parents before their children
+		"""
+		return self.index.list_subtree(path)
+
+	def tree(self, path):
+		""" Nest the directories and files below path for display
+
+		:param path: path of subtree root
+		:return: list of (entry, children) pairs, files before directories at each level
+		"""
+		return self.index.tree(path)
+
+	def search_prefix(self, prefix):
+		""" Find every directory and file whose path starts with prefix
+
+		:param prefix: path prefix, may end part way through a name
+		:return: list of entries, parents before their children
+		"""
+		return self.index.search_prefix(prefix)
+
+	def count_descendants(self, path):
+		""" Count directories and files below path
+
+		:param path: path of subtree root
+		:return: number of entries below path
+		"""
+		return self.index.count_descendants(path)
+
+	def get_file(self, file_name):
+		""" Get file by its full path
+
+		:param file_name: path of the file
+		:return: file, or None if there is no such file
+		"""
+		return self.files.get(file_name)
@@ -0,0 +1,161 @@
+from model.portfolio.entries import DirectoryEntry, FileEntry
+from model.portfolio.path_index import PathIndex, IndexedPaths
+from model.portfolio.routes import AssignmentRoutes
+from model.portfolio.timeline import ChangeTimeline
+
+
+def set_frozen(obj, name, value):
+	""" Set attribute on a read model object, bypassing the freeze. Only used while building
+
+	:param obj: read model object
+	:param name: attribute to set
+	:param value: value to set it to
+	"""
+	object.__setattr__(obj, name, value)
+
+
+class Frozen(object):
+	""" Base of read model classes, attributes cannot be changed once built
+	"""
+	__slots__ = ()
+
+	def __setattr__(self, name, value):
+		raise AttributeError('read model is frozen, cannot set ' + name)
+
+
+class ReadRevision(Frozen):
+	""" Read-only svn revision
+	"""
+	__slots__ = ('name', 'date', 'author', 'msg', 'revision', 'timestamp')
+
+	def __init__(self, name, date, author, msg, revision, timestamp=None):
+		""" Constructor
+
+		:param name: Name of entry of revision
+		:param date: Date of revision
+		:param author: Author of revision
+		:param msg: Commit message
+		:param revision: revision number
+		:param timestamp: date as seconds since the epoch, None if date is not a svn date
+		"""
+		set_frozen(self, 'name', name)
+		set_frozen(self, 'date', date)
+		set_frozen(self, 'author', author)
+		set_frozen(self, 'msg', msg)
+		set_frozen(self, 'revision', revision)
+		set_frozen(self, 'timestamp', timestamp)
+
+
+class ReadDirectory(DirectoryEntry, Frozen):
+	""" Read-only directory, parent and children are set once the whole tree is built
+	"""
+	__slots__ = ('name', 'revision', 'date', 'author', 'versions', 'last_commit', 'parent', 'children')
+
+	def __init__(self, name, revision, date, author, versions, last_commit):
+		""" Constructor
+
+		:param name: Name of the directory
+		:param revision: Current revision number for directory
+		:param date: Date of last commit
+		:param author: Author of last commit
+		:param versions: tuple of ReadRevisions of the directory
+		:param last_commit: newest ReadRevision of directory or anything in it
+		"""
+		set_frozen(self, 'name', name)
+		set_frozen(self, 'revision', revision)
+		set_frozen(self, 'date', date)
+		set_frozen(self, 'author', author)
+		set_frozen(self, 'versions', versions)
+		set_frozen(self, 'last_commit', last_commit)
+		set_frozen(self, 'parent', None)
+		set_frozen(self, 'children', ())
+
+
+class ReadFile(FileEntry, Frozen):
+	""" Read-only file, parent is set once the whole tree is built
+	"""
+	__slots__ = ('name', 'revision', 'date', 'author', 'size', 'versions', 'last_commit', 'parent', 'children')
+
+	def __init__(self, name, revision, date, author, size, versions, last_commit):
+		""" Constructor
+
+		:param name: Name of file
+		:param revision: Current revision of file
+		:param date: Date of last commit
+		:param author: Author of last commit
+		:param size: Size of the file
+		:param versions: tuple of ReadRevisions of the file
+		:param last_commit: newest ReadRevision of the file
+		"""
+		set_frozen(self, 'name', name)
+		set_frozen(self, 'revision', revision)
+		set_frozen(self, 'date', date)
+		set_frozen(self, 'author', author)
+		set_frozen(self, 'size', size)
+		set_frozen(self, 'versions', versions)
+		set_frozen(self, 'last_commit', last_commit)
+		set_frozen(self, 'parent', None)
+		set_frozen(self, 'children', ())	# always empty for files, needed for templating
+
+
+class ReadRepository(IndexedPaths, AssignmentRoutes, ChangeTimeline):
+	""" Compact read-only copy of a Repository, detached from the database, used for serving pages
+	"""
+
+	def __init__(self, repository):
+		""" Constructor. Copies every entry and revision of repository into slotted read-only objects
+
+		:param repository: Repository to copy
+		"""
+		self.read_revisions = {}	# id of Revision -> ReadRevision, so shared revisions stay shared
+		read_entries = {}			# id of Directory or File -> read entry
+		for directory in repository.directories.values():
+			read_entries[id(directory)] = ReadDirectory(directory.name, directory.revision, directory.date, directory.author,
+														self.copy_revisions(directory.versions),
+														self.copy_revision(directory.last_commit))
+		for file in repository.files.values():
+			read_entries[id(file)] = ReadFile(file.name, file.revision, file.date, file.author, file.size,
+											  self.copy_revisions(file.versions), self.copy_revision(file.last_commit))
+		# link the copied tree together in the same order as the repository
+		for entry in list(repository.directories.values()) + list(repository.files.values()):
+			read_entry = read_entries[id(entry)]
+			if entry.parent is not None:
+				set_frozen(read_entry, 'parent', read_entries[id(entry.parent)])
+			set_frozen(read_entry, 'children', tuple(read_entries[id(child)] for child in entry.children))
+		self.directories = dict((name, read_entries[id(directory)]) for name, directory in repository.directories.items())
+		self.files = dict((name, read_entries[id(file)]) for name, file in repository.files.items())
+		self.assignments = tuple(read_entries[id(assignment)] for assignment in repository.assignments)
+		self.index = PathIndex()
+		for file_name, file in self.files.items():
+			self.index.insert(file_name, file)
+		for dir_name, directory in self.directories.items():
+			self.index.insert(dir_name, directory)
+		self.index_assignments()
+		self.index_file_owners()
+		self.latest_commit = self.find_latest_commit()
+		self.index_changes()
+		# only needed while building
+		del self.read_revisions
+
+	def copy_revision(self, revision):
+		""" Get read-only copy of a revision
+
+		:param revision: Revision to copy, may be None
+		:return: ReadRevision, or None if revision is None
+		"""
+		if revision is None:
+			return None
+		read_revision = self.read_revisions.get(id(revision))
+		if read_revision is None:
+			read_revision = ReadRevision(revision.name, revision.date, revision.author, revision.msg, revision.revision,
+										 revision.timestamp)
+			self.read_revisions[id(revision)] = read_revision
+		return read_revision
+
+	def copy_revisions(self, revisions):
+		""" Get read-only copies of revisions, in the same order
+
+		:param revisions: Revisions to copy
+		:return: tuple of ReadRevisions
+		"""
+		return tuple(self.copy_revision(revision) for revision in revisions)
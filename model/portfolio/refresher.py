@@ -0,0 +1,123 @@
+import threading
+from model.high_water_mark import HighWaterMark
+
+# name of the high-water mark main_parser bumps after every ingest that writes repository rows
+INGEST_GENERATION_MARK = 'ingest_generation'
+
+
+def record_new_generation():
+	""" Bump the ingest generation so running servers reload the repository and re-render pages. Caller is
+	responsible for committing
+
+	:return: new generation number
+	"""
+	generation = HighWaterMark.get_value(INGEST_GENERATION_MARK)
+	generation = 1 if generation is None else generation + 1
+	HighWaterMark.set_value(INGEST_GENERATION_MARK, generation)
+	return generation
+
+
+class RepositoryHolder(object):
+	""" Holds the repository currently being served. Requests take the current snapshot once and keep using it,
+	so a swap never changes data part way through a request
+	"""
+
+	def __init__(self, portfolio, generation):
+		""" Constructor
+
+		:param portfolio: repository to serve
+		:param generation: ingest generation the repository was built from
+		"""
+		# repository and generation are kept in one tuple so they are always replaced together
+		self.current = (portfolio, generation)
+
+	def get(self):
+		""" Get the repository to serve a request from
+
+		:return: current repository
+		"""
+		return self.current[0]
+
+	def get_generation(self):
+		""" Get the ingest generation of the current repository
+
+		:return: generation number, None if nothing has been ingested
+		"""
+		return self.current[1]
+
+	def get_snapshot(self):
+		""" Get the repository to serve a request from together with its generation, read at the same time
+
+		:return: (repository, generation)
+		"""
+		return self.current
+
+	def swap(self, portfolio, generation):
+		""" Replace the served repository. A single assignment, so readers see either the old or the new one
+
+		:param portfolio: new repository
+		:param generation: ingest generation the new repository was built from
+		"""
+		self.current = (portfolio, generation)
+
+
+class Refresher(threading.Thread):
+	""" Background thread that rebuilds the repository when a new ingest is recorded, then swaps it into the holder
+	"""
+
+	def __init__(self, app, db, holder, build, interval):
+		""" Constructor
+
+		:param app: flask app, gives the thread its own app context and database session
+		:param db: database the repository is built from
+		:param holder: RepositoryHolder to swap new repositories into
+		:param build: function returning a new repository built from the database
+		:param interval: seconds between checks for a new ingest
+		"""
+		super(Refresher, self).__init__(name='portfolio-refresher')
+		# do not keep the process alive just for refreshing
+		self.daemon = True
+		self.app = app
+		self.db = db
+		self.holder = holder
+		self.build = build
+		self.interval = interval
+		self.stopped = threading.Event()
+
+	def run(self):
+		""" Check for new ingests until stopped
+		"""
+		while not self.stopped.wait(self.interval):
+			with self.app.app_context():
+				try:
+					self.refresh()
+				except Exception:
+					# keep serving the old repository and try again next time
+					self.app.logger.exception('portfolio refresh failed')
+				finally:
+					self.db.session.remove()
+
+	def refresh(self):
+		""" Rebuild and swap the repository if the database has been ingested into since it was built
+
+		:return: True if the repository was swapped
+		"""
+		generation = self.current_generation()
+		if generation == self.holder.get_generation():
+			return False
+		# generation is read before building, so an ingest during the build is picked up next time
+		self.holder.swap(self.build(), generation)
+		return True
+
+	@staticmethod
+	def current_generation():
+		""" Read the newest ingest generation from the database
+
+		:return: generation number, None if nothing has been ingested
+		"""
+		return HighWaterMark.get_value(INGEST_GENERATION_MARK)
+
+	def stop(self):
+		""" Stop checking for new ingests
+		"""
+		self.stopped.set()
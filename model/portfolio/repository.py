@@ -1,8 +1,12 @@
+from sqlalchemy import and_, or_
 from model.portfolio.entries import Directory, File
-from model.portfolio.revision import Revision
+from model.portfolio.revision import RevisionHistory, RevisionInfo, PathRevision, intern_text
+from model.portfolio.changeset import Changeset, ChangedPath
+from model.portfolio.path_index import PathIndex, IndexedPaths
+from model.portfolio.routes import AssignmentRoutes
 
 
-class Repository(object):
+class Repository(IndexedPaths, AssignmentRoutes):
 	""" Class Representing Subversion Repository
 
 	"""
@@ -15,89 +19,152 @@ class Repository(object):
 		"""
 		self.directories = directories
 		self.files = files
+		self.index = None								# path trie of all directories and files
 		self.assignments = self.get_assignments()		# top-level assignments in repo
 		self.set_parents_and_children()					# set parents and children for all directories and files
+		self.index_assignments()						# lookups of assignments by name and related assignments
+		self.index_file_owners()						# lookup of the assignment each file is in
+		self.rollup_last_commits()						# compute last commit of every subtree
 
 	def get_assignments(self):
 		""" Get all top-level assignments
 
 		:return: list of all top level assignments, in order
 		"""
+		return Repository.find_assignments(self.directories)
+
+	@staticmethod
+	def find_assignments(directories):
+		""" Pick the top-level assignments out of directories
+
+		:param directories: dict of directory name to directory
+		:return: list of top level assignments, sorted by name
+		"""
 		assignments = []
-		for dir_name in self.directories.keys():
+		for dir_name in directories.keys():
 			# ignore repos that are not part of assignments
 			if 'Assignment' not in dir_name:
 				continue
 			# top-level repos do not have / in name
 			if '/' not in dir_name:
-				assignments.append(self.directories[dir_name])
+				assignments.append(directories[dir_name])
 		# sort by name so assignments are in order
 		return sorted(assignments, key=lambda assignment: assignment.name)
 
+	def get_latest_commit(self):
+		""" Get the newest commit to any assignment. Found on every call, as revisions are added after construction
+
+		:return: newest revision, or None if no assignment has revisions
+		"""
+		return self.find_latest_commit()
+
 	def set_parents_and_children(self):
-		""" Set parents and children for all entries
+		""" Build path index and use it to set parents and children for all entries
 
 		"""
-		# loop over all files
-		for file_name in self.files.keys():
-			# remove everything after last /
-			parent_dir_name = file_name[:file_name.rindex('/')]
-			# set parent and children
-			if parent_dir_name not in self.directories.keys():
-				continue
-			self.files[file_name].parent = self.directories[parent_dir_name]
-			self.files[file_name].parent_name = self.directories[parent_dir_name].name
-			self.directories[parent_dir_name].children.append(self.files[file_name])
-		# loop over all directories
-		for dir_name in self.directories.keys():
-			# top-level directories will not have parent
-			if '/' not in dir_name:
-				continue
-			# remove everything after last /
-			parent_dir_name = dir_name[:dir_name.rindex('/')]
-			if parent_dir_name not in self.directories.keys():
+		self.index = PathIndex()
+		# files first so they come before sub-directories in each directory's children
+		nodes = [self.index.insert(file_name, file) for file_name, file in self.files.items()]
+		nodes.extend(self.index.insert(dir_name, directory) for dir_name, directory in self.directories.items())
+		for node in nodes:
+			# parent is entry stored one level up, top-level entries and orphans have none
+			parent = node.parent.entry
+			if parent is None:
 				continue
 			# set parent and children
-			self.directories[dir_name].parent = self.directories[parent_dir_name]
-			self.directories[dir_name].parent_name = self.directories[parent_dir_name].name
-			self.directories[parent_dir_name].children.append(self.directories[dir_name])
+			node.entry.parent = parent
+			node.entry.parent_name = parent.name
+			parent.children.append(node.entry)
+
+	def rollup_last_commits(self):
+		""" Compute last commit for every entry, bottom-up so children are done before their parent.
+		Afterwards entries keep it up to date as revisions are added
+
+		"""
+		for file in self.files.values():
+			file.rollup_last_commit()
+		# deepest directories first
+		for directory in sorted(self.directories.values(), key=lambda directory: directory.name.count('/'), reverse=True):
+			directory.rollup_last_commit()
 
 	def assign_revisions(self, revisions):
 		""" Helper method to assign revisions to directories and files
 		"""
 		for revision in revisions:
-			if revision.name in self.directories.keys():
-				# check revision wasn't already added
-				if revision.revision not in [version.revision for version in self.directories[revision.name].versions]:
-					self.directories[revision.name].versions.append(revision)
-			if revision.name in self.files.keys() and revision not in self.files[revision.name].versions:
-				# check revision wasn't already added
-				if revision.revision not in [version.revision for version in self.files[revision.name].versions]:
-					self.files[revision.name].versions.append(revision)
+			# history skips revisions that were already added
+			if revision.name in self.directories:
+				self.directories[revision.name].versions.add(revision)
+			if revision.name in self.files:
+				self.files[revision.name].versions.add(revision)
 
 	@staticmethod
-	def generate_portfolio_from_db(db):
+	def generate_portfolio_from_db(db, assignment_name=None, session=None):
 		""" Use database to create svn portfolio
 
+		:param assignment_name: only load this top-level directory and everything below it, None to load everything
+		:param session: session to read with, None to use the db session
 		:return: repository object containing data from database
 		"""
+		if session is None:
+			session = db.session
 		# get the files and directories from db
-		directory_list = Directory.query.all()
-		file_list = File.query.all()
+		directory_query = session.query(Directory)
+		file_query = session.query(File)
+		if assignment_name is not None:
+			directory_query = directory_query.filter(Repository.subtree_filter(Directory.name, assignment_name))
+			file_query = file_query.filter(Repository.subtree_filter(File.name, assignment_name))
+		# order by name, so siblings are in the same order whether one subtree or everything is loaded. Without it
+		# the order depends on whether sqlite scans the table or the name index
+		directory_list = directory_query.order_by(Directory.name).all()
+		file_list = file_query.order_by(File.name).all()
 		for directory in directory_list:
 			directory.children = []
-			directory.versions = []
+			directory.parent = None
+			directory.last_commit = None
+			directory.versions = RevisionHistory(owner=directory)
 		for file in file_list:
 			file.children = []
-			file.versions = []
+			file.parent = None
+			file.last_commit = None
+			file.versions = RevisionHistory(owner=file)
 		# transform list into a dict
 		files = dict((file.name, file) for file in file_list)
 		directories = dict((directory.name, directory) for directory in directory_list)
 		# create repo
 		portfolio = Repository(directories, files)
-		# assign revisions, query db to get all
-		revisions = Revision.query.all()
-		portfolio.assign_revisions(revisions)
+		# assign revisions, joining every changed path to its commit, newest commit first like svn log
+		rows = session.query(ChangedPath.name, Changeset.revision, Changeset.date, Changeset.author,
+							 Changeset.msg, ChangedPath.action) \
+			.join(Changeset, ChangedPath.revision == Changeset.revision) \
+			.order_by(Changeset.revision.desc(), ChangedPath.id)
+		if assignment_name is not None:
+			rows = rows.filter(Repository.subtree_filter(ChangedPath.name, assignment_name))
+		portfolio.assign_revisions(Repository.path_revisions(rows))
 		# return complete portfolio
 		return portfolio
 
+	@staticmethod
+	def path_revisions(rows):
+		""" Create lightweight revisions from revision rows, sharing the metadata of each commit
+
+		:param rows: (name, revision, date, author, msg, action) tuples
+		:return: generator of PathRevision objects
+		"""
+		infos = {}
+		for name, revision, date, author, msg, action in rows:
+			info = infos.get(revision)
+			if info is None:
+				info = RevisionInfo(revision, date, intern_text(author), msg)
+				infos[revision] = info
+			yield PathRevision(intern_text(name), info, action)
+
+	@staticmethod
+	def subtree_filter(column, path):
+		""" Build condition matching path and every name below it, as a range so the column's index can be used.
+		'/' sorts just before '0', so names below path are at least path + '/' and less than path + '0'
+
+		:param column: name column to filter on
+		:param path: path of subtree root
+		:return: SQLAlchemy condition
+		"""
+		return or_(column == path, and_(column >= path + '/', column < path + '0'))
@@ -1,8 +1,37 @@
+import calendar
+from sys import intern
 from app import db
 
 
+def intern_text(text):
+	""" Intern a string so repeated values share one copy
+
+	:param text: string to intern, may be None
+	:return: interned string, or None
+	"""
+	if text is None:
+		return None
+	return intern(text)
+
+
+def date_timestamp(date):
+	""" Convert a svn date like 2017-03-21T15:08:51.388154Z to an integer that sorts and compares as a number
+
+	:param date: svn date, may be None
+	:return: seconds since the epoch, UTC, or None if date is not a svn date
+	"""
+	if date is None or len(date) < 19 or date[10] != 'T':
+		return None
+	try:
+		return calendar.timegm((int(date[0:4]), int(date[5:7]), int(date[8:10]),
+								int(date[11:13]), int(date[14:16]), int(date[17:19])))
+	except ValueError:
+		return None
+
+
 class Revision(db.Model):
-	""" Object to represent svn revision
+	""" Object to represent svn revision of one path. Replaced by Changeset and ChangedPath,
+	kept so older databases can be migrated
 
 	"""
 	id = db.Column(db.Integer, primary_key=True)
@@ -12,6 +41,8 @@ class Revision(db.Model):
 	msg = db.Column(db.String(200))
 	revision = db.Column(db.Integer)
 	#TODO: foreign key relationship w/ name
+	# an entry can only have one revision with a given number
+	__table_args__ = (db.Index('ix_revision_name_revision', 'name', 'revision', unique=True),)
 
 	def __init__(self, name, date, author, msg, revision):
 		""" Constructor
@@ -26,4 +57,170 @@ class Revision(db.Model):
 		self.date = date
 		self.author = author
 		self.revision = revision
-		self.msg = msg
\ No newline at end of file
+		self.msg = msg
+
+	@property
+	def timestamp(self):
+		""" Date of the revision in seconds since the epoch, UTC, or None if it is not a svn date
+		"""
+		return date_timestamp(self.date)
+
+
+class RevisionInfo(object):
+	""" Metadata of a single svn commit, stored once and shared by the revisions of every path it touched
+	"""
+	__slots__ = ('revision', 'date', 'author', 'msg', 'timestamp')
+
+	def __init__(self, revision, date, author, msg, timestamp=None):
+		""" Constructor
+
+		:param revision: revision number
+		:param date: Date of revision
+		:param author: Author of revision
+		:param msg: Commit message
+		:param timestamp: date as seconds since the epoch, parsed from date if not given
+		"""
+		self.revision = revision
+		self.date = date
+		self.author = author
+		self.msg = msg
+		self.timestamp = timestamp if timestamp is not None else date_timestamp(date)
+
+
+class PathRevision(object):
+	""" Lightweight revision of one path, reads its metadata from the shared RevisionInfo of its commit
+	"""
+	__slots__ = ('name', 'info', 'action')
+
+	def __init__(self, name, info, action=None):
+		""" Constructor
+
+		:param name: Name of entry of revision
+		:param info: RevisionInfo of the commit
+		:param action: svn action of the commit on this path (A, M, D or R), None if unknown
+		"""
+		self.name = name
+		self.info = info
+		self.action = action
+
+	@property
+	def revision(self):
+		""" Revision number of the commit
+		"""
+		return self.info.revision
+
+	@property
+	def date(self):
+		""" Date of the commit
+		"""
+		return self.info.date
+
+	@property
+	def author(self):
+		""" Author of the commit
+		"""
+		return self.info.author
+
+	@property
+	def msg(self):
+		""" Commit message
+		"""
+		return self.info.msg
+
+	@property
+	def timestamp(self):
+		""" Date of the commit in seconds since the epoch, UTC
+		"""
+		return self.info.timestamp
+
+
+class RevisionHistory(object):
+	""" Revisions of an entry, in the order they were added, that also indexes the revisions by number and keeps
+	them sorted by date. Wraps a list so revisions can only be added through methods that keep the indexes in sync
+	"""
+
+	def __init__(self, revisions=(), owner=None):
+		""" Constructor
+
+		:param revisions: revisions to start the history with
+		:param owner: directory or file the history belongs to, told about every added revision
+		"""
+		self.owner = owner
+		self.revisions = []		# revisions in the order they were added
+		self.numbers = set()	# revision numbers in history
+		self.sorted = []		# revisions sorted by date newest first, None until sorted again
+		self.newest = None		# revision with the latest date, newer additions win ties
+		self.extend(revisions)
+
+	def __iter__(self):
+		return iter(self.revisions)
+
+	def __len__(self):
+		return len(self.revisions)
+
+	def __getitem__(self, index):
+		return self.revisions[index]
+
+	def append(self, revision):
+		""" Add revision to end of history and index it, O(1) amortized
+
+		:param revision: revision to add
+		"""
+		self.revisions.append(revision)
+		self.numbers.add(int(revision.revision))
+		if self.newest is None or revision.date >= self.newest.date:
+			self.newest = revision
+		# svn log and db are both newest first, so revisions normally stay sorted by going at the end
+		if self.sorted is not None:
+			if len(self.sorted) == 0 or revision.date < self.sorted[-1].date:
+				self.sorted.append(revision)
+			else:
+				self.sorted = None
+		if self.owner is not None:
+			self.owner.update_last_commit(revision)
+
+	@property
+	def by_date(self):
+		""" Revisions sorted by date, newest first, newer additions first where dates are equal. Only sorted again
+		after a revision was added out of date order
+
+		:return: list of revisions
+		"""
+		if self.sorted is None:
+			# stable sort of the reversed history puts newer additions first on equal dates
+			self.sorted = sorted(reversed(self.revisions), key=lambda revision: revision.date, reverse=True)
+		return self.sorted
+
+	def extend(self, revisions):
+		""" Add several revisions to end of history
+
+		:param revisions: revisions to add
+		"""
+		for revision in revisions:
+			self.append(revision)
+
+	def add(self, revision):
+		""" Add revision unless history already has a revision with the same number
+
+		:param revision: revision to add
+		:return: True if revision was added
+		"""
+		if int(revision.revision) in self.numbers:
+			return False
+		self.append(revision)
+		return True
+
+	def has_revision(self, revision_num):
+		""" Check if history contains a revision number
+
+		:param revision_num: revision number to look for
+		:return: True if a revision with this number is in history
+		"""
+		return int(revision_num) in self.numbers
+
+	def latest(self):
+		""" Get the newest revision in history
+
+		:return: Revision with the latest date, or None if history is empty
+		"""
+		return self.newest
@@ -0,0 +1,93 @@
+from model.portfolio.entries import FileEntry
+
+
+def related_key(assignment_name):
+	""" Get key shared by related assignments, the character before the last '.', so Assignment1.0 and Assignment1.2
+	are related
+
+	:param assignment_name: name of the assignment
+	:return: key of the assignment's group, or None if the name has no '.'
+	"""
+	if '.' not in assignment_name:
+		return None
+	return assignment_name[assignment_name.rindex('.') - 1]
+
+
+class AssignmentRoutes(object):
+	""" Lookups used by the routes, precomputed once the repository's assignments are known so each is O(1).
+	Repositories call index_assignments, and index_file_owners if all their files are loaded
+	"""
+
+	def index_assignments(self):
+		""" Map each assignment's name to it and to the other assignments in its group
+		"""
+		self.assignments_by_name = dict((assignment.name, assignment) for assignment in self.assignments)
+		groups = {}
+		for assignment in self.assignments:
+			key = related_key(assignment.name)
+			if key is not None:
+				groups.setdefault(key, []).append(assignment)
+		# keep assignment order within each group
+		self.related_assignments = dict(
+			(assignment.name, tuple(related for related in groups.get(related_key(assignment.name), ())
+									if related is not assignment))
+			for assignment in self.assignments)
+
+	def index_file_owners(self):
+		""" Map every file below an assignment to that assignment
+		"""
+		self.file_owners = {}
+		for assignment in self.assignments:
+			for entry in self.list_subtree(assignment.name):
+				if isinstance(entry, FileEntry):
+					self.file_owners[entry.name] = assignment
+
+	def get_assignment(self, assignment_name):
+		""" Get top-level assignment by name
+
+		:param assignment_name: name of the assignment
+		:return: assignment directory, or None if there is no such assignment
+		"""
+		return self.assignments_by_name.get(assignment_name)
+
+	def has_assignment(self, assignment_name):
+		""" Check if there is an assignment with a name, without loading it
+
+		:param assignment_name: name of the assignment
+		:return: True if the assignment exists
+		"""
+		return assignment_name in self.assignments_by_name
+
+	def find_latest_commit(self):
+		""" Find the newest commit to any assignment. Read-only repositories store it as latest_commit
+
+		:return: newest revision, or None if no assignment has revisions
+		"""
+		last_commits = [assignment.get_last_commit() for assignment in self.assignments
+						if assignment.get_last_commit() is not None]
+		if len(last_commits) == 0:
+			return None
+		return max(last_commits, key=lambda commit: int(commit.revision))
+
+	def get_latest_commit(self):
+		""" Get the newest commit to any assignment, used to tell clients whether their copy of a page is current
+
+		:return: newest revision, or None if no assignment has revisions
+		"""
+		return self.latest_commit
+
+	def get_related_assignments(self, assignment_name):
+		""" Get the other assignments in the same group as an assignment
+
+		:param assignment_name: name of the assignment
+		:return: tuple of related assignments, in order
+		"""
+		return self.related_assignments.get(assignment_name, ())
+
+	def get_file_owner(self, file_name):
+		""" Get the assignment a file is in
+
+		:param file_name: path of the file
+		:return: assignment directory, or None if the file is not in an assignment
+		"""
+		return self.file_owners.get(file_name)
@@ -0,0 +1,55 @@
+from bisect import bisect_left
+
+
+class ChangeTimeline(object):
+	""" Time range queries over the revisions of every directory and file. Revisions are kept sorted by timestamp,
+	so a range or the newest changes are found by binary search. Only for read-only repositories, which call
+	index_changes once built, as revisions of a Repository may still be added
+	"""
+
+	def index_changes(self):
+		""" Sort the revisions of every directory and file by time and keep them
+		"""
+		self.change_times, self.changes = self.build_timeline()
+
+	def build_timeline(self):
+		""" Sort the revisions of every directory and file by time, revisions without a svn date are left out
+
+		:return: (list of timestamps, list of revisions in the same order), oldest first
+		"""
+		changes = [revision for entries in (self.directories, self.files) for entry in entries.values()
+				   for revision in entry.versions if revision.timestamp is not None]
+		# a commit's paths share its time, keep them together in name order
+		changes.sort(key=lambda revision: (revision.timestamp, int(revision.revision), revision.name))
+		return [revision.timestamp for revision in changes], changes
+
+	def get_timeline(self):
+		""" Get revisions sorted by time
+
+		:return: (list of timestamps, list of revisions in the same order), oldest first
+		"""
+		return self.change_times, self.changes
+
+	def changes_between(self, start, end, count=None):
+		""" Get the newest revisions made from start up to but not including end
+
+		:param start: seconds since the epoch, UTC
+		:param end: seconds since the epoch, UTC
+		:param count: most revisions to get, None for all of them
+		:return: list of revisions, newest first
+		"""
+		times, changes = self.get_timeline()
+		first = bisect_left(times, start)
+		last = bisect_left(times, end)
+		if count is not None:
+			first = max(first, last - count)
+		return list(reversed(changes[first:last]))
+
+	def latest_changes(self, count):
+		""" Get the newest revisions
+
+		:param count: number of revisions to get
+		:return: list of at most count revisions, newest first
+		"""
+		times, changes = self.get_timeline()
+		return list(reversed(changes[max(len(changes) - count, 0):]))
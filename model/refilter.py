@@ -0,0 +1,94 @@
+import time
+from model.high_water_mark import HighWaterMark
+from model.portfolio.entries import Comment
+
+# name of the high-water mark holding the id of the last comment checked by an unfinished run
+REFILTER_MARK = 'comment_refilter'
+# name of the high-water mark bumped whenever stored comments are changed, part of the keys of rendered comments
+COMMENT_GENERATION_MARK = 'comment_generation'
+
+
+class CommentRefilter(object):
+	""" Applies the current filter words to comments already stored. The comment table is read in chunks of ids,
+	so memory stays bounded, and each chunk's changed rows are committed together with a checkpoint, so an
+	interrupted run resumes after the last chunk it committed, and with a new comment generation
+	"""
+
+	def __init__(self, session, matcher, chunk_size=1000):
+		""" Constructor
+
+		:param session: database session to read and write comments with
+		:param matcher: FilterMatcher with the current filter words
+		:param chunk_size: number of comments read and committed at a time
+		"""
+		self.session = session
+		self.matcher = matcher
+		self.chunk_size = chunk_size
+
+	def run(self, resume=True):
+		""" Filter every comment, or the ones after the checkpoint of an interrupted run
+
+		:param resume: continue after the checkpoint if there is one, False to start from the first comment
+		:return: dict with the number of comments scanned and changed, chunks committed, the id the run resumed
+		after and the seconds taken
+		"""
+		start = time.time()
+		last_id = self.get_checkpoint() if resume else None
+		stats = {'scanned': 0, 'changed': 0, 'chunks': 0, 'resumed_after': last_id}
+		while True:
+			rows = self.read_chunk(last_id)
+			if len(rows) == 0:
+				break
+			changes = self.filter_chunk(rows)
+			if changes:
+				self.session.bulk_update_mappings(Comment, changes)
+				# servers render the changed comments again once this chunk is committed
+				HighWaterMark.increment(self.session.connection(), COMMENT_GENERATION_MARK)
+			last_id = rows[-1][0]
+			# changes and checkpoint are committed together, so a resumed run never skips uncommitted changes
+			self.session.merge(HighWaterMark(REFILTER_MARK, last_id))
+			self.session.commit()
+			stats['scanned'] += len(rows)
+			stats['changed'] += len(changes)
+			stats['chunks'] += 1
+		# finished, so the next run starts from the first comment again
+		mark = self.session.get(HighWaterMark, REFILTER_MARK)
+		if mark is not None:
+			self.session.delete(mark)
+			self.session.commit()
+		stats['seconds'] = time.time() - start
+		return stats
+
+	def get_checkpoint(self):
+		""" Get the id of the last comment checked by an interrupted run
+
+		:return: comment id, or None if the last run finished or there has been none
+		"""
+		mark = self.session.get(HighWaterMark, REFILTER_MARK)
+		if mark is None:
+			return None
+		return mark.value
+
+	def read_chunk(self, last_id):
+		""" Read the next chunk of comments by id, only the columns needed so no comment objects are kept
+
+		:param last_id: id of the last comment already checked, None to start from the first
+		:return: list of (id, message) in id order
+		"""
+		query = self.session.query(Comment.id, Comment.message)
+		if last_id is not None:
+			query = query.filter(Comment.id > last_id)
+		return query.order_by(Comment.id).limit(self.chunk_size).all()
+
+	def filter_chunk(self, rows):
+		""" Filter a chunk of comments
+
+		:param rows: list of (id, message)
+		:return: list of update mappings for the comments whose message changed
+		"""
+		changes = []
+		for comment_id, message in rows:
+			filtered = self.matcher.apply(message)
+			if filtered != message:
+				changes.append({'id': comment_id, 'message': filtered})
+		return changes
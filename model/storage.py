@@ -0,0 +1,41 @@
+import sqlite3
+from urllib.parse import quote
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
+
+
+def set_pragmas(engine, pragmas, read_only=False):
+	""" Run pragmas on every new connection of an engine, before it is used
+
+	:param engine: sqlite engine
+	:param pragmas: dict of pragma name -> value, run in order
+	:param read_only: True to also refuse writes and skip journal_mode, which only a writer may change
+	"""
+	def on_connect(dbapi_connection, connection_record):
+		cursor = dbapi_connection.cursor()
+		for name, value in pragmas.items():
+			if read_only and name == 'journal_mode':
+				continue
+			cursor.execute('PRAGMA %s = %s' % (name, value))
+		if read_only:
+			cursor.execute('PRAGMA query_only = ON')
+		cursor.close()
+	event.listen(engine, 'connect', on_connect)
+
+
+def create_read_engine(path, pragmas, pool_size=8):
+	""" Create engine with a pool of read-only connections. In WAL mode these read the last committed data while
+	ingest or comment writes are in progress instead of waiting for them
+
+	:param path: path of the sqlite database file, which must already exist
+	:param pragmas: dict of pragma name -> value for every connection
+	:param pool_size: number of connections kept open
+	:return: engine
+	"""
+	# mode=ro opens the file read-only, the connections are shared between request threads through the pool.
+	# the path is escaped for the URI and given to sqlite directly, since the engine URL would unescape it again
+	uri = 'file:%s?mode=ro' % quote(path)
+	engine = create_engine('sqlite://', poolclass=QueuePool, pool_size=pool_size,
+						   creator=lambda: sqlite3.connect(uri, uri=True, check_same_thread=False))
+	set_pragmas(engine, pragmas, read_only=True)
+	return engine
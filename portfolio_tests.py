@@ -1,8 +1,10 @@
 import unittest
 
-from model.portfolio.revision import Revision
-from model.portfolio.entries import Directory, File
+from model.portfolio.revision import Revision, RevisionHistory, RevisionInfo, PathRevision, date_timestamp
+from model.portfolio.entries import Directory, File, Comment
 from model.portfolio.repository import Repository
+from model.portfolio.read_model import ReadRepository
+from model.portfolio.refresher import RepositoryHolder, Refresher
 
 
 class PortfolioTests(unittest.TestCase):
@@ -85,6 +87,154 @@ class PortfolioTests(unittest.TestCase):
 		self.assertEqual(dir.children, [])
 
 
+	# path index should resolve, list and count entries in a tree
+	def test_path_index(self):
+		top_dir = Directory('Assignment5.0', 1, '04/12/17', 'lstrait2')
+		top_file = File('Assignment5.0/f.txt', 2, '04/13/17', 'lstrait2', 25)
+		sub_dir = Directory('Assignment5.0/src', 3, '04/12/17', 'lstrait2')
+		deep_file = File('Assignment5.0/src/g.py', 3, '04/12/17', 'lstrait2', 10)
+		other_file = File('Assignment5.0/src/other.py', 3, '04/12/17', 'lstrait2', 10)
+		repo = Repository({top_dir.name: top_dir, sub_dir.name: sub_dir},
+						  {top_file.name: top_file, deep_file.name: deep_file, other_file.name: other_file})
+		self.assertEqual(repo.resolve('Assignment5.0/src/g.py'), deep_file)
+		self.assertEqual(repo.resolve('Assignment5.0/src'), sub_dir)
+		self.assertIsNone(repo.resolve('Assignment5.0/missing'))
+		self.assertIsNone(repo.resolve('Assignment5.0/src/g.py/more'))
+		# parents come before children in subtree listing
+		self.assertEqual(repo.list_subtree('Assignment5.0'), [top_file, sub_dir, deep_file, other_file])
+		self.assertEqual(repo.list_subtree('Assignment5.0/src'), [deep_file, other_file])
+		self.assertEqual(repo.list_subtree('Assignment6.0'), [])
+		# prefix may end part way through a name
+		self.assertEqual(repo.search_prefix('Assignment5.0/src/o'), [other_file])
+		self.assertEqual(repo.search_prefix('Assign'), [top_dir, top_file, sub_dir, deep_file, other_file])
+		self.assertEqual(repo.count_descendants('Assignment5.0'), 4)
+		self.assertEqual(repo.count_descendants('Assignment5.0/src'), 2)
+		self.assertEqual(repo.count_descendants(''), 5)
+		self.assertEqual(repo.count_descendants('Assignment5.0/src/g.py'), 0)
+		# nested for display, files before directories
+		self.assertEqual(repo.tree('Assignment5.0'), [(top_file, []), (sub_dir, [(deep_file, []), (other_file, [])])])
+		self.assertEqual(repo.tree('Assignment6.0'), [])
+		# tree should be linked from the index
+		self.assertEqual(deep_file.parent, sub_dir)
+		self.assertEqual(top_dir.children, [top_file, sub_dir])
+
+	# read model should copy tree, history and rollups of the repository
+	def test_read_model(self):
+		read_repo = ReadRepository(self.repo)
+		read_dir = read_repo.directories['Assignment5.0']
+		read_file = read_repo.files['Assignment5.0/f.txt']
+		self.assertEqual(read_repo.assignments, (read_dir,))
+		self.assertEqual(read_dir.children, (read_file,))
+		self.assertEqual(read_file.parent, read_dir)
+		self.assertEqual(read_file.size, 25)
+		self.assertEqual(read_file.get_file_name(), 'f.txt')
+		self.assertEqual(read_file.get_file_type(), 'resource')
+		self.assertEqual(read_dir.get_summary(), 'this is a commit')
+		self.assertEqual(read_repo.resolve('Assignment5.0/f.txt'), read_file)
+		self.assertEqual(read_repo.count_descendants('Assignment5.0'), 1)
+		self.assertEqual(read_repo.get_assignment('Assignment5.0'), read_dir)
+		self.assertIsNone(read_repo.get_assignment('Assignment5.0/f.txt'))
+		self.assertEqual(read_repo.get_file('Assignment5.0/f.txt'), read_file)
+		self.assertIsNone(read_repo.get_file('Assignment5.0'))
+		# the same revision was added to both entries, copy should be shared too
+		self.assertIs(read_file.versions[0], read_dir.versions[0])
+		self.assertEqual(read_file.versions[0].msg, 'this is a commit')
+
+	# read model should be compact and frozen
+	def test_read_model_frozen(self):
+		read_repo = ReadRepository(self.repo)
+		read_file = read_repo.files['Assignment5.0/f.txt']
+		self.assertFalse(hasattr(read_file, '__dict__'))
+		self.assertFalse(hasattr(read_file.versions[0], '__dict__'))
+		self.assertRaises(AttributeError, setattr, read_file, 'name', 'g.txt')
+		self.assertRaises(AttributeError, setattr, read_file.versions[0], 'msg', 'changed')
+		# changes to the repository afterwards should not leak into the read model
+		self.file.versions.append(Revision('18', '04/14/16', 'lstrait2', 'this is a new commit', '18'))
+		self.assertEqual(len(read_file.versions), 1)
+		self.assertEqual(read_file.get_summary(), 'this is a commit')
+
+	# route lookups should be precomputed for assignments, related assignments and file owners
+	def test_assignment_routes(self):
+		names = ['Assignment1.0', 'Assignment1.1', 'Assignment2.0', 'Assignment3', 'junk']
+		dirs = dict((name, Directory(name, 1, '04/12/17', 'lstrait2')) for name in names)
+		dirs['Assignment1.0/src'] = Directory('Assignment1.0/src', 1, '04/12/17', 'lstrait2')
+		files = {'Assignment1.0/src/a.py': File('Assignment1.0/src/a.py', 1, '04/12/17', 'lstrait2', 5),
+				 'junk/b.py': File('junk/b.py', 1, '04/12/17', 'lstrait2', 5)}
+		for repo in (Repository(dirs, files), ReadRepository(Repository(dirs, files))):
+			self.assertEqual(repo.get_assignment('Assignment1.1').name, 'Assignment1.1')
+			self.assertIsNone(repo.get_assignment('junk'))
+			self.assertIsNone(repo.get_assignment('Assignment1.0/src'))
+			self.assertEqual([related.name for related in repo.get_related_assignments('Assignment1.0')], ['Assignment1.1'])
+			self.assertEqual(repo.get_related_assignments('Assignment2.0'), ())
+			self.assertEqual(repo.get_related_assignments('Assignment3'), ())
+			self.assertEqual(repo.get_file_owner('Assignment1.0/src/a.py').name, 'Assignment1.0')
+			self.assertIsNone(repo.get_file_owner('junk/b.py'))
+
+	# svn dates should convert to seconds since the epoch, other dates have no timestamp
+	def test_date_timestamp(self):
+		self.assertEqual(date_timestamp('2017-03-21T15:08:51.388154Z'), 1490108931)
+		self.assertEqual(date_timestamp('1970-01-01T00:00:00.000000Z'), 0)
+		self.assertIsNone(date_timestamp('04/12/17'))
+		self.assertIsNone(date_timestamp(None))
+
+	# changes should be found by time range and newest first
+	def test_change_timeline(self):
+		dirs = {'Assignment1.0': Directory('Assignment1.0', 3, '2017-02-03T00:00:00.000000Z', 'lstrait2')}
+		files = {'Assignment1.0/a.py': File('Assignment1.0/a.py', 3, '2017-02-03T00:00:00.000000Z', 'lstrait2', 5)}
+		repo = Repository(dirs, files)
+		first = RevisionInfo('1', '2017-02-01T00:00:00.000000Z', 'lstrait2', 'first')
+		second = RevisionInfo('2', '2017-02-02T00:00:00.000000Z', 'lstrait2', 'second')
+		third = RevisionInfo('3', '2017-02-03T00:00:00.000000Z', 'lstrait2', 'third')
+		repo.assign_revisions([PathRevision('Assignment1.0/a.py', third), PathRevision('Assignment1.0', third),
+							   PathRevision('Assignment1.0/a.py', second), PathRevision('Assignment1.0', first),
+							   PathRevision('Assignment1.0/a.py', RevisionInfo('0', 'not a date', 'lstrait2', 'x'))])
+		timeline = ReadRepository(repo)
+		changes = timeline.changes_between(date_timestamp('2017-02-02T00:00:00Z'), date_timestamp('2017-02-03T00:00:00Z'))
+		self.assertEqual([(change.revision, change.name) for change in changes], [('2', 'Assignment1.0/a.py')])
+		# newest of the range first, only as many as asked for
+		changes = timeline.changes_between(0, date_timestamp('2017-02-04T00:00:00Z'), 2)
+		self.assertEqual([(change.revision, change.name) for change in changes],
+						 [('3', 'Assignment1.0/a.py'), ('3', 'Assignment1.0')])
+		self.assertEqual(len(timeline.changes_between(0, date_timestamp('2017-02-04T00:00:00Z'))), 4)
+		self.assertEqual([(change.revision, change.name) for change in timeline.latest_changes(3)],
+						 [('3', 'Assignment1.0/a.py'), ('3', 'Assignment1.0'), ('2', 'Assignment1.0/a.py')])
+		self.assertEqual(len(timeline.latest_changes(10)), 4)
+		self.assertEqual(timeline.latest_changes(0), [])
+		self.assertEqual(timeline.changes_between(0, 1), [])
+
+	# comments should be linked into threads in memory, newest reply first
+	def test_generate_children(self):
+		comments = [Comment('f.txt', None, 'first'), Comment('f.txt', 1, 'reply'), Comment('f.txt', None, 'second'),
+					Comment('f.txt', 1, 'newer reply'), Comment('f.txt', 2, 'reply to reply')]
+		for num, comment in enumerate(comments):
+			comment.id = num + 1
+		Comment.generate_children(comments)
+		self.assertEqual([child.id for child in comments[0].children], [4, 2])
+		self.assertEqual([child.id for child in comments[1].children], [5])
+		self.assertEqual(comments[2].children, [])
+		self.assertEqual(comments[4].children, [])
+
+	# refresher should only rebuild and swap when the ingest generation changes
+	def test_refresher_swaps_on_new_generation(self):
+		holder = RepositoryHolder(ReadRepository(self.repo), 1)
+		snapshot = holder.get()
+		generations = [1, 2, 2]
+
+		class TestRefresher(Refresher):
+			@staticmethod
+			def current_generation():
+				return generations.pop(0)
+
+		refresher = TestRefresher(None, None, holder, lambda: ReadRepository(self.repo), 60)
+		self.assertFalse(refresher.refresh())
+		self.assertIs(holder.get(), snapshot)
+		self.assertTrue(refresher.refresh())
+		self.assertIsNot(holder.get(), snapshot)
+		self.assertEqual(holder.get_generation(), 2)
+		self.assertFalse(refresher.refresh())
+		# a request still holding the old snapshot keeps seeing complete data
+		self.assertEqual(snapshot.get_file('Assignment5.0/f.txt').name, 'Assignment5.0/f.txt')
+
 	# check last commit works
 	def test_last_commit(self):
 		# add a new commit
@@ -103,12 +253,91 @@ class PortfolioTests(unittest.TestCase):
 		# this commit should be commit for directory as well
 		self.assertEqual(self.dir.get_last_commit(), revision)
 
+	# new revision deep in the tree should update last commit of every ancestor
+	def test_last_commit_propagates(self):
+		sub_dir = Directory('Assignment5.0/src', 3, '04/12/17', 'lstrait2')
+		deep_file = File('Assignment5.0/src/g.py', 3, '04/12/17', 'lstrait2', 10)
+		repo = Repository({self.dir.name: self.dir, sub_dir.name: sub_dir},
+						  {self.file.name: self.file, deep_file.name: deep_file})
+		self.assertEqual(sub_dir.get_last_commit(), None)
+		self.assertEqual(self.dir.get_last_commit().revision, '17')
+		revision = Revision('Assignment5.0/src/g.py', '04/15/16', 'lstrait2', 'deep commit', '19')
+		repo.assign_revisions([revision])
+		self.assertEqual(deep_file.get_last_commit(), revision)
+		self.assertEqual(sub_dir.get_last_commit(), revision)
+		self.assertEqual(self.dir.get_summary(), 'deep commit')
+		# older revision should not replace newer last commits
+		old_revision = Revision('Assignment5.0/src/g.py', '04/01/16', 'lstrait2', 'old commit', '16')
+		repo.assign_revisions([old_revision])
+		self.assertEqual(self.dir.get_last_commit(), revision)
+
 	# check summary is last commit message
 	def test_get_summary(self):
 		# both file and dir have same commit message
 		self.assertEqual(self.file.get_summary(), "this is a commit")
 		self.assertEqual(self.dir.get_summary(), "this is a commit")
 
+	# history should stay sorted by date whatever order revisions are added in
+	def test_revision_history_sorted(self):
+		history = RevisionHistory()
+		dates = ['2017-02-03', '2017-02-01', '2017-02-05', '2017-02-02', '2017-02-04']
+		for num, date in enumerate(dates):
+			history.append(Revision('f.txt', date, 'lstrait2', 'commit', num))
+		# list order should be insertion order, by_date newest first
+		self.assertEqual([revision.date for revision in history], dates)
+		self.assertEqual([revision.date for revision in history.by_date], sorted(dates, reverse=True))
+		self.assertEqual(history.latest().date, '2017-02-05')
+		# adding after sorting keeps by_date current
+		history.append(Revision('f.txt', '2017-02-06', 'lstrait2', 'commit', 5))
+		history.append(Revision('f.txt', '2017-01-01', 'lstrait2', 'commit', 6))
+		self.assertEqual(history.by_date[0].date, '2017-02-06')
+		self.assertEqual(history.by_date[-1].date, '2017-01-01')
+		self.assertEqual(len(history.by_date), 7)
+
+	# newest revision should win when dates are equal, matching a stable sort
+	def test_revision_history_ties(self):
+		first = Revision('f.txt', '2017-02-01', 'lstrait2', 'first', '1')
+		second = Revision('f.txt', '2017-02-01', 'lstrait2', 'second', '2')
+		history = RevisionHistory([first, second])
+		self.assertEqual(history.latest(), second)
+		self.assertEqual(history.by_date, [second, first])
+		# history is not a list, so revisions cannot be added around the indexes
+		self.assertFalse(hasattr(history, 'insert'))
+		with self.assertRaises(TypeError):
+			history[0] = second
+
+	# history should skip revision numbers it already has, whether strings or ints
+	def test_revision_history_add(self):
+		history = RevisionHistory()
+		self.assertTrue(history.add(Revision('f.txt', '2017-02-01', 'lstrait2', 'commit', '17')))
+		self.assertFalse(history.add(Revision('f.txt', '2017-02-01', 'lstrait2', 'commit', 17)))
+		self.assertEqual(len(history), 1)
+		self.assertTrue(history.has_revision(17))
+		self.assertIsNone(RevisionHistory().latest())
+
+	# assigning revisions should not add the same revision number twice
+	def test_assign_revisions_duplicates(self):
+		revisions = [Revision('Assignment5.0/f.txt', '04/14/16', 'lstrait2', 'new commit', '18'),
+					 Revision('Assignment5.0/f.txt', '04/14/16', 'lstrait2', 'new commit', '18'),
+					 Revision('Assignment5.0', '04/14/16', 'lstrait2', 'new commit', '18')]
+		self.repo.assign_revisions(revisions)
+		self.assertEqual([version.revision for version in self.file.versions], ['17', '18'])
+		self.assertEqual([version.revision for version in self.dir.versions], ['17', '18'])
+		self.assertEqual(self.file.get_last_commit(), revisions[0])
+
+	# revisions loaded from rows should share the metadata of each commit
+	def test_path_revisions(self):
+		rows = [('Assignment5.0/f.txt', 18, '04/14/16', 'lstrait2', 'new commit', 'A'),
+				('Assignment5.0', 18, '04/14/16', 'lstrait2', 'new commit', 'M'),
+				('Assignment5.0/f.txt', 19, '04/15/16', 'lstrait2', 'newer commit', None)]
+		revisions = list(Repository.path_revisions(rows))
+		self.assertIs(revisions[0].info, revisions[1].info)
+		self.assertIsNot(revisions[0].info, revisions[2].info)
+		self.assertEqual([(revision.name, revision.revision, revision.msg, revision.action) for revision in revisions],
+						 [(row[0], row[1], row[4], row[5]) for row in rows])
+		self.repo.assign_revisions(revisions)
+		self.assertEqual(self.file.get_last_commit(), revisions[2])
+
 
 	"""
 	All tests below test that file types are correctly classified as 'code', 'image', 'test', or 'resource'
@@ -0,0 +1,82 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import app, db
+from model.portfolio.entries import Comment
+from model.storage import set_pragmas, create_read_engine
+
+
+class StorageTests(unittest.TestCase):
+
+	def setUp(self):
+		# scratch database opened the way app.py opens the real one
+		self.tmp_dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.tmp_dir, 'portfolio.db')
+		self.engine = create_engine('sqlite:///' + self.path)
+		set_pragmas(self.engine, app.config['SQLITE_PRAGMAS'])
+		db.metadata.create_all(self.engine)
+		self.read_engine = create_read_engine(self.path, app.config['SQLITE_PRAGMAS'], pool_size=2)
+
+	def tearDown(self):
+		self.read_engine.dispose()
+		self.engine.dispose()
+		shutil.rmtree(self.tmp_dir)
+
+	# every connection should get the configured pragmas
+	def test_pragmas(self):
+		with self.engine.connect() as connection:
+			self.assertEqual(connection.execute(text('PRAGMA journal_mode')).scalar(), 'wal')
+			self.assertEqual(connection.execute(text('PRAGMA synchronous')).scalar(), 1)
+			self.assertEqual(connection.execute(text('PRAGMA cache_size')).scalar(), -16000)
+		with self.read_engine.connect() as connection:
+			self.assertEqual(connection.execute(text('PRAGMA query_only')).scalar(), 1)
+			self.assertEqual(connection.execute(text('PRAGMA busy_timeout')).scalar(), 5000)
+
+	# read-only connections should refuse writes
+	def test_read_only(self):
+		session = sessionmaker(bind=self.read_engine)()
+		session.add(Comment('f.txt', None, 'not allowed'))
+		self.assertRaises(OperationalError, session.commit)
+		session.close()
+
+	# readers should see the last commit while a write transaction is open, without waiting for it
+	def test_read_during_write(self):
+		writer = sessionmaker(bind=self.engine)()
+		writer.add(Comment('f.txt', None, 'committed'))
+		writer.commit()
+		writer.add(Comment('f.txt', None, 'in progress'))
+		writer.flush()
+		reader = sessionmaker(bind=self.read_engine)()
+		self.assertEqual(reader.query(Comment).count(), 1)
+		reader.close()
+		writer.commit()
+		writer.close()
+		reader = sessionmaker(bind=self.read_engine)()
+		self.assertEqual(reader.query(Comment).count(), 2)
+		reader.close()
+
+	# paths with characters that mean something in a URI should open the file they name
+	def test_read_engine_path_escaped(self):
+		for name in ['with space.db', 'question?mark.db', 'hash#.db', 'percent%20.db']:
+			path = os.path.join(self.tmp_dir, name)
+			# created without an engine URL, which has the same problem
+			connection = sqlite3.connect(path)
+			connection.execute('CREATE TABLE comment (id INTEGER PRIMARY KEY)')
+			connection.close()
+			read_engine = create_read_engine(path, app.config['SQLITE_PRAGMAS'], pool_size=1)
+			with read_engine.connect() as connection:
+				self.assertEqual(connection.execute(text('SELECT count(*) FROM comment')).scalar(), 0)
+			read_engine.dispose()
+		# nothing should have been created at a truncated path
+		for name in ['with', 'question', 'hash', 'percent .db']:
+			self.assertFalse(os.path.exists(os.path.join(self.tmp_dir, name)))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -12,3 +12,23 @@ echo ""
 echo "Running db Tests"
 echo ""
 python db_tests.py
+echo ""
+echo "Running Ingest Tests"
+echo ""
+python ingest_tests.py
+echo ""
+echo "Running View Tests"
+echo ""
+python view_tests.py
+echo ""
+echo "Running Comment Tests"
+echo ""
+python comment_tests.py
+echo ""
+echo "Running Storage Tests"
+echo ""
+python storage_tests.py
+echo ""
+echo "Running Lazy Repository Tests"
+echo ""
+python lazy_repository_tests.py
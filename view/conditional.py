@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+from flask import request, make_response, current_app
+from model.portfolio.revision import date_timestamp
+
+
+def page_etag(latest_commit, comment_id=None, comment_generation=None):
+	""" Build the ETag of a page from the newest revision it shows, and the newest comment for file pages
+
+	:param latest_commit: newest revision in the repository, may be None
+	:param comment_id: id of the file's newest comment, None for pages without comments or files without any
+	:param comment_generation: generation of stored comments for pages showing them, None to leave out
+	:return: ETag value, without quotes
+	"""
+	etag = 'r%s' % (latest_commit.revision if latest_commit is not None else 0)
+	if comment_id is not None:
+		etag += '-c%d' % comment_id
+	if comment_generation is not None:
+		etag += '-g%d' % comment_generation
+	return etag
+
+
+def commit_time(commit):
+	""" Get time of a commit for the Last-Modified header
+
+	:param commit: revision with a svn date like 2017-03-21T15:08:51.388154Z, may be None
+	:return: timezone aware datetime to the second, HTTP dates have no fractions, or None if there is no svn date
+	"""
+	if commit is None:
+		return None
+	timestamp = date_timestamp(commit.date)
+	if timestamp is None:
+		return None
+	return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+def is_not_modified(etag, last_modified):
+	""" Check the request's validators against the page's current ones. If-None-Match wins when both are sent
+
+	:param etag: current ETag of the page
+	:param last_modified: current Last-Modified of the page, None if the page has none
+	:return: True if the client's copy is current
+	"""
+	if request.method not in ('GET', 'HEAD'):
+		return False
+	if request.if_none_match:
+		# weak comparison, proxies that compress pages mark their ETags weak
+		return request.if_none_match.contains_weak(etag)
+	if request.if_modified_since is not None and last_modified is not None:
+		return last_modified <= request.if_modified_since
+	return False
+
+
+def conditional_response(etag, last_modified, render):
+	""" Answer with 304 if the client's copy is current, otherwise render the page. Either way the validators and
+	Cache-Control are set, so browsers and the CDN may keep the page but have to check it is still current
+
+	:param etag: current ETag of the page
+	:param last_modified: current Last-Modified of the page, None to leave it out
+	:param render: function returning the page, only called if the client's copy is out of date
+	:return: response
+	"""
+	if is_not_modified(etag, last_modified):
+		response = current_app.response_class(status=304)
+	else:
+		response = make_response(render())
+	response.set_etag(etag)
+	if last_modified is not None:
+		response.last_modified = last_modified
+	response.cache_control.public = True
+	max_age = current_app.config['PAGE_MAX_AGE']
+	if max_age > 0:
+		response.cache_control.max_age = max_age
+	else:
+		response.cache_control.no_cache = True
+	return response
@@ -1,11 +1,19 @@
-from flask import Blueprint, render_template, abort, request
+import sys
+from functools import partial
+from flask import Blueprint, render_template, abort, request, jsonify, current_app
+from sqlalchemy import func
 from model.portfolio.entries import Comment
-from app import db
+from model.high_water_mark import HighWaterMark
+from model.refilter import COMMENT_GENERATION_MARK
+from view.conditional import page_etag, commit_time, conditional_response
+from app import db, read_session
 
-def construct_portfolio_blueprint(portfolio):
+def construct_portfolio_blueprint(portfolio_holder, render_cache, comment_writer=None):
 	""" Blueprint to create routes for portfolio site
 
-	:param portfolio: portfolio data created by XMLParser
+	:param portfolio_holder: RepositoryHolder of the ReadRepository or LazyRepository to serve
+	:param render_cache: RenderCache for rendered pages and fragments
+	:param comment_writer: CommentWriter to write posted comments with, None to commit each in its request
 	:return: blueprint with registered routes
 	"""
 
@@ -17,7 +25,11 @@ def construct_portfolio_blueprint(portfolio):
 
 		:return: HTML rendering
 		"""
-		return render_template('index.html', portfolio=portfolio.assignments)
+		portfolio, generation = portfolio_holder.get_snapshot()
+		latest_commit = portfolio.get_latest_commit()
+		return conditional_response(page_etag(latest_commit), commit_time(latest_commit),
+									partial(render_cache.get_or_render, ('index', generation),
+											lambda: render_template('index.html', portfolio=portfolio.assignments)))
 
 	@portfolio_blueprint.route('/assignments/<string:assignment_name>', methods=['GET'])
 	def get_project(assignment_name):
@@ -26,12 +38,35 @@ def construct_portfolio_blueprint(portfolio):
 		:param assignment_name: assignment to display
 		:return: HTML rendering of assignment page, or 400 error if assignment_name doesn't exist
 		"""
-		assignments = filter(lambda assignment: assignment.name == assignment_name, portfolio.assignments)
-		related_assignments = filter(lambda assignment: '.' in assignment_name and assignment_name != assignment.name and '.' in assignment.name
-									and assignment.name[assignment.name.rindex('.') - 1] == assignment_name[assignment_name.rindex('.') - 1], portfolio.assignments)
-		if len(assignments) == 0:
+		# use one snapshot for the whole request, the holder may be swapped meanwhile
+		portfolio, generation = portfolio_holder.get_snapshot()
+		if not portfolio.has_assignment(assignment_name):
 			abort(400)
-		return render_template('assignment_page.html', assignment=assignments[0], related_assignments=related_assignments)
+		latest_commit = portfolio.get_latest_commit()
+		return conditional_response(page_etag(latest_commit), commit_time(latest_commit),
+									partial(render_cache.get_or_render, ('assignment', generation, assignment_name),
+											partial(render_assignment, portfolio, generation, assignment_name)))
+
+	def render_assignment(portfolio, generation, assignment_name):
+		""" render assignment page, with the directory tree as a cached fragment
+
+		:param portfolio: repository snapshot of the request
+		:param generation: generation of the snapshot
+		:param assignment_name: assignment to display
+		:return: HTML rendering of assignment page
+		"""
+		assignment = portfolio.get_assignment(assignment_name)
+		if assignment is None:
+			abort(400)
+		related_assignments = portfolio.get_related_assignments(assignment_name)
+		# size of the assignment's tree comes straight from the path index
+		entry_count = portfolio.count_descendants(assignment_name)
+		# tree is nested from the path index rather than by walking each directory's children
+		tree = render_cache.get_or_render(('tree', generation, assignment_name),
+										  lambda: render_template('fragments/directory_tree.html', assignment=assignment,
+																  tree=portfolio.tree(assignment_name)))
+		return render_template('assignment_page.html', assignment=assignment, related_assignments=related_assignments,
+							   entry_count=entry_count, tree=tree)
 
 	@portfolio_blueprint.route('/assignments/<string:assignment_name>/files/<path:file_name>', methods=['GET'])
 	def get_file(assignment_name, file_name):
@@ -41,15 +76,119 @@ def construct_portfolio_blueprint(portfolio):
 		:param file_name:name of the file
 		:return: HTML rendering of file page, or 400 error if file_name or assignment_name doesn't exist
 		"""
-		assignments = filter(lambda assignment: assignment.name == assignment_name, portfolio.assignments)
-		if len(assignments) == 0 or file_name not in portfolio.files.keys():
+		portfolio, generation = portfolio_holder.get_snapshot()
+		file = portfolio.get_file(file_name)
+		assignment = portfolio.get_file_owner(file_name)
+		# file must be in the assignment of the url
+		if file is None or assignment is None or assignment.name != assignment_name:
+			abort(400)
+		# page changes with new revisions, new comments and re-filtered comments. Comments have no time, so there
+		# is no Last-Modified
+		comment_id = read_session.query(func.max(Comment.id)).filter(Comment.file == file_name).scalar()
+		comment_generation = HighWaterMark.get_value(COMMENT_GENERATION_MARK, read_session)
+		# older top level comments are paged with the id of the last comment shown
+		before = request.args.get('before', type=int)
+		return conditional_response(page_etag(portfolio.get_latest_commit(), comment_id, comment_generation), None,
+									partial(render_file, generation, comment_id, comment_generation, assignment, file, before))
+
+	def render_file(generation, comment_id, comment_generation, assignment, file, before):
+		""" render file page from cached history and comment fragments
+
+		:param generation: generation of the request's repository snapshot
+		:param comment_id: id of the file's newest comment, None if it has none
+		:param comment_generation: generation of stored comments, None if they have never been re-filtered
+		:param assignment: assignment the file is in
+		:param file: file to display
+		:param before: show top level comments older than this id, None for the newest
+		:return: HTML rendering of file page
+		"""
+		# history only changes on ingest, comments when one is posted to this file or main_refilter changes them.
+		# comments are keyed on the newest id, so a comment posted through another worker is seen here too
+		history = render_cache.get_or_render(('history', generation, file.name),
+											 lambda: render_template('fragments/file_history.html', file=file))
+		comment_list = render_cache.get_or_render(('comments', file.name, comment_id, comment_generation, before),
+												  lambda: render_comments(assignment, file, before))
+		return render_template('file_page.html', file=file, assignment=assignment, history=history,
+							   comment_list=comment_list, reply_depth=current_app.config['COMMENT_REPLY_DEPTH'])
+
+	def render_comments(assignment, file, before):
+		""" render comment fragment of a file page
+
+		:param assignment: assignment the file is in
+		:param file: file to render comments of
+		:param before: show top level comments older than this id, None for the newest
+		:return: HTML rendering of a page of the file's comments
+		"""
+		# one page of top level comments, with replies only down to the configured depth
+		comments, next_before = Comment.get_comment_page(read_session, file.name, before,
+														 current_app.config['COMMENTS_PER_PAGE'],
+														 current_app.config['COMMENT_REPLY_DEPTH'])
+		return render_template('fragments/comments.html', file=file, assignment=assignment, comments=comments,
+							   next_before=next_before)
+
+	@portfolio_blueprint.route('/api/comments/<int:comment_id>', methods=['GET'])
+	def get_replies(comment_id):
+		""" get a comment and its replies as JSON, so the file page can load deep threads as they are opened
+
+		:param comment_id: id of the comment
+		:return: JSON of the comment with replies down to the depth parameter, or 400 error if comment doesn't exist
+		"""
+		max_depth = current_app.config['MAX_COMMENT_REPLY_DEPTH']
+		depth = request.args.get('depth', current_app.config['COMMENT_REPLY_DEPTH'], type=int)
+		if depth < 0:
 			abort(400)
-		# get all comments for the file
-		comments = Comment.query.filter_by(file=file_name).all()
-		Comment.generate_children(comments)
-		# pass only top level comments
-		comments = [comment for comment in comments if comment.parent is None]
-		return render_template('file_page.html', file=portfolio.files[file_name], assignment=assignments[0], comments=reversed(comments))
+		comments = Comment.load_threads(read_session, [comment_id], min(depth, max_depth))
+		if comment_id not in comments:
+			abort(400)
+		return jsonify(comments[comment_id].to_dict())
+
+	def save_comment(comment):
+		""" write a posted comment, returning once it is committed so the re-rendered page shows it
+
+		:param comment: new comment
+		"""
+		if comment_writer is not None:
+			comment_writer.write(comment)
+		else:
+			db.session.add(comment)
+			db.session.commit()
+
+	@portfolio_blueprint.route('/api/activity', methods=['GET'])
+	def get_activity():
+		""" get the newest changes to the repository as JSON, optionally only those made in a time range given as
+		since and until, in seconds since the epoch
+
+		:return: JSON list of changes newest first, or 400 error if count is negative or until is before since
+		"""
+		portfolio, generation = portfolio_holder.get_snapshot()
+		count = request.args.get('count', current_app.config['RECENT_ACTIVITY_COUNT'], type=int)
+		since = request.args.get('since', type=int)
+		until = request.args.get('until', type=int)
+		if count < 0 or (since is not None and until is not None and until < since):
+			abort(400)
+		count = min(count, current_app.config['MAX_RECENT_ACTIVITY_COUNT'])
+		# changes only come with new revisions
+		latest_commit = portfolio.get_latest_commit()
+		return conditional_response(page_etag(latest_commit), commit_time(latest_commit),
+									partial(render_activity, portfolio, count, since, until))
+
+	def render_activity(portfolio, count, since, until):
+		""" render changes as JSON
+
+		:param portfolio: repository snapshot of the request
+		:param count: most changes to list
+		:param since: only list changes made at or after this time, None for no lower bound
+		:param until: only list changes made before this time, None for no upper bound
+		:return: JSON response
+		"""
+		if since is None and until is None:
+			changes = portfolio.latest_changes(count)
+		else:
+			changes = portfolio.changes_between(since if since is not None else 0,
+												until if until is not None else sys.maxsize, count)
+		return jsonify([{'name': change.name, 'revision': int(change.revision), 'date': change.date,
+						 'timestamp': change.timestamp, 'author': change.author, 'msg': change.msg}
+						for change in changes])
 
 	@portfolio_blueprint.route('/assignments/<string:assignment_name>/files/<path:file_name>', methods=['POST'])
 	def post_comment(assignment_name, file_name):
@@ -65,8 +204,8 @@ def construct_portfolio_blueprint(portfolio):
 		# apply filter to comment
 		comment.apply_filter()
 		# propogate changes to db
-		db.session.add(comment)
-		db.session.commit()
+		save_comment(comment)
+		render_cache.invalidate_prefix(('comments', file_name))
 		# re-display the file page.
 		return get_file(assignment_name, file_name)
 
@@ -85,8 +224,8 @@ def construct_portfolio_blueprint(portfolio):
 		# apply filter to comment
 		comment.apply_filter()
 		# propogate changes to db
-		db.session.add(comment)
-		db.session.commit()
+		save_comment(comment)
+		render_cache.invalidate_prefix(('comments', file_name))
 		# re-display the file page.
 		return get_file(assignment_name, file_name)
 
@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+from markupsafe import Markup
+
+
+class RenderCache(object):
+	""" Bounded cache of rendered pages and page fragments, least recently used entries are evicted first.
+	Keys of repository data include the repository generation, so an ingest makes old entries unreachable
+	"""
+
+	def __init__(self, max_entries=256):
+		""" Constructor
+
+		:param max_entries: number of rendered pages and fragments to keep
+		"""
+		self.max_entries = max_entries
+		self.rendered = OrderedDict()	# key -> rendered html, least recently used first
+		self.lock = threading.Lock()	# requests may be served from several threads
+		self.invalidations = 0			# number of invalidations, to spot ones made during a render
+
+	def get_or_render(self, key, render):
+		""" Get rendered html for key, rendering and storing it if it is not cached
+
+		:param key: tuple identifying the page or fragment and the data it shows
+		:param render: function returning the html, called without holding the lock
+		:return: rendered html, marked safe so it can be placed into another template
+		"""
+		with self.lock:
+			html = self.rendered.get(key)
+			if html is not None:
+				self.rendered.move_to_end(key)
+				return html
+			invalidations = self.invalidations
+		html = Markup(render())
+		with self.lock:
+			# html may already be stale if something was invalidated while rendering, so only serve it
+			if invalidations == self.invalidations:
+				self.rendered[key] = html
+				self.rendered.move_to_end(key)
+				while len(self.rendered) > self.max_entries:
+					self.rendered.popitem(last=False)
+		return html
+
+	def invalidate(self, key):
+		""" Remove a page or fragment, so it is rendered again on next use
+
+		:param key: key the html was stored under
+		"""
+		with self.lock:
+			self.rendered.pop(key, None)
+			self.invalidations += 1
+
+	def invalidate_prefix(self, prefix):
+		""" Remove every page or fragment whose key starts with prefix, like all comment pages of a file
+
+		:param prefix: tuple the keys to remove start with
+		"""
+		with self.lock:
+			for key in [key for key in self.rendered if key[:len(prefix)] == prefix]:
+				del self.rendered[key]
+			self.invalidations += 1
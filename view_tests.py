@@ -0,0 +1,252 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import app, db, read_engine, read_session
+from model.portfolio.entries import Comment, Directory, File
+from model.portfolio.read_model import ReadRepository
+from model.portfolio.refresher import RepositoryHolder
+from model.portfolio.repository import Repository
+from model.portfolio.revision import RevisionInfo, PathRevision, date_timestamp
+from view.conditional import page_etag, commit_time, conditional_response
+from view.portfolio_views import construct_portfolio_blueprint
+from view.render_cache import RenderCache
+
+
+class RenderCacheTests(unittest.TestCase):
+
+	def setUp(self):
+		self.cache = RenderCache(max_entries=2)
+		self.renders = []
+
+	def render(self, html):
+		# record every render so tests can tell hits from misses
+		def render():
+			self.renders.append(html)
+			return html
+		return render
+
+	# second request for a key should be served without rendering
+	def test_cache_hit(self):
+		self.assertEqual(self.cache.get_or_render(('tree', 1, 'Assignment0'), self.render('<ul></ul>')), '<ul></ul>')
+		self.assertEqual(self.cache.get_or_render(('tree', 1, 'Assignment0'), self.render('changed')), '<ul></ul>')
+		self.assertEqual(self.renders, ['<ul></ul>'])
+		# a new generation is a different key, so it is rendered again
+		self.assertEqual(self.cache.get_or_render(('tree', 2, 'Assignment0'), self.render('changed')), 'changed')
+
+	# least recently used entry should be evicted once the cache is full
+	def test_eviction(self):
+		self.cache.get_or_render('a', self.render('a'))
+		self.cache.get_or_render('b', self.render('b'))
+		self.cache.get_or_render('a', self.render('a'))
+		self.cache.get_or_render('c', self.render('c'))
+		self.assertEqual(list(self.cache.rendered.keys()), ['a', 'c'])
+
+	# invalidating one key should leave the others cached
+	def test_invalidate(self):
+		self.cache.get_or_render(('comments', 'f.txt'), self.render('old'))
+		self.cache.get_or_render(('comments', 'g.txt'), self.render('other'))
+		self.cache.invalidate(('comments', 'f.txt'))
+		self.assertEqual(self.cache.get_or_render(('comments', 'f.txt'), self.render('new')), 'new')
+		self.assertEqual(self.cache.get_or_render(('comments', 'g.txt'), self.render('changed')), 'other')
+
+	# invalidating a prefix should remove every page of a file's comments, and nothing else
+	def test_invalidate_prefix(self):
+		self.cache.max_entries = 4
+		self.cache.get_or_render(('comments', 'f.txt', None), self.render('first page'))
+		self.cache.get_or_render(('comments', 'f.txt', 12), self.render('second page'))
+		self.cache.get_or_render(('comments', 'g.txt', None), self.render('other'))
+		self.cache.invalidate_prefix(('comments', 'f.txt'))
+		self.assertEqual(list(self.cache.rendered.keys()), [('comments', 'g.txt', None)])
+
+	# html rendered while its key was invalidated may be stale, so it should not be stored
+	def test_invalidate_during_render(self):
+		def render():
+			self.cache.invalidate(('comments', 'f.txt'))
+			return 'stale'
+		self.assertEqual(self.cache.get_or_render(('comments', 'f.txt'), render), 'stale')
+		self.assertEqual(self.cache.get_or_render(('comments', 'f.txt'), self.render('new')), 'new')
+
+
+class ConditionalResponseTests(unittest.TestCase):
+
+	def setUp(self):
+		self.app = Flask(__name__)
+		self.app.config['PAGE_MAX_AGE'] = 0
+		self.commit = RevisionInfo('6705', '2017-03-21T15:08:51.388154Z', 'lstrait2', 'importing Assignment3.0')
+		self.renders = 0
+
+	def render(self):
+		self.renders += 1
+		return 'page'
+
+	def get(self, headers=None, comment_id=None):
+		with self.app.test_request_context(headers=headers):
+			return conditional_response(page_etag(self.commit, comment_id), commit_time(self.commit), self.render)
+
+	# validators should come from the newest revision and comment
+	def test_validators(self):
+		response = self.get(comment_id=42)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.headers['ETag'], '"r6705-c42"')
+		self.assertEqual(response.headers['Last-Modified'], 'Tue, 21 Mar 2017 15:08:51 GMT')
+		self.assertEqual(response.headers['Cache-Control'], 'public, no-cache')
+		self.assertEqual(page_etag(None), 'r0')
+
+	# a current copy should get a 304 without the page being rendered
+	def test_not_modified(self):
+		self.assertEqual(self.get({'If-None-Match': '"r6705"'}).status_code, 304)
+		self.assertEqual(self.get({'If-Modified-Since': 'Tue, 21 Mar 2017 15:08:51 GMT'}).status_code, 304)
+		# gzipping proxies weaken ETags, If-None-Match compares them weakly
+		self.assertEqual(self.get({'If-None-Match': 'W/"r6705"'}).status_code, 304)
+		self.assertEqual(self.renders, 0)
+
+	# an old copy should get the whole page
+	def test_modified(self):
+		self.assertEqual(self.get({'If-None-Match': '"r6469"'}).status_code, 200)
+		self.assertEqual(self.get({'If-None-Match': '"r6705"'}, comment_id=3).status_code, 200)
+		self.assertEqual(self.get({'If-Modified-Since': 'Mon, 20 Mar 2017 15:08:51 GMT'}).status_code, 200)
+		# ETag wins over an up to date Last-Modified
+		self.assertEqual(self.get({'If-None-Match': '"r6469"',
+								   'If-Modified-Since': 'Tue, 21 Mar 2017 15:08:51 GMT'}).status_code, 200)
+		self.assertEqual(self.renders, 4)
+
+	# dates that are not svn dates should leave out Last-Modified instead of failing the page
+	def test_unparseable_date(self):
+		for date in ['2017-03-21 15:08:51', 'yesterday', None]:
+			self.commit = RevisionInfo('6705', date, 'lstrait2', 'importing Assignment3.0')
+			response = self.get()
+			self.assertEqual(response.status_code, 200)
+			self.assertNotIn('Last-Modified', response.headers)
+			self.assertEqual(response.headers['ETag'], '"r6705"')
+
+	# pages may be reused without checking when a max age is configured
+	def test_max_age(self):
+		self.app.config['PAGE_MAX_AGE'] = 60
+		self.assertEqual(self.get().headers['Cache-Control'], 'public, max-age=60')
+
+
+class PortfolioBlueprintTests(unittest.TestCase):
+
+	def setUp(self):
+		# serve a small repository, with comments read from a scratch database so the real portfolio db is untouched
+		self.tmp_dir = tempfile.mkdtemp()
+		self.engine = create_engine('sqlite:///' + os.path.join(self.tmp_dir, 'portfolio.db'))
+		db.metadata.create_all(self.engine)
+		self.session = sessionmaker(bind=self.engine)()
+		read_session.remove()
+		read_session.configure(bind=self.engine)
+		self.file_name = "Assignment0/it's.txt"
+		dirs = {'Assignment0': Directory('Assignment0', 2, '2017-02-02T00:00:00.000000Z', 'lstrait2')}
+		files = {self.file_name: File(self.file_name, 2, '2017-02-02T00:00:00.000000Z', 'lstrait2', 5)}
+		repo = Repository(dirs, files)
+		first = RevisionInfo('1', '2017-02-01T00:00:00.000000Z', 'lstrait2', 'first')
+		second = RevisionInfo('2', '2017-02-02T00:00:00.000000Z', 'lstrait2', 'second')
+		repo.assign_revisions([PathRevision(self.file_name, second), PathRevision('Assignment0', second),
+							   PathRevision(self.file_name, first), PathRevision('Assignment0', first)])
+		self.app = Flask(__name__)
+		self.app.config.update(app.config)
+		self.app.config.update(COMMENTS_PER_PAGE=2, COMMENT_REPLY_DEPTH=1, MAX_COMMENT_REPLY_DEPTH=2)
+		self.app.register_blueprint(construct_portfolio_blueprint(RepositoryHolder(ReadRepository(repo), 1),
+																  RenderCache()))
+		self.client = self.app.test_client()
+
+	def tearDown(self):
+		read_session.remove()
+		read_session.configure(bind=read_engine)
+		self.session.close()
+		self.engine.dispose()
+		shutil.rmtree(self.tmp_dir)
+
+	def add_comment(self, message, parent=None):
+		comment = Comment(self.file_name, parent, message)
+		self.session.add(comment)
+		self.session.commit()
+		return comment.id
+
+	def file_page(self, query=''):
+		return self.client.get('/assignments/Assignment0/files/' + self.file_name + query).get_data(as_text=True)
+
+	# replies api should return the thread down to the asked depth, capped by the configured maximum
+	def test_replies_api(self):
+		root = self.add_comment('root')
+		reply = self.add_comment('reply', root)
+		reply_to_reply = self.add_comment('reply to reply', reply)
+		self.add_comment('deepest', reply_to_reply)
+		thread = json.loads(self.client.get('/api/comments/%d' % root).get_data(as_text=True))
+		self.assertEqual(thread['message'], 'root')
+		self.assertEqual([child['message'] for child in thread['children']], ['reply'])
+		# default depth stops below the first reply, flagging that there is more
+		self.assertEqual(thread['children'][0]['children'], [])
+		self.assertTrue(thread['children'][0]['more_replies'])
+		thread = json.loads(self.client.get('/api/comments/%d?depth=5' % root).get_data(as_text=True))
+		reply_thread = thread['children'][0]['children'][0]
+		self.assertEqual(reply_thread['message'], 'reply to reply')
+		self.assertTrue(reply_thread['more_replies'])
+		self.assertEqual(self.client.get('/api/comments/%d?depth=-1' % root).status_code, 400)
+		self.assertEqual(self.client.get('/api/comments/999').status_code, 400)
+
+	# file page should show the newest top level comments, linking to older ones
+	def test_paged_file_page(self):
+		ids = [self.add_comment('comment %d' % number) for number in range(3)]
+		page = self.file_page()
+		self.assertIn('comment 2', page)
+		self.assertIn('comment 1', page)
+		self.assertNotIn('comment 0', page)
+		self.assertIn('?before=%d' % ids[1], page)
+		page = self.file_page('?before=%d' % ids[1])
+		self.assertIn('comment 0', page)
+		self.assertNotIn('comment 1', page)
+		self.assertNotIn('?before=', page)
+
+	# comments written by another worker should show on the next request, under the new ETag
+	def test_comment_from_other_worker(self):
+		self.add_comment('first')
+		response = self.client.get('/assignments/Assignment0/files/' + self.file_name)
+		self.add_comment('written elsewhere')
+		changed = self.client.get('/assignments/Assignment0/files/' + self.file_name,
+								  headers={'If-None-Match': response.headers['ETag']})
+		self.assertEqual(changed.status_code, 200)
+		self.assertIn('written elsewhere', changed.get_data(as_text=True))
+
+	# names in the page's script should be JSON strings, not HTML escaped text
+	def test_script_names_escaped(self):
+		self.assertIn("form.attr('action', \"/assignments/Assignment0/files/Assignment0/it\\u0027s.txt/\" + comment.id)",
+					  self.file_page())
+
+
+	def activity(self, query=''):
+		response = self.client.get('/api/activity' + query)
+		self.assertEqual(response.status_code, 200)
+		return [(change['revision'], change['name']) for change in json.loads(response.get_data(as_text=True))]
+
+	# activity api should list changes newest first, limited by count and an optional time range
+	def test_activity_api(self):
+		second_day = date_timestamp('2017-02-02T00:00:00Z')
+		self.assertEqual(self.activity(), [(2, self.file_name), (2, 'Assignment0'), (1, self.file_name),
+										   (1, 'Assignment0')])
+		self.assertEqual(self.activity('?count=1'), [(2, self.file_name)])
+		self.assertEqual(self.activity('?since=%d' % second_day), [(2, self.file_name), (2, 'Assignment0')])
+		self.assertEqual(self.activity('?until=%d' % second_day), [(1, self.file_name), (1, 'Assignment0')])
+		self.assertEqual(self.activity('?since=0&until=%d&count=1' % (second_day + 1)), [(2, self.file_name)])
+		self.assertEqual(self.activity('?since=%d&until=%d' % (second_day, second_day)), [])
+		# count is capped by the configured maximum
+		self.app.config['MAX_RECENT_ACTIVITY_COUNT'] = 3
+		self.assertEqual(len(self.activity('?count=10')), 3)
+		# activity only changes with new revisions
+		self.assertEqual(self.client.get('/api/activity', headers={'If-None-Match': '"r2"'}).status_code, 304)
+
+	# negative counts and ranges ending before they start should be rejected
+	def test_activity_api_invalid(self):
+		self.assertEqual(self.client.get('/api/activity?count=-1').status_code, 400)
+		self.assertEqual(self.client.get('/api/activity?since=100&until=99').status_code, 400)
+		self.assertEqual(self.client.get('/api/activity?since=100&count=-1').status_code, 400)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,6 +1,9 @@
+import os
+import shutil
+import tempfile
 import unittest
 
-from model.parser.xml_parser import XMLParser
+from model.parser.xml_parser import XMLParser, parse_log_shard
 
 class XMLParserTests(unittest.TestCase):
 
@@ -104,6 +107,25 @@ class XMLParserTests(unittest.TestCase):
 		self.assertIn('6182', [version.revision for version in file2.versions])
 		self.assertIn('6182', [version.revision for version in file3.versions])
 
+	# paths of one commit should share a single copy of its metadata, also when loaded from a snapshot
+	def test_revision_metadata_shared(self):
+		cache_dir = tempfile.mkdtemp()
+		try:
+			XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml', cache_dir=cache_dir).parse_subversion_xml()
+			for parser in (self.parser, XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml', cache_dir=cache_dir)):
+				repo = parser.parse_subversion_xml()
+				names = ['Assignment2.1/Assignment2.1/view/actor_views.py', 'Assignment2.1/Assignment2.1/view/movie_views.py',
+						 'Assignment2.1/Assignment2.1/view/util.py']
+				infos = [[version.info for version in repo.files[name].versions if version.revision == '6182'][0]
+						 for name in names]
+				self.assertIs(infos[0], infos[1])
+				self.assertIs(infos[0], infos[2])
+				# each revision should reuse its entry's name
+				for name in names:
+					self.assertIs(repo.files[name].versions[0].name, repo.files[name].name)
+		finally:
+			shutil.rmtree(cache_dir)
+
 	# test a single commit with only 1 file is included in version array
 	def test_revision_single_file(self):
 		repo = self.parser.parse_subversion_xml()
@@ -129,6 +151,209 @@ class XMLParserTests(unittest.TestCase):
 		# Assignment1.0/src/test/PieceTests.java was merged in commit 6244
 		self.assertIn('Assignment1.0/src/test/PieceTests.java', repo.files.keys())
 
+	# streaming parse should produce exactly the same repository as the in-memory parse
+	def test_streaming_parse_identical(self):
+		repo = self.parser.parse_subversion_xml()
+		stream_repo = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml',
+								streaming=True).parse_subversion_xml()
+		self.assertEqual(sorted(stream_repo.directories.keys()), sorted(repo.directories.keys()))
+		self.assertEqual(sorted(stream_repo.files.keys()), sorted(repo.files.keys()))
+		self.assertEqual([assignment.name for assignment in stream_repo.assignments],
+						 [assignment.name for assignment in repo.assignments])
+		# every entry should have the same data and history, in the same order
+		for name, file in repo.files.items():
+			stream_file = stream_repo.files[name]
+			self.assertEqual((stream_file.revision, stream_file.date, stream_file.author, stream_file.size),
+							 (file.revision, file.date, file.author, file.size))
+			self.assertEqual([(version.revision, version.date, version.author, version.msg) for version in stream_file.versions],
+							 [(version.revision, version.date, version.author, version.msg) for version in file.versions])
+		for name, directory in repo.directories.items():
+			stream_dir = stream_repo.directories[name]
+			self.assertEqual([version.revision for version in stream_dir.versions],
+							 [version.revision for version in directory.versions])
+			self.assertEqual(sorted(child.name for child in stream_dir.children),
+							 sorted(child.name for child in directory.children))
+
+	# streamed elements should be freed once handled so memory does not grow with the file
+	def test_streaming_frees_elements(self):
+		handled = []
+		for log_entry in XMLParser.iterparse_elements('resources/data/svn_log.xml', 'logentry'):
+			self.assertNotEqual(len(log_entry), 0)
+			handled.append(log_entry)
+		self.assertEqual(len(handled), 63)
+		# every handled element should have been cleared
+		for log_entry in handled:
+			self.assertEqual(len(log_entry), 0)
+
+	# incremental parse should skip every revision at or below the high-water mark
+	def test_since_revision_skips_old_entries(self):
+		parser = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml', since_revision=6243)
+		repo = parser.parse_subversion_xml()
+		revisions = set()
+		for entry in list(repo.files.values()) + list(repo.directories.values()):
+			revisions.update(version.revision for version in entry.versions)
+		self.assertEqual(revisions, set(['6705', '6469', '6304', '6244']))
+		# newest revision in the log should be reported for the next run
+		self.assertEqual(parser.latest_revision, 6705)
+
+	# incremental parse should stop reading the log once it reaches ingested revisions
+	def test_since_revision_stops_early(self):
+		parsed = []
+		parser = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml',
+						   streaming=True, since_revision=6469)
+		parser.parse_log_entry = lambda log_entry: parsed.append(log_entry.attrib['revision'])
+		parser.parse_subversion_xml()
+		self.assertEqual(parsed, ['6705'])
+
+	# nothing should be parsed when no new revisions exist
+	def test_since_revision_no_new_entries(self):
+		parser = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml', since_revision=6705)
+		repo = parser.parse_subversion_xml()
+		for file in repo.files.values():
+			self.assertEqual(len(file.versions), 0)
+		self.assertIsNone(parser.latest_revision)
+
+	# precomputed last commit of each directory should be newest revision anywhere in its subtree
+	def test_last_commit_rollups(self):
+		repo = self.parser.parse_subversion_xml()
+		for directory in repo.directories.values():
+			subtree = [directory]
+			revisions = []
+			while len(subtree) != 0:
+				entry = subtree.pop()
+				revisions.extend(entry.versions)
+				subtree.extend(entry.children)
+			if len(revisions) == 0:
+				self.assertIsNone(directory.get_last_commit())
+			else:
+				self.assertEqual(directory.get_last_commit().date, max(revision.date for revision in revisions))
+
+	# second parse of unchanged files should come from the snapshot without reading XML
+	def test_snapshot_cache_hit(self):
+		cache_dir = tempfile.mkdtemp()
+		try:
+			parser = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml', cache_dir=cache_dir)
+			repo = parser.parse_subversion_xml()
+			cached_parser = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml', cache_dir=cache_dir)
+			cached_parser.iter_elements = None	# any XML parsing would now fail
+			cached_repo = cached_parser.parse_subversion_xml()
+			self.assertEqual(cached_parser.latest_revision, parser.latest_revision)
+			self.assertEqual(sorted(cached_repo.files.keys()), sorted(repo.files.keys()))
+			self.assertEqual([assignment.name for assignment in cached_repo.assignments],
+							 [assignment.name for assignment in repo.assignments])
+			for name, directory in repo.directories.items():
+				cached_dir = cached_repo.directories[name]
+				self.assertEqual([(version.revision, version.msg) for version in cached_dir.versions],
+								 [(version.revision, version.msg) for version in directory.versions])
+				self.assertEqual(cached_dir.get_last_commit() is None, directory.get_last_commit() is None)
+			iml_file = cached_repo.files['Assignment2.1/Assignment2.1/.idea/Assignment2.1.iml']
+			self.assertEqual(len(iml_file.versions), 2)
+			self.assertEqual(iml_file.parent.name, 'Assignment2.1/Assignment2.1/.idea')
+		finally:
+			shutil.rmtree(cache_dir)
+
+	# changing an input file should invalidate the snapshot
+	def test_snapshot_cache_invalidated(self):
+		tmp_dir = tempfile.mkdtemp()
+		try:
+			list_file = os.path.join(tmp_dir, 'svn_list.xml')
+			log_file = os.path.join(tmp_dir, 'svn_log.xml')
+			shutil.copy('resources/data/svn_list.xml', list_file)
+			shutil.copy('resources/data/svn_log.xml', log_file)
+			cache_dir = os.path.join(tmp_dir, 'cache')
+			XMLParser(list_file, log_file, cache_dir=cache_dir).parse_subversion_xml()
+			# remove the newest log entry from the log
+			with open(log_file) as data:
+				log = data.read()
+			start = log.index('<logentry')
+			end = log.index('</logentry>') + len('</logentry>')
+			with open(log_file, 'w') as data:
+				data.write(log[:start] + log[end:])
+			parser = XMLParser(list_file, log_file, cache_dir=cache_dir)
+			repo = parser.parse_subversion_xml()
+			self.assertNotIn('6705', [version.revision for version in repo.directories['Assignment3.0'].versions])
+			self.assertEqual(parser.latest_revision, 6469)
+			# only the snapshot of the current files is kept
+			self.assertEqual(len(os.listdir(cache_dir)), 1)
+		finally:
+			shutil.rmtree(tmp_dir)
+
+	# incremental runs should parse the log and stop early rather than load or write the snapshot of the whole log
+	def test_snapshot_cache_since_revision(self):
+		cache_dir = tempfile.mkdtemp()
+		try:
+			parser = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml', since_revision=6243,
+							   cache_dir=cache_dir)
+			parser.parse_subversion_xml()
+			self.assertEqual(os.listdir(cache_dir), [])
+			XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml', cache_dir=cache_dir).parse_subversion_xml()
+			for since_revision, latest_revision in [(6243, 6705), (6705, None)]:
+				parser = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml',
+								   since_revision=since_revision)
+				repo = parser.parse_subversion_xml()
+				cached_parser = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml',
+										  since_revision=since_revision, cache_dir=cache_dir)
+				cached_parser.load_snapshot = None	# any snapshot loading would now fail
+				cached_repo = cached_parser.parse_subversion_xml()
+				self.assertEqual(cached_parser.latest_revision, latest_revision)
+				for name, entry in list(repo.files.items()) + list(repo.directories.items()):
+					cached_entry = cached_repo.files.get(name) or cached_repo.directories.get(name)
+					self.assertEqual([(version.revision, version.msg) for version in cached_entry.versions],
+									 [(version.revision, version.msg) for version in entry.versions])
+		finally:
+			shutil.rmtree(cache_dir)
+
+	# parsing with a process pool should give the same repository as parsing serially
+	def test_parallel_parse_identical(self):
+		repo = self.parser.parse_subversion_xml()
+		parser = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml', workers=2)
+		parallel_repo = parser.parse_subversion_xml()
+		self.assertEqual(parser.latest_revision, 6705)
+		self.assertEqual(sorted(parallel_repo.directories.keys()), sorted(repo.directories.keys()))
+		self.assertEqual(sorted(parallel_repo.files.keys()), sorted(repo.files.keys()))
+		for name, entry in list(repo.files.items()) + list(repo.directories.items()):
+			parallel_entry = parallel_repo.files.get(name) or parallel_repo.directories.get(name)
+			# versions should be merged back in log order
+			self.assertEqual([(version.revision, version.date, version.msg) for version in parallel_entry.versions],
+							 [(version.revision, version.date, version.msg) for version in entry.versions])
+
+	# truncated log should fail clearly rather than parse a garbage shard
+	def test_log_shards_truncated(self):
+		tmp_dir = tempfile.mkdtemp()
+		try:
+			log_file = os.path.join(tmp_dir, 'svn_log.xml')
+			with open('resources/data/svn_log.xml') as data:
+				log = data.read()
+			with open(log_file, 'w') as data:
+				data.write(log[:log.rindex('</log>')])
+			parser = XMLParser('resources/data/svn_list.xml', log_file, workers=2)
+			with self.assertRaises(ValueError):
+				parser.log_shards(4)
+		finally:
+			shutil.rmtree(tmp_dir)
+
+	# parallel parse should still skip revisions at or below the mark
+	def test_parallel_parse_since_revision(self):
+		parser = XMLParser('resources/data/svn_list.xml', 'resources/data/svn_log.xml', since_revision=6243, workers=2)
+		repo = parser.parse_subversion_xml()
+		revisions = set()
+		for entry in list(repo.files.values()) + list(repo.directories.values()):
+			revisions.update(version.revision for version in entry.versions)
+		self.assertEqual(revisions, set(['6705', '6469', '6304', '6244']))
+
+	# log shards should start on log entries and cover every entry exactly once
+	def test_log_shards(self):
+		shards = self.parser.log_shards(5)
+		self.assertEqual(len(shards), 5)
+		with open('resources/data/svn_log.xml', 'rb') as data:
+			log = data.read()
+		revisions = []
+		for start, end in shards:
+			self.assertTrue(log[start:].startswith(b'<logentry'))
+			revisions.extend(record[0] for record in parse_log_shard('resources/data/svn_log.xml', start, end))
+		self.assertEqual(len(revisions), 63)
+		self.assertEqual(revisions[0], '6705')
+
 
 if __name__ == '__main__':
 	unittest.main()
\ No newline at end of file